@@ -0,0 +1,97 @@
+"""
+Measures JVM startup for the Java tools used by java_utils.py, with and without
+java_cds.py's short-lived flags and AppCDS archives, on this machine.
+
+    python benchmark_jvm_startup.py --runs 10
+"""
+
+import argparse
+import statistics
+import subprocess
+import time
+
+import java_cds
+import java_daemon
+import java_utils
+
+
+def time_cmd(cmd, stdin, runs):
+    '''
+    Returns the median wall-clock time of `runs` runs of `cmd`, in milliseconds.
+    '''
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(cmd, input=stdin, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+def get_tools():
+    '''
+    Returns (name, java, launch, args, stdin, short_lived, training_args, training_input) per tool.
+    Each launch does a minimal amount of real work, so the time is mostly startup.
+    '''
+    junit_cp = ":".join(java_utils.EVOSUITE_JAR_FILES)
+    tools = [
+        ("JUnitCore (no tests)", java_utils.JAVA_8, ["-cp", junit_cp, "org.junit.runner.JUnitCore"], [], None, True, [], None),
+        ("Procyon (usage)", java_utils.JAVA_8, ["-jar", java_utils.PYOCYON_JAR], [], None, True, [], None),
+        ("CFR (usage)", java_utils.JAVA_8, ["-jar", java_utils.CFR_JAR], [], None, True, [], None),
+        ("Fernflower (usage)", java_utils.JAVA_11, ["-jar", java_utils.FERNFLOWER_JAR], [], None, True, [], None),
+        (
+            "google-java-format (one source)",
+            java_utils.JAVA_11,
+            ["-jar", java_utils.GOOGLE_JAVA_FORMAT_JAR],
+            ["-"],
+            java_utils.FORMAT_TRAINING_SOURCE,
+            True,
+            ["-"],
+            java_utils.FORMAT_TRAINING_SOURCE,
+        ),
+    ]
+
+    # the helper daemons read EOF on stdin and exit right after starting
+    helpers = [
+        ("FormatServer (start, exit)", ["DaemonIO.java", "FormatServer.java"], [java_utils.GOOGLE_JAVA_FORMAT_JAR], "FormatServer"),
+        ("DecompilerHost (start, exit)", ["DaemonIO.java", "DecompilerHost.java"], java_utils.DECOMPILER_HOST_JARS, "DecompilerHost"),
+    ]
+    for name, sources, jars, main_class in helpers:
+        try:
+            helpers_dir = java_daemon.build_helpers(java_utils.JAVAC_11, sources, classpath=jars)
+        except java_daemon.DaemonUnavailable as e:
+            print(f"skipping {name}: {e}")
+            continue
+        classpath = ":".join([java_cds.jar_directory(helpers_dir)] + jars)
+        tools.append((name, java_utils.JAVA_11, ["-cp", classpath, main_class], [], b"", False, [], None))
+
+    return tools
+
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10, help="Launches per tool and configuration")
+    args = parser.parse_args()
+
+    print(f"{'tool':36} {'default':>10} {'short-lived':>12} {'+ AppCDS':>10} {'archive build':>14}")
+
+    # javac runs on JDK 8, which has no AppCDS
+    javac_cmd = [java_utils.JAVAC_8, "-version"]
+    default_ms = time_cmd(javac_cmd, None, args.runs)
+    flags_ms = time_cmd(javac_cmd[:1] + java_cds.javac_flags() + javac_cmd[1:], None, args.runs)
+    print(f"{'javac (-version)':36} {default_ms:10.0f} {flags_ms:12.0f} {'n/a':>10} {'':>14}")
+
+    for name, java, launch, tool_args, stdin, short_lived, training_args, training_input in get_tools():
+        default_ms = time_cmd([java] + launch + tool_args, stdin, args.runs)
+
+        flags = java_cds.short_lived_flags() if short_lived else []
+        flags_ms = time_cmd([java] + flags + launch + tool_args, stdin, args.runs)
+
+        # the first call trains and dumps the archive
+        start = time.perf_counter()
+        archive_flags = java_cds.archive_flags(java, launch, training_args, training_input)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        if archive_flags:
+            archive_ms = time_cmd([java] + flags + archive_flags + launch + tool_args, stdin, args.runs)
+            print(f"{name:36} {default_ms:10.0f} {flags_ms:12.0f} {archive_ms:10.0f} {build_ms:14.0f}")
+        else:
+            print(f"{name:36} {default_ms:10.0f} {flags_ms:12.0f} {'n/a':>10} {'':>14}")
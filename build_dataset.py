@@ -1,73 +1,270 @@
 """
 Uses output .json from fetch_bq.py to create a dataset of Java source code.
 This file uses java_utils.py to compile java code and generate evosuite tests.
+
+Each input chunk <n>.json is streamed and its kept samples are appended to
+<n>.jsonl as they finish. <n>.manifest records every sample's terminal
+status, so an interrupted run picks up where it stopped when restarted with
+the same arguments.
+
+By default samples run through a staged pipeline (java_pipeline.py): parsing,
+javac, formatting and disassembly on a wide pool, EvoSuite on a pool sized by
+memory, and verification of the gold class on its own pool, with bounded
+queues between them. --executor admission instead runs each sample start to
+finish in one worker of a java_admission.MemoryScheduler.
 """
 
 import argparse
 import json
 import os
 
-from joblib import Parallel, delayed
+import java_admission
+import java_metrics
+import java_pipeline
 import java_utils
 
-def process_sample(java_dict):
-    home_dir = os.getcwd()
-    try:
-        # get code
-        java_code = java_dict["content"]
+# the tools process_sample runs, for its memory estimate
+SAMPLE_TOOLS = ["javac", "format", "evosuite_gen", "test"]
+# resident memory in MB of one worker of each pipeline stage: the daemons and tools it runs
+STAGE_MEMORY_MB = {
+    "prepare": java_admission.TOOL_MEMORY_MB["javac"] + java_admission.TOOL_MEMORY_MB["format"],
+    "evosuite": java_admission.TOOL_MEMORY_MB["evosuite_gen"],
+    "verify": java_admission.TOOL_MEMORY_MB["test"],
+}
+# share of the memory budget the prepare and verify stages may each take; EvoSuite gets the rest
+SIDE_STAGE_MEMORY_SHARE = 0.25
+
+def prepare_sample(java_dict):
+    '''
+    First pipeline stage: parses, compiles, formats and disassembles a source.
+    Returns (status, partial sample).
+    '''
+    # get code
+    java_code = java_dict["content"]
+
+    # get class name
+    class_name = java_utils.get_class_name(java_code)
+
+    if class_name is None:
+        return "no_class_name", None
+
+    # preprocess code
+    java_code = java_utils.preprocess_str(java_code)
+
+    if java_code is None:
+        return "preprocess_failed", None
+    
+    # compile bytecode
+    compile_result = java_utils.compile_str(class_name, java_code)
+
+    if not compile_result["success"]:
+        return "compile_failed", None
+
+    byte_code = compile_result["class_file"]
+
+    # format code
+    java_code = java_utils.format_str(class_name, java_code)
 
-        # get class name
-        class_name = java_utils.get_class_name(java_code)
+    if java_code is None:
+        return "format_failed", None
 
-        if class_name is None:
-            return None
+    # disassemble code
+    jasm_code = java_utils.disassemble_str(class_name, byte_code)
 
-        # preprocess code
-        java_code = java_utils.preprocess_str(java_code)
+    if jasm_code is None:
+        return "disassemble_failed", None
 
-        if java_code is None:
-            return None
-        
-        # compile bytecode
-        byte_code = java_utils.compile_str(class_name, java_code)
+    return "ok", {
+        "class_name": class_name,
+        "java_source": java_code,
+        "jasm_code": jasm_code,
+        "byte_code": byte_code,
+    }
 
-        if byte_code is None:
-            return None
+def generate_sample_tests(sample):
+    '''
+    Second pipeline stage: generates tests using evosuite and the gold bytecode.
+    '''
+    test_str, scaffold_str = java_utils.evosuite_gen_test(sample["class_name"], sample["byte_code"])
 
-        # format code
-        java_code = java_utils.format_str(class_name, java_code)
+    if test_str is None:
+        return "no_tests", None
 
-        if java_code is None:
-            return None
+    return "ok", dict(sample, java_test=test_str, java_scaffold=scaffold_str)
 
-        # disassemble code
-        jasm_code = java_utils.disassemble_str(class_name, byte_code)
+def verify_sample(sample):
+    '''
+    Last pipeline stage: ensures that the gold bytecode passes the evosuite
+    tests. Returns (status, dataset sample).
+    '''
+    verdict = java_utils.evosuite_compile_and_run_test(
+        sample["class_name"], sample["byte_code"], sample["java_test"], sample["java_scaffold"]
+    )
 
-        if jasm_code is None:
-            return None
+    if verdict["pass_rate"] < 1.0:
+        return "gold_fails_tests", None
 
-        # generate tests using evosuite and gold bytecode
-        test_str, scaffold_str = java_utils.evosuite_gen_test(class_name, byte_code)
+    return "ok", {
+        "class_name": sample["class_name"],
+        "java_source": sample["java_source"],
+        "jasm_code": sample["jasm_code"],
+        "java_test": sample["java_test"],
+        "java_scaffold": sample["java_scaffold"],
+    }
 
-        if test_str is None:
-            return None
+def process_sample(java_dict):
+    '''
+    Returns (status, sample): "ok" and the dataset sample, or the step that
+    rejected the source and None. Runs all pipeline stages in turn.
+    '''
+    try:
+        status, sample = "ok", java_dict
+        for stage in (prepare_sample, generate_sample_tests, verify_sample):
+            status, sample = stage(sample)
+            if status != "ok":
+                break
+        return status, sample
+    except Exception:
+        # a sample that breaks one of the tools is dropped, not the whole run
+        return "error", None
+
+def process_indexed_sample(item):
+    index, java_dict = item
+    status, sample = process_sample(java_dict)
+    return index, status, sample
+
+def stage_workers(max_jobs=None, memory_budget_mb=None):
+    '''
+    Returns {stage: workers}: up to `max_jobs` (default: cores) each, the
+    prepare and verify stages limited to SIDE_STAGE_MEMORY_SHARE of the
+    memory budget (default: available memory minus java_admission.HEADROOM_MB)
+    each, and the EvoSuite stage to what they leave.
+    '''
+    cores = max_jobs or os.cpu_count() or 1
+    if memory_budget_mb is None:
+        available = java_admission.available_memory_mb()
+        if available is not None:
+            memory_budget_mb = available - java_admission.HEADROOM_MB
+    if memory_budget_mb is None:
+        return {"prepare": cores, "evosuite": cores, "verify": max(1, cores // 2)}
+
+    def fit(stage, budget, limit):
+        return max(1, min(limit, int(budget) // STAGE_MEMORY_MB[stage]))
+
+    prepare = fit("prepare", memory_budget_mb * SIDE_STAGE_MEMORY_SHARE, cores)
+    verify = fit("verify", memory_budget_mb * SIDE_STAGE_MEMORY_SHARE, max(1, cores // 2))
+    rest = memory_budget_mb - prepare * STAGE_MEMORY_MB["prepare"] - verify * STAGE_MEMORY_MB["verify"]
+    return {"prepare": prepare, "evosuite": fit("evosuite", rest, cores), "verify": verify}
+
+def parse_stage_workers(value):
+    '''
+    Parses --stage-workers, e.g. "prepare=16,evosuite=4".
+    '''
+    workers = {}
+    for part in value.split(","):
+        stage, _, count = part.partition("=")
+        if stage not in STAGE_MEMORY_MB or not count.isdigit():
+            raise argparse.ArgumentTypeError(f"expected <stage>=<workers> with stage in {sorted(STAGE_MEMORY_MB)}, got {part!r}")
+        workers[stage] = int(count)
+    return workers
 
-        # ensure that the gold bytecode passes the evosuite tests
-        pass_rate = java_utils.evosuite_compile_and_run_test(class_name, byte_code, test_str, scaffold_str)
+def build_pipeline(workers, queue_size=None):
+    '''
+    The staged pipeline for a build: cheap filters and javac, then EvoSuite
+    (admitted by available memory), then verifying the gold class against
+    the generated tests.
+    '''
+    return java_pipeline.Pipeline([
+        java_pipeline.Stage("prepare", prepare_sample, workers["prepare"], queue_size),
+        java_pipeline.Stage("evosuite", generate_sample_tests, workers["evosuite"], queue_size, memory_mb=STAGE_MEMORY_MB["evosuite"]),
+        java_pipeline.Stage("verify", verify_sample, workers["verify"], queue_size),
+    ])
 
-        if pass_rate < 1.0:
-            return None
-            
-        return {
-            "class_name": class_name,
-            "java_source": java_code,
-            "jasm_code": jasm_code,
-            "java_test": test_str,
-            "java_scaffold": scaffold_str,
-        }
-    except:
-        os.chdir(home_dir)
-        return None
+def iter_json_array(path, chunk_size=1 << 20):
+    '''
+    Yields the elements of a file holding one JSON array (as fetch_bq.py
+    writes them) without loading the whole file.
+    '''
+    decoder = json.JSONDecoder()
+    buffer = ""
+    started = False
+    eof = False
+    with open(path, "r") as f:
+        while True:
+            buffer = buffer.lstrip()
+            if not started and buffer:
+                if buffer[0] != "[":
+                    raise ValueError(f"{path} does not hold a JSON array")
+                buffer = buffer[1:]
+                started = True
+                continue
+            if started and buffer[:1] == ",":
+                buffer = buffer[1:]
+                continue
+            if started and buffer[:1] == "]":
+                return
+            if started and buffer:
+                try:
+                    element, end = decoder.raw_decode(buffer)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                else:
+                    # a number cut at a chunk boundary ("-2." of "-2.5e10") also decodes, so an
+                    # element only counts once the separator after it has been read
+                    if eof or (end < len(buffer) and buffer[end] in ",] \t\r\n"):
+                        buffer = buffer[end:]
+                        yield element
+                        continue
+            if eof:
+                if started:
+                    raise ValueError(f"{path} ends inside its JSON array")
+                return
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+
+def load_manifest(manifest_path, results_path):
+    '''
+    Returns the indices of the samples of a chunk that already reached a
+    terminal status, and whether the chunk is complete. A manifest line or
+    result written by a run that was killed halfway is cut off.
+    '''
+    done = set()
+    complete = False
+    manifest_end = 0
+    results_end = 0
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                manifest_end += len(line)
+                if entry.get("complete"):
+                    complete = True
+                else:
+                    done.add(entry["index"])
+                    results_end = max(results_end, entry.get("end", 0))
+        os.truncate(manifest_path, manifest_end)
+
+    # a result is written before its manifest line; one without a line is redone
+    if os.path.exists(results_path) and os.path.getsize(results_path) > results_end:
+        os.truncate(results_path, results_end)
+
+    return done, complete
+
+def append_line(f, data):
+    '''
+    Appends a JSON line to `f` and syncs it to disk. Returns the file's new end.
+    '''
+    f.write(json.dumps(data) + "\n")
+    f.flush()
+    os.fsync(f.fileno())
+    return f.tell()
 
 
 if __name__=="__main__":
@@ -76,8 +273,16 @@ if __name__=="__main__":
     parser.add_argument("--output-dir", type=str, required=True, help="Output directory")
     parser.add_argument("--start-idx", type=int, default=0, help="Start index")
     parser.add_argument("--num-files", type=int, default=None, help="Number of files to use")
+    parser.add_argument("--executor", choices=["staged", "admission"], default="staged", help="Run samples through per-stage pools, or each sample in one worker")
+    parser.add_argument("--max-jobs", type=int, default=None, help="Samples processed at once, per stage when staged (default: cores, further limited by memory)")
+    parser.add_argument("--stage-workers", type=parse_stage_workers, default={}, help="Override stage pool sizes, e.g. prepare=16,evosuite=4")
+    parser.add_argument("--queue-size", type=int, default=None, help="Items queued in front of each stage (default: twice its workers)")
+    parser.add_argument("--memory-budget-mb", type=int, default=None, help="Memory for all running samples (default: available memory minus java_admission.HEADROOM_MB)")
+    parser.add_argument("--metrics-out", type=str, default=None, help="Write java_utils timing metrics (JSON and .prom) here at exit")
     args = parser.parse_args()
 
+    if args.metrics_out is not None:
+        java_metrics.dump_at_exit(args.metrics_out)
 
     # get list of files
     files = os.listdir(args.input_dir)
@@ -86,17 +291,52 @@ if __name__=="__main__":
     if args.num_files is not None:
         files = files[args.start_idx:args.start_idx+args.num_files]
     
-    output_data = []
-    
-    samples_processed = 0
+    os.makedirs(args.output_dir, exist_ok=True)
+    if args.executor == "staged":
+        workers = dict(stage_workers(args.max_jobs, args.memory_budget_mb), **args.stage_workers)
+        print("Stage workers: " + ", ".join(f"{stage} {count}" for stage, count in workers.items()))
+    else:
+        scheduler = java_admission.MemoryScheduler(
+            java_admission.sample_memory_mb(SAMPLE_TOOLS),
+            max_jobs=args.max_jobs,
+            memory_budget_mb=args.memory_budget_mb,
+        )
+        print(f"Running up to {scheduler.max_jobs} samples at once, {scheduler.sample_mb} MB each")
     # create dataset
     for file in files:
-        with open(os.path.join(args.input_dir, file), "r") as f:
-            data = json.load(f) 
+        stem = os.path.splitext(file)[0]
+        results_path = os.path.join(args.output_dir, f"{stem}.jsonl")
+        manifest_path = os.path.join(args.output_dir, f"{stem}.manifest")
+
+        done, complete = load_manifest(manifest_path, results_path)
+        if complete:
+            print(f"{file}: already complete")
+            continue
+        if done:
+            print(f"{file}: resuming, {len(done)} samples already done")
 
-        results = Parallel(n_jobs=-1, verbose=10, batch_size=1)(delayed(process_sample)(sample) for sample in data)
-        results = [result for result in results if result is not None]
-        print(len(results))
+        input_path = os.path.join(args.input_dir, file)
+        samples = (
+            (index, sample)
+            for index, sample in enumerate(iter_json_array(input_path))
+            if index not in done
+        )
+        if args.executor == "staged":
+            results = build_pipeline(workers, args.queue_size).run(samples)
+        else:
+            # a counting pass over the chunk, so the scheduler can report its queue depth
+            remaining = sum(1 for index, _ in enumerate(iter_json_array(input_path)) if index not in done)
+            results = (
+                result for _, result in scheduler.imap_unordered(process_indexed_sample, samples, total=remaining)
+            )
+        num_kept = 0
+        with open(results_path, "a") as results_file, open(manifest_path, "a") as manifest_file:
+            for index, status, sample in results:
+                entry = {"index": index, "status": status}
+                if sample is not None:
+                    entry["end"] = append_line(results_file, sample)
+                    num_kept += 1
+                append_line(manifest_file, entry)
 
-        with open(os.path.join(args.output_dir, file), "w") as f:
-            json.dump(results, f)
+            append_line(manifest_file, {"complete": True})
+        print(f"{file}: kept {num_kept} new samples")
@@ -346,8 +346,14 @@ if __name__=='__main__':
 
     all_data = []
     for filename in os.listdir(args.input_dir):
-        with open(os.path.join(args.input_dir, filename), 'r') as f:
-            all_data.extend(json.load(f))
+        path = os.path.join(args.input_dir, filename)
+        # build_dataset.py writes JSON lines (.jsonl) next to its .manifest files; older runs wrote .json arrays
+        if filename.endswith('.jsonl'):
+            with open(path, 'r') as f:
+                all_data.extend(json.loads(line) for line in f if line.strip())
+        elif filename.endswith('.json'):
+            with open(path, 'r') as f:
+                all_data.extend(json.load(f))
 
     # extract methods from samples
     samples = []
@@ -1,16 +1,14 @@
 import argparse
 import os
 import json
-import time
 
+import java_metrics
 import java_utils
 
 
 def procyon_decompiler_test(sample, byte_code_str):
     class_name = sample["class_name"]
-    start_t = time.time()
-    decomp_procyon_java = java_utils.procyon_decompiler(class_name, byte_code_str)
-    total_time = time.time() - start_t
+    decomp_procyon_java, total_time = java_utils.decompile_timed("procyon", class_name, byte_code_str)
     if decomp_procyon_java is None:
         return {
             "java_source" : decomp_procyon_java,
@@ -20,8 +18,8 @@ def procyon_decompiler_test(sample, byte_code_str):
             "compile" : False,
         }
     
-    procyon_byte_code = java_utils.compile_str(class_name, decomp_procyon_java)
-    if procyon_byte_code is None:
+    compile_result = java_utils.compile_str(class_name, decomp_procyon_java)
+    if not compile_result["success"]:
         return {
             "java_source" : decomp_procyon_java,
             "pass_rate" : 0.0,
@@ -32,9 +30,10 @@ def procyon_decompiler_test(sample, byte_code_str):
     
     procyon_pass_rate = java_utils.evosuite_compile_and_run_test(
         class_name,
-        procyon_byte_code,
+        compile_result["class_file"],
         sample["java_test"],
         sample["java_scaffold"],
+        gold_byte_code=byte_code_str,
     )
 
     return {
@@ -48,9 +47,7 @@ def procyon_decompiler_test(sample, byte_code_str):
 
 def CFR_decompiler_test(sample, byte_code_str):
     class_name = sample["class_name"]
-    start_t = time.time()
-    decomp_CFR_java = java_utils.CFR_decompiler(class_name, byte_code_str)
-    total_time = time.time() - start_t
+    decomp_CFR_java, total_time = java_utils.decompile_timed("cfr", class_name, byte_code_str)
     if decomp_CFR_java is None:
         return {
             "java_source" : decomp_CFR_java,
@@ -60,8 +57,8 @@ def CFR_decompiler_test(sample, byte_code_str):
             "compile" : False,
         }
     
-    CFR_byte_code = java_utils.compile_str(class_name, decomp_CFR_java)
-    if CFR_byte_code is None:
+    compile_result = java_utils.compile_str(class_name, decomp_CFR_java)
+    if not compile_result["success"]:
         return {
             "java_source" : decomp_CFR_java,
             "pass_rate" : 0.0,
@@ -72,9 +69,10 @@ def CFR_decompiler_test(sample, byte_code_str):
     
     CFR_pass_rate = java_utils.evosuite_compile_and_run_test(
         class_name,
-        CFR_byte_code,
+        compile_result["class_file"],
         sample["java_test"],
         sample["java_scaffold"],
+        gold_byte_code=byte_code_str,
     )
 
     return {
@@ -88,9 +86,7 @@ def CFR_decompiler_test(sample, byte_code_str):
 
 def JADX_decompiler_test(sample, byte_code_str):
     class_name = sample["class_name"]
-    start_t = time.time()
-    decomp_JADX_java = java_utils.JADX_decompiler(class_name, byte_code_str)
-    total_time = time.time() - start_t
+    decomp_JADX_java, total_time = java_utils.decompile_timed("jadx", class_name, byte_code_str)
     if decomp_JADX_java is None:
         return {
             "java_source" : decomp_JADX_java,
@@ -101,8 +97,8 @@ def JADX_decompiler_test(sample, byte_code_str):
         }
     
     decomp_JADX_java = java_utils.preprocess_str(decomp_JADX_java)
-    JADX_byte_code = java_utils.compile_str(class_name, decomp_JADX_java)
-    if JADX_byte_code is None:
+    compile_result = java_utils.compile_str(class_name, decomp_JADX_java)
+    if not compile_result["success"]:
         return {
             "java_source" : decomp_JADX_java,
             "pass_rate" : 0.0,
@@ -113,9 +109,10 @@ def JADX_decompiler_test(sample, byte_code_str):
     
     JADX_pass_rate = java_utils.evosuite_compile_and_run_test(
         class_name,
-        JADX_byte_code,
+        compile_result["class_file"],
         sample["java_test"],
         sample["java_scaffold"],
+        gold_byte_code=byte_code_str,
     )
 
     return {
@@ -129,9 +126,7 @@ def JADX_decompiler_test(sample, byte_code_str):
 
 def fernflower_decompiler_test(sample, byte_code_str):
     class_name = sample["class_name"]
-    start_t = time.time()
-    decomp_fernflower_java = java_utils.fernflower_decompiler(class_name, byte_code_str)
-    total_time = time.time() - start_t
+    decomp_fernflower_java, total_time = java_utils.decompile_timed("fernflower", class_name, byte_code_str)
     if decomp_fernflower_java is None:
         return {
             "java_source" : decomp_fernflower_java,
@@ -141,8 +136,8 @@ def fernflower_decompiler_test(sample, byte_code_str):
             "compile" : False,
         }
     
-    fernflower_byte_code = java_utils.compile_str(class_name, decomp_fernflower_java)
-    if fernflower_byte_code is None:
+    compile_result = java_utils.compile_str(class_name, decomp_fernflower_java)
+    if not compile_result["success"]:
         return {
             "java_source" : decomp_fernflower_java,
             "pass_rate" : 0.0,
@@ -153,9 +148,10 @@ def fernflower_decompiler_test(sample, byte_code_str):
     
     fernflower_pass_rate = java_utils.evosuite_compile_and_run_test(
         class_name,
-        fernflower_byte_code,
+        compile_result["class_file"],
         sample["java_test"],
         sample["java_scaffold"],
+        gold_byte_code=byte_code_str,
     )
 
     return {
@@ -169,9 +165,7 @@ def fernflower_decompiler_test(sample, byte_code_str):
 
 def krakatau_decompiler_test(sample, byte_code_str):
     class_name = sample["class_name"]
-    start_t = time.time()
-    decomp_krakatau_java = java_utils.krakatau_decompiler(class_name, byte_code_str)
-    total_time = time.time() - start_t
+    decomp_krakatau_java, total_time = java_utils.decompile_timed("krakatau", class_name, byte_code_str)
     if decomp_krakatau_java is None:
         return {
             "java_source" : decomp_krakatau_java,
@@ -182,8 +176,8 @@ def krakatau_decompiler_test(sample, byte_code_str):
         }
 
 
-    krakatau_byte_code = java_utils.compile_str(class_name, decomp_krakatau_java)
-    if krakatau_byte_code is None:
+    compile_result = java_utils.compile_str(class_name, decomp_krakatau_java)
+    if not compile_result["success"]:
         return {
             "java_source" : decomp_krakatau_java,
             "pass_rate" : 0.0,
@@ -195,9 +189,10 @@ def krakatau_decompiler_test(sample, byte_code_str):
         
     krakatau_pass_rate = java_utils.evosuite_compile_and_run_test(
         class_name,
-        krakatau_byte_code,
+        compile_result["class_file"],
         sample["java_test"],
         sample["java_scaffold"],
+        gold_byte_code=byte_code_str,
     )
 
     return {
@@ -213,8 +208,12 @@ if __name__=='__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument("--data-path", type=str, required=True, help="Data path")
     parser.add_argument("--output-path", type=str, required=True, help="Output path")
+    parser.add_argument("--metrics-out", type=str, default=None, help="Write java_utils timing metrics (JSON and .prom) here at exit")
     args = parser.parse_args()
 
+    if args.metrics_out is not None:
+        java_metrics.dump_at_exit(args.metrics_out)
+
     #load data
     data = []
     with open(args.data_path, 'r') as f:
@@ -227,11 +226,12 @@ if __name__=='__main__':
         print(str(i) + '/' + str(len(data)))
         sample_data = data[i]
         class_name = sample_data["class_name"]
-        gold_byte_code = java_utils.compile_str(class_name, sample_data["java_source"])
+        gold_compile_result = java_utils.compile_str(class_name, sample_data["java_source"])
 
-        if gold_byte_code is None:
+        if not gold_compile_result["success"]:
             pass
         else:
+            gold_byte_code = gold_compile_result["class_file"]
             gold = {
                     "java_source": sample_data["java_source"],
                     "jasm_code": sample_data["jasm_code"],
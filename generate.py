@@ -7,6 +7,7 @@ import torch
 from transformers import AutoTokenizer, AutoModelForCausalLM, StoppingCriteria, StoppingCriteriaList
 
 import prompts
+import java_metrics
 import java_utils
 
 from tree_sitter import Language, Parser
@@ -137,8 +138,12 @@ if __name__=='__main__':
     parser.add_argument("--output-path", type=str, required=True, help="Output path")
     parser.add_argument("--num-samples", type=int, default=-1, help="Number of samples to generate")
     parser.add_argument("--batch-size", type=int, default=4, help="Batch size")
+    parser.add_argument("--metrics-out", type=str, default=None, help="Write java_utils timing metrics (JSON and .prom) here at exit")
     args = parser.parse_args()
 
+    if args.metrics_out is not None:
+        java_metrics.dump_at_exit(args.metrics_out)
+
     # load data
     test_methods_path = os.path.join(args.data_dir, "test_methods.json")
     test_samples_path = os.path.join(args.data_dir, "test_samples.json")
@@ -242,9 +247,9 @@ if __name__=='__main__':
         output["neural"]["java_source"] = pred_java
 
         class_name = java_utils.get_class_name(pred_java)
-        pred_byte_code = java_utils.compile_str(class_name, pred_java)
+        compile_result = java_utils.compile_str(class_name, pred_java, precheck=True)
 
-        if pred_byte_code is None:
+        if not compile_result["success"]:
             print(f"{sample_id}: failed to compile")
             outputs.append(output)
             continue
@@ -253,9 +258,10 @@ if __name__=='__main__':
 
         pass_rate = java_utils.evosuite_compile_and_run_test(
             sample["class_name"],
-            pred_byte_code,
+            compile_result["class_file"],
             sample["java_test"],
             sample["java_scaffold"],
+            gold_jasm=sample["jasm_code"],
         )
 
         end_time  = time.time()
@@ -4,6 +4,7 @@ import time
 
 import split_java
 from peft_util import load_peft_model
+import java_metrics
 import java_utils
 
 BATCH_SIZE = 1
@@ -81,8 +82,12 @@ if __name__ == '__main__':
     parser.add_argument("--input-file", type=str, required=True, help="data file")
     parser.add_argument("--output-file", type=str, required=True, help="output file")
     parser.add_argument("--use-cuda", action="store_true", help="use cuda")
+    parser.add_argument("--metrics-out", type=str, default=None, help="Write java_utils timing metrics (JSON and .prom) here at exit")
     args = parser.parse_args()
 
+    if args.metrics_out is not None:
+        java_metrics.dump_at_exit(args.metrics_out)
+
     data = []
     with open(args.input_file) as f:
         for line in f:
@@ -128,7 +133,7 @@ if __name__ == '__main__':
         result_dict["java_source"] = pred_java
 
         class_name = java_utils.get_class_name(pred_java)
-        compile_result = java_utils.compile_str(class_name, pred_java)
+        compile_result = java_utils.compile_str(class_name, pred_java, precheck=True)
     
         result_dict["compile"] = compile_result["success"]
 
@@ -148,6 +153,7 @@ if __name__ == '__main__':
             compile_result["class_file"],
             d["java_test"],
             d["java_scaffold"],
+            gold_jasm=d["jasm_code"],
         )
 
         result_dict["pass_rate"] = pass_rate
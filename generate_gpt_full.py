@@ -9,6 +9,7 @@ import re
 from concurrent.futures import ProcessPoolExecutor, as_completed
 import os
 
+import java_metrics
 import java_utils
 
 RESERVED_TOKENS = 1500
@@ -285,7 +286,7 @@ def generate_java_class(class_name, jasm_code, java_test, args):
         # print("===========")
     
         # try to compile
-        compile_result = java_utils.compile_str(class_name, pred_java)
+        compile_result = java_utils.compile_str(class_name, pred_java, precheck=True)
 
         # if compilation succeeded, return
         if compile_result["success"]:
@@ -323,10 +324,14 @@ def generate_java_class(class_name, jasm_code, java_test, args):
     return pred_java, compile_attempt_results
 
 
-def test_java_class_driver(class_name, jasm, java_test, java_scaffold, args):
+def test_java_class_driver(class_name, jasm, java_test, java_scaffold, args, gold_byte_code=None):
     curr_test_attempt = 0
     test_compile_results = []
     max_pass_rate = 0.0
+    test_result = None
+    # the last tested class file, if its pass_rate is only a lower bound (--fail-fast), an estimate
+    # (--rerun-failed-first) or possibly disturbed by tests running in parallel (--test-threads)
+    unscored_class_file = None
     while curr_test_attempt < args.max_attempts:
         pred_java, compile_attempt_results = generate_java_class(class_name, jasm, java_test, args)
         if pred_java == "":
@@ -341,7 +346,7 @@ def test_java_class_driver(class_name, jasm, java_test, java_scaffold, args):
             continue
 
         # Recompile to get class file
-        compile_result = java_utils.compile_str(class_name, pred_java)
+        compile_result = java_utils.compile_str(class_name, pred_java, precheck=True)
         if not compile_result["success"]:
             curr_test_attempt += 1
             continue
@@ -351,17 +356,37 @@ def test_java_class_driver(class_name, jasm, java_test, java_scaffold, args):
             class_name, 
             compile_result["class_file"], 
             java_test, 
-            java_scaffold
+            java_scaffold,
+            gold_byte_code=gold_byte_code,
+            fail_fast=args.fail_fast,
+            test_threads=args.test_threads,
+            previous_verdict=test_result if args.rerun_failed_first else None,
         )
 
-        max_pass_rate = max(max_pass_rate, test_result["pass_rate"])
+        # a selective verdict only says the earlier failures still fail, which is enough to reject
+        if test_result.get("stopped_early") or test_result.get("selective") or test_result.get("parallel"):
+            unscored_class_file = compile_result["class_file"]
+        else:
+            unscored_class_file = None
+            max_pass_rate = max(max_pass_rate, test_result["pass_rate"])
 
         if test_result["pass_rate"] < 0.999:
             curr_test_attempt += 1
             continue
         else:
             break
-    
+
+    # final scores need exact pass rates, so the last candidate reruns the whole suite serially
+    if unscored_class_file is not None:
+        full_result = java_utils.evosuite_compile_and_run_test(
+            class_name,
+            unscored_class_file,
+            java_test,
+            java_scaffold,
+            gold_byte_code=gold_byte_code,
+            test_threads=1,
+        )
+        max_pass_rate = max(max_pass_rate, full_result["pass_rate"])
 
     while len(test_compile_results) < args.max_attempts:
         test_compile_results.append([True for _ in range(args.max_attempts)])
@@ -383,13 +408,21 @@ def process_data(d, args):
     java_test = d["java_test"]
     java_scaffold = d["java_scaffold"]
 
+    # compile the gold class once so the tests are compiled once and reused across attempts
+    gold_byte_code = None
+    if "java_source" in d:
+        gold_compile_result = java_utils.compile_str(class_name, d["java_source"])
+        if gold_compile_result["success"]:
+            gold_byte_code = gold_compile_result["class_file"]
+
     # generation
     pred_java, compile_and_test_results, pass_rate = test_java_class_driver(
         class_name,
         jasm,
         java_test,
         java_scaffold,
-        args
+        args,
+        gold_byte_code=gold_byte_code,
     )
 
     # compute stats
@@ -415,8 +448,15 @@ if __name__ == '__main__':
     parser.add_argument("--temperature", type=float, default=1.0)
     parser.add_argument("--max-attempts", type=int, default=5)
     parser.add_argument("--num-workers", type=int, default=4, help="Number of worker processes")
+    parser.add_argument("--fail-fast", action="store_true", help="Stop each test run at its first failure; only the last attempt of an incorrect class reruns in full for its pass_rate")
+    parser.add_argument("--rerun-failed-first", action="store_true", help="Run the tests the previous attempt failed before the full suite; only the last attempt of an incorrect class reruns in full for its pass_rate")
+    parser.add_argument("--test-threads", type=int, default=None, help="Threads running the test methods of a class while screening attempts; scores always come from serial runs (default: java_utils.TEST_THREADS)")
+    parser.add_argument("--metrics-out", type=str, default=None, help="Write java_utils timing metrics (JSON and .prom) here at exit")
     args = parser.parse_args()
 
+    if args.metrics_out is not None:
+        java_metrics.dump_at_exit(args.metrics_out)
+
     data = []
     with open(args.input_file) as f:
         for line in f:
@@ -5,6 +5,7 @@ import time
 
 from transformers import AutoTokenizer, T5ForConditionalGeneration
 import split_java
+import java_metrics
 import java_utils
 
 BATCH_SIZE = 4
@@ -69,8 +70,12 @@ if __name__ == '__main__':
     parser.add_argument("--model-path", type=str, required=True, help="model path")
     parser.add_argument("--input-file", type=str, required=True, help="data file")
     parser.add_argument("--output-file", type=str, required=True, help="output file")
+    parser.add_argument("--metrics-out", type=str, default=None, help="Write java_utils timing metrics (JSON and .prom) here at exit")
     args = parser.parse_args()
 
+    if args.metrics_out is not None:
+        java_metrics.dump_at_exit(args.metrics_out)
+
     data = []
     with open(args.input_file) as f:
         for line in f:
@@ -105,8 +110,9 @@ if __name__ == '__main__':
 
         class_name = java_utils.get_class_name(pred_java)
         try:
-            pred_byte_code = java_utils.compile_str(class_name, pred_java)
-            did_compile = True
+            compile_result = java_utils.compile_str(class_name, pred_java, precheck=True)
+            did_compile = compile_result["success"]
+            pred_byte_code = compile_result.get("class_file")
         except Exception as e:
             pred_byte_code = None
             did_compile = False
@@ -120,6 +126,7 @@ if __name__ == '__main__':
                 pred_byte_code,
                 d["Gold"]["test"],
                 d["Gold"]["scaffold"],
+                gold_jasm=d["Gold"]["jasm_code"],
             )
 
             if pass_rate >= 0.999:
@@ -0,0 +1,209 @@
+import java.io.BufferedInputStream;
+import java.io.BufferedOutputStream;
+import java.io.ByteArrayOutputStream;
+import java.io.DataInputStream;
+import java.io.DataOutputStream;
+import java.io.FileDescriptor;
+import java.io.FileOutputStream;
+import java.io.IOException;
+import java.io.OutputStream;
+import java.net.URI;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.Files;
+import java.util.ArrayList;
+import java.util.Arrays;
+import java.util.LinkedHashMap;
+import java.util.List;
+import java.util.Locale;
+import java.util.Map;
+import javax.tools.Diagnostic;
+import javax.tools.DiagnosticCollector;
+import javax.tools.FileObject;
+import javax.tools.ForwardingJavaFileManager;
+import javax.tools.JavaCompiler;
+import javax.tools.JavaFileObject;
+import javax.tools.SimpleJavaFileObject;
+import javax.tools.StandardJavaFileManager;
+import javax.tools.ToolProvider;
+
+/**
+ * Long-lived javac. Compiles source strings in memory and answers over stdin/stdout.
+ *
+ * Request:  [class_name, source, extra javac options...]
+ * Response: [status ("ok" | "error"), javac-style output, diagnostics as JSON,
+ *            (binary class name, class bytes)...]
+ */
+public final class CompileServer {
+
+  private static final class SourceObject extends SimpleJavaFileObject {
+    private final String source;
+
+    SourceObject(String className, String source) {
+      super(URI.create("string:///" + className + Kind.SOURCE.extension), Kind.SOURCE);
+      this.source = source;
+    }
+
+    @Override
+    public CharSequence getCharContent(boolean ignoreEncodingErrors) {
+      return source;
+    }
+  }
+
+  private static final class ClassObject extends SimpleJavaFileObject {
+    private final ByteArrayOutputStream bytes = new ByteArrayOutputStream();
+
+    ClassObject(String className) {
+      super(URI.create("mem:///" + className.replace('.', '/') + Kind.CLASS.extension), Kind.CLASS);
+    }
+
+    @Override
+    public OutputStream openOutputStream() {
+      return bytes;
+    }
+  }
+
+  private static final class MemoryFileManager extends ForwardingJavaFileManager<StandardJavaFileManager> {
+    final Map<String, ClassObject> outputs = new LinkedHashMap<String, ClassObject>();
+
+    MemoryFileManager(StandardJavaFileManager fileManager) {
+      super(fileManager);
+    }
+
+    @Override
+    public JavaFileObject getJavaFileForOutput(
+        Location location, String className, JavaFileObject.Kind kind, FileObject sibling) {
+      ClassObject output = new ClassObject(className);
+      outputs.put(className, output);
+      return output;
+    }
+  }
+
+  public static void main(String[] args) throws IOException {
+    DataInputStream in = new DataInputStream(new BufferedInputStream(System.in));
+    DataOutputStream out =
+        new DataOutputStream(new BufferedOutputStream(new FileOutputStream(FileDescriptor.out)));
+    // anything printed by javac or user annotation processors must not corrupt the protocol
+    System.setOut(System.err);
+
+    JavaCompiler compiler = ToolProvider.getSystemJavaCompiler();
+    if (compiler == null) {
+      System.err.println("CompileServer: no system java compiler (running on a JRE?)");
+      System.exit(2);
+    }
+    StandardJavaFileManager standardFileManager =
+        compiler.getStandardFileManager(null, Locale.ROOT, StandardCharsets.UTF_8);
+    // mirror `javac -cp .` run in an otherwise empty temp dir
+    String emptyClasspath = Files.createTempDirectory("compile-server").toString();
+
+    List<byte[]> request;
+    while ((request = DaemonIO.readFrame(in)) != null) {
+      String className = DaemonIO.str(request.get(0));
+      String source = DaemonIO.str(request.get(1));
+      List<String> options = new ArrayList<String>(Arrays.asList("-cp", emptyClasspath));
+      for (byte[] option : request.subList(2, request.size())) {
+        options.add(DaemonIO.str(option));
+      }
+      DaemonIO.writeFrame(out, compile(compiler, standardFileManager, className, source, options));
+    }
+  }
+
+  private static List<byte[]> compile(
+      JavaCompiler compiler,
+      StandardJavaFileManager standardFileManager,
+      String className,
+      String source,
+      List<String> options) {
+    DiagnosticCollector<JavaFileObject> diagnostics = new DiagnosticCollector<JavaFileObject>();
+    MemoryFileManager fileManager = new MemoryFileManager(standardFileManager);
+    List<JavaFileObject> units = new ArrayList<JavaFileObject>();
+    units.add(new SourceObject(className, source));
+
+    boolean success;
+    try {
+      success = compiler.getTask(null, fileManager, diagnostics, options, null, units).call();
+    } catch (RuntimeException e) {
+      // javac crashed (e.g. a compiler bug on a pathological input); report it like javac would
+      List<byte[]> response = new ArrayList<byte[]>();
+      response.add(DaemonIO.bytes("error"));
+      response.add(DaemonIO.bytes("An exception has occurred in the compiler: " + e + "\n"));
+      response.add(DaemonIO.bytes("[]"));
+      return response;
+    }
+
+    List<byte[]> response = new ArrayList<byte[]>();
+    response.add(DaemonIO.bytes(success ? "ok" : "error"));
+    response.add(DaemonIO.bytes(formatDiagnostics(className, source, diagnostics.getDiagnostics())));
+    response.add(DaemonIO.bytes(diagnosticsJson(diagnostics.getDiagnostics())));
+    if (success) {
+      for (Map.Entry<String, ClassObject> output : fileManager.outputs.entrySet()) {
+        response.add(DaemonIO.bytes(output.getKey()));
+        response.add(output.getValue().bytes.toByteArray());
+      }
+    }
+    return response;
+  }
+
+  /** Renders diagnostics the way command line javac prints them. */
+  private static String formatDiagnostics(
+      String className, String source, List<Diagnostic<? extends JavaFileObject>> diagnostics) {
+    String[] lines = source.split("\n", -1);
+    StringBuilder sb = new StringBuilder();
+    int errors = 0;
+    int warnings = 0;
+    for (Diagnostic<? extends JavaFileObject> d : diagnostics) {
+      String message = d.getMessage(Locale.ROOT);
+      String kind;
+      switch (d.getKind()) {
+        case ERROR:
+          kind = "error";
+          errors++;
+          break;
+        case WARNING:
+        case MANDATORY_WARNING:
+          kind = "warning";
+          warnings++;
+          break;
+        default:
+          sb.append("Note: ").append(message).append('\n');
+          continue;
+      }
+      if (d.getSource() == null || d.getLineNumber() == Diagnostic.NOPOS) {
+        sb.append(kind).append(": ").append(message).append('\n');
+        continue;
+      }
+      long line = d.getLineNumber();
+      sb.append(className).append(".java:").append(line).append(": ")
+          .append(kind).append(": ").append(message).append('\n');
+      if (line >= 1 && line <= lines.length) {
+        sb.append(lines[(int) line - 1]).append('\n');
+        long column = d.getColumnNumber();
+        for (long i = 1; i < column; i++) {
+          sb.append(' ');
+        }
+        sb.append("^\n");
+      }
+    }
+    if (errors > 0) {
+      sb.append(errors).append(errors == 1 ? " error\n" : " errors\n");
+    }
+    if (warnings > 0) {
+      sb.append(warnings).append(warnings == 1 ? " warning\n" : " warnings\n");
+    }
+    return sb.toString();
+  }
+
+  private static String diagnosticsJson(List<Diagnostic<? extends JavaFileObject>> diagnostics) {
+    StringBuilder sb = new StringBuilder("[");
+    for (Diagnostic<? extends JavaFileObject> d : diagnostics) {
+      if (sb.length() > 1) {
+        sb.append(',');
+      }
+      sb.append("{\"kind\":").append(DaemonIO.json(d.getKind().name()))
+          .append(",\"line\":").append(d.getLineNumber())
+          .append(",\"column\":").append(d.getColumnNumber())
+          .append(",\"message\":").append(DaemonIO.json(d.getMessage(Locale.ROOT)))
+          .append('}');
+    }
+    return sb.append(']').toString();
+  }
+}
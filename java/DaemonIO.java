@@ -0,0 +1,100 @@
+import java.io.ByteArrayOutputStream;
+import java.io.DataInputStream;
+import java.io.DataOutputStream;
+import java.io.EOFException;
+import java.io.IOException;
+import java.nio.charset.StandardCharsets;
+import java.util.ArrayList;
+import java.util.List;
+
+/**
+ * Framing shared by the long-lived helper JVMs driven from java_daemon.py.
+ *
+ * A frame is an int32 field count followed by (int32 length, bytes) for each
+ * field. Both ints are big-endian, which is what DataInputStream uses.
+ */
+public final class DaemonIO {
+
+  private DaemonIO() {}
+
+  /** Reads one frame, or returns null if the client closed the pipe. */
+  public static List<byte[]> readFrame(DataInputStream in) throws IOException {
+    int numFields;
+    try {
+      numFields = in.readInt();
+    } catch (EOFException e) {
+      return null;
+    }
+    List<byte[]> fields = new ArrayList<byte[]>(numFields);
+    for (int i = 0; i < numFields; i++) {
+      byte[] field = new byte[in.readInt()];
+      in.readFully(field);
+      fields.add(field);
+    }
+    return fields;
+  }
+
+  public static void writeFrame(DataOutputStream out, List<byte[]> fields) throws IOException {
+    out.writeInt(fields.size());
+    for (byte[] field : fields) {
+      out.writeInt(field.length);
+      out.write(field);
+    }
+    out.flush();
+  }
+
+  public static String str(byte[] field) {
+    return new String(field, StandardCharsets.UTF_8);
+  }
+
+  public static byte[] bytes(String s) {
+    return s.getBytes(StandardCharsets.UTF_8);
+  }
+
+  /** Escapes a string as a JSON string literal (including the quotes). */
+  public static String json(String s) {
+    if (s == null) {
+      return "null";
+    }
+    StringBuilder sb = new StringBuilder(s.length() + 2);
+    sb.append('"');
+    for (int i = 0; i < s.length(); i++) {
+      char c = s.charAt(i);
+      switch (c) {
+        case '"':
+          sb.append("\\\"");
+          break;
+        case '\\':
+          sb.append("\\\\");
+          break;
+        case '\n':
+          sb.append("\\n");
+          break;
+        case '\r':
+          sb.append("\\r");
+          break;
+        case '\t':
+          sb.append("\\t");
+          break;
+        default:
+          if (c < 0x20) {
+            sb.append(String.format("\\u%04x", (int) c));
+          } else {
+            sb.append(c);
+          }
+      }
+    }
+    sb.append('"');
+    return sb.toString();
+  }
+
+  public static byte[] readAll(java.io.InputStream in) throws IOException {
+    ByteArrayOutputStream out = new ByteArrayOutputStream();
+    byte[] buf = new byte[8192];
+    int n;
+    while ((n = in.read(buf)) != -1) {
+      out.write(buf, 0, n);
+    }
+    return out.toByteArray();
+  }
+}
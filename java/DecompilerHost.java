@@ -0,0 +1,183 @@
+import com.strobel.assembler.InputTypeLoader;
+import com.strobel.assembler.metadata.ArrayTypeLoader;
+import com.strobel.assembler.metadata.CompositeTypeLoader;
+import com.strobel.decompiler.Decompiler;
+import com.strobel.decompiler.DecompilerSettings;
+import com.strobel.decompiler.PlainTextOutput;
+import java.io.BufferedInputStream;
+import java.io.BufferedOutputStream;
+import java.io.DataInputStream;
+import java.io.DataOutputStream;
+import java.io.File;
+import java.io.FileDescriptor;
+import java.io.FileOutputStream;
+import java.io.IOException;
+import java.io.PrintWriter;
+import java.io.StringWriter;
+import java.nio.file.Files;
+import java.nio.file.Path;
+import java.util.ArrayList;
+import java.util.Collection;
+import java.util.Collections;
+import java.util.HashMap;
+import java.util.List;
+import java.util.jar.Manifest;
+import org.benf.cfr.reader.api.CfrDriver;
+import org.benf.cfr.reader.api.OutputSinkFactory;
+import org.jetbrains.java.decompiler.main.decompiler.BaseDecompiler;
+import org.jetbrains.java.decompiler.main.extern.IFernflowerLogger;
+import org.jetbrains.java.decompiler.main.extern.IResultSaver;
+
+/**
+ * Long-lived host for the Procyon, CFR and Fernflower decompilers.
+ *
+ * Request:  [decompiler ("procyon" | "cfr" | "fernflower"), class_name, class bytes]
+ * Response: [status ("ok" | "error"), java source or stack trace, decompile time in nanoseconds]
+ *
+ * Each decompiler is driven through its library API. Procyon and Fernflower read the
+ * class bytes from memory; CFR reads them from a per-request temp file. The reported
+ * time covers only the decompiler call, not JVM startup or class loading of the host.
+ *
+ * Usage: DecompilerHost (Procyon, CFR and Fernflower jars on the classpath)
+ */
+public final class DecompilerHost {
+
+  public static void main(String[] args) throws IOException {
+    DataInputStream in = new DataInputStream(new BufferedInputStream(System.in));
+    DataOutputStream out =
+        new DataOutputStream(new BufferedOutputStream(new FileOutputStream(FileDescriptor.out)));
+    System.setOut(System.err);
+
+    List<byte[]> request;
+    while ((request = DaemonIO.readFrame(in)) != null) {
+      String decompiler = DaemonIO.str(request.get(0));
+      String className = DaemonIO.str(request.get(1));
+      byte[] classBytes = request.get(2);
+
+      List<byte[]> response = new ArrayList<byte[]>();
+      Path workDir = Files.createTempDirectory("decompiler-host");
+      long start = System.nanoTime();
+      try {
+        String source = decompile(decompiler, className, classBytes, workDir);
+        long elapsed = System.nanoTime() - start;
+        response.add(DaemonIO.bytes(source != null ? "ok" : "error"));
+        response.add(DaemonIO.bytes(source != null ? source : "no output for " + className));
+        response.add(DaemonIO.bytes(Long.toString(elapsed)));
+      } catch (Throwable t) {
+        long elapsed = System.nanoTime() - start;
+        StringWriter trace = new StringWriter();
+        t.printStackTrace(new PrintWriter(trace));
+        response.add(DaemonIO.bytes("error"));
+        response.add(DaemonIO.bytes(trace.toString()));
+        response.add(DaemonIO.bytes(Long.toString(elapsed)));
+      } finally {
+        deleteRecursively(workDir.toFile());
+      }
+      DaemonIO.writeFrame(out, response);
+    }
+  }
+
+  private static String decompile(String decompiler, String className, byte[] classBytes, Path workDir)
+      throws IOException {
+    switch (decompiler) {
+      case "procyon":
+        return procyon(className, classBytes);
+      case "cfr":
+        return cfr(className, classBytes, workDir);
+      case "fernflower":
+        return fernflower(className, classBytes, workDir);
+      default:
+        throw new IllegalArgumentException("unknown decompiler " + decompiler);
+    }
+  }
+
+  private static String procyon(String className, byte[] classBytes) {
+    DecompilerSettings settings = DecompilerSettings.javaDefaults();
+    settings.setTypeLoader(new CompositeTypeLoader(new ArrayTypeLoader(classBytes), new InputTypeLoader()));
+    StringWriter writer = new StringWriter();
+    Decompiler.decompile(className, new PlainTextOutput(writer), settings);
+    return writer.toString();
+  }
+
+  private static String cfr(String className, byte[] classBytes, Path workDir) throws IOException {
+    Path classFile = workDir.resolve(className + ".class");
+    Files.write(classFile, classBytes);
+
+    final StringBuilder source = new StringBuilder();
+    OutputSinkFactory sinks = new OutputSinkFactory() {
+      @Override
+      public List<SinkClass> getSupportedSinks(SinkType sinkType, Collection<SinkClass> available) {
+        return Collections.singletonList(SinkClass.STRING);
+      }
+
+      @Override
+      public <T> Sink<T> getSink(SinkType sinkType, SinkClass sinkClass) {
+        if (sinkType == SinkType.JAVA) {
+          return x -> source.append(x);
+        }
+        return x -> {};
+      }
+    };
+    new CfrDriver.Builder().withOutputSink(sinks).build()
+        .analyse(Collections.singletonList(classFile.toString()));
+    return source.length() > 0 ? source.toString() : null;
+  }
+
+  private static String fernflower(String className, byte[] classBytes, Path workDir) {
+    final String[] result = new String[1];
+    IResultSaver saver = new IResultSaver() {
+      @Override
+      public void saveFolder(String path) {}
+
+      @Override
+      public void copyFile(String source, String path, String entryName) {}
+
+      @Override
+      public void saveClassFile(String path, String qualifiedName, String entryName, String content, int[] mapping) {
+        result[0] = content;
+      }
+
+      @Override
+      public void createArchive(String path, String archiveName, Manifest manifest) {}
+
+      @Override
+      public void saveDirEntry(String path, String archiveName, String entryName) {}
+
+      @Override
+      public void copyEntry(String source, String path, String archiveName, String entry) {}
+
+      @Override
+      public void saveClassEntry(
+          String path, String archiveName, String qualifiedName, String entryName, String content) {
+        result[0] = content;
+      }
+
+      @Override
+      public void closeArchive(String path, String archiveName) {}
+    };
+    IFernflowerLogger logger = new IFernflowerLogger() {
+      @Override
+      public void writeMessage(String message, Severity severity) {}
+
+      @Override
+      public void writeMessage(String message, Severity severity, Throwable t) {}
+    };
+
+    // the class is served from memory; the path only names it
+    BaseDecompiler decompiler = new BaseDecompiler(
+        (externalPath, internalPath) -> classBytes, saver, new HashMap<String, Object>(), logger);
+    decompiler.addSource(new File(workDir.toFile(), className + ".class"));
+    decompiler.decompileContext();
+    return result[0];
+  }
+
+  private static void deleteRecursively(File file) {
+    File[] children = file.listFiles();
+    if (children != null) {
+      for (File child : children) {
+        deleteRecursively(child);
+      }
+    }
+    file.delete();
+  }
+}
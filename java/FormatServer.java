@@ -0,0 +1,49 @@
+import com.google.googlejavaformat.java.Formatter;
+import com.google.googlejavaformat.java.FormatterException;
+import java.io.BufferedInputStream;
+import java.io.BufferedOutputStream;
+import java.io.DataInputStream;
+import java.io.DataOutputStream;
+import java.io.FileDescriptor;
+import java.io.FileOutputStream;
+import java.io.IOException;
+import java.util.ArrayList;
+import java.util.List;
+
+/**
+ * Long-lived google-java-format.
+ *
+ * Request:  [source...]
+ * Response: [(status ("ok" | "error"), formatted source or error message)...], one pair per source
+ *
+ * Sources are formatted like the google-java-format command line does by default:
+ * reformatted, unused imports removed and imports sorted.
+ *
+ * Usage: FormatServer (google-java-format jar on the classpath)
+ */
+public final class FormatServer {
+
+  public static void main(String[] args) throws IOException {
+    DataInputStream in = new DataInputStream(new BufferedInputStream(System.in));
+    DataOutputStream out =
+        new DataOutputStream(new BufferedOutputStream(new FileOutputStream(FileDescriptor.out)));
+    System.setOut(System.err);
+
+    Formatter formatter = new Formatter();
+    List<byte[]> request;
+    while ((request = DaemonIO.readFrame(in)) != null) {
+      List<byte[]> response = new ArrayList<byte[]>(2 * request.size());
+      for (byte[] source : request) {
+        try {
+          String formatted = formatter.formatSourceAndFixImports(DaemonIO.str(source));
+          response.add(DaemonIO.bytes("ok"));
+          response.add(DaemonIO.bytes(formatted));
+        } catch (FormatterException | RuntimeException e) {
+          response.add(DaemonIO.bytes("error"));
+          response.add(DaemonIO.bytes(String.valueOf(e.getMessage())));
+        }
+      }
+      DaemonIO.writeFrame(out, response);
+    }
+  }
+}
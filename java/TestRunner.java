@@ -0,0 +1,279 @@
+import java.io.IOException;
+import java.io.OutputStreamWriter;
+import java.io.Writer;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.Files;
+import java.nio.file.Paths;
+import java.util.ArrayList;
+import java.util.Arrays;
+import java.util.HashSet;
+import java.util.LinkedHashMap;
+import java.util.List;
+import java.util.Map;
+import java.util.Set;
+import java.util.concurrent.ExecutionException;
+import java.util.concurrent.ExecutorService;
+import java.util.concurrent.Executors;
+import java.util.concurrent.Future;
+import java.util.concurrent.ThreadFactory;
+import org.junit.runner.Description;
+import org.junit.runner.Request;
+import org.junit.runner.Result;
+import org.junit.runner.Runner;
+import org.junit.runner.manipulation.Filter;
+import org.junit.runner.notification.Failure;
+import org.junit.runner.notification.RunListener;
+import org.junit.runner.notification.RunNotifier;
+import org.junit.runner.notification.StoppedByUserException;
+import org.junit.runners.ParentRunner;
+import org.junit.runners.model.RunnerScheduler;
+
+/**
+ * Runs one JUnit test class and reports per-test results as JSON.
+ *
+ * TestServer loads this class through the same throwaway class loader as the class
+ * under test, so everything it touches (JUnit, the EvoSuite runtime) is fresh per run.
+ * Without the server it runs as its own JVM and writes the report to a file, since the
+ * tests themselves print to stdout and stderr.
+ *
+ * Two modes trade the exact pass rate for speed: "fail_fast" stops at the first failing
+ * test (the report then has "stopped": true and covers only the tests that ran), and more
+ * than one thread runs the test methods on a pool of that size inside this JVM. A
+ * comma-separated list of test method names runs only those methods.
+ *
+ * Usage: TestRunner <test class> <report file> [all|fail_fast [threads [methods]]]
+ * (JUnit and the EvoSuite runtime on the classpath)
+ */
+public final class TestRunner {
+
+  private static final class TestResult {
+    final String name;
+    String status = "passed";
+    long startNanos;
+    double duration;
+    String exception;
+    String message;
+
+    TestResult(String name) {
+      this.name = name;
+    }
+  }
+
+  // RunNotifier serializes calls to listeners not marked @ThreadSafe, so this one needs no locking
+  private static final class JsonListener extends RunListener {
+    final Map<String, TestResult> results = new LinkedHashMap<String, TestResult>();
+    // set in fail-fast mode: asked to stop at the first failure
+    final RunNotifier stopOnFailure;
+
+    JsonListener(RunNotifier stopOnFailure) {
+      this.stopOnFailure = stopOnFailure;
+    }
+
+    private TestResult result(Description description) {
+      String name = description.getMethodName() != null
+          ? description.getMethodName()
+          : description.getDisplayName();
+      TestResult result = results.get(name);
+      if (result == null) {
+        result = new TestResult(name);
+        results.put(name, result);
+      }
+      return result;
+    }
+
+    @Override
+    public void testStarted(Description description) {
+      result(description).startNanos = System.nanoTime();
+    }
+
+    @Override
+    public void testFinished(Description description) {
+      TestResult result = result(description);
+      result.duration = (System.nanoTime() - result.startNanos) / 1e9;
+    }
+
+    @Override
+    public void testFailure(Failure failure) {
+      TestResult result = result(failure.getDescription());
+      result.status = "failed";
+      result.exception = failure.getException().getClass().getName();
+      result.message = failure.getMessage();
+      if (stopOnFailure != null) {
+        stopOnFailure.pleaseStop();
+      }
+    }
+
+    @Override
+    public void testAssumptionFailure(Failure failure) {
+      TestResult result = result(failure.getDescription());
+      result.status = "skipped";
+      result.message = failure.getMessage();
+    }
+
+    @Override
+    public void testIgnored(Description description) {
+      result(description).status = "skipped";
+    }
+  }
+
+  /** Runs the children of a test class on a fixed pool and waits for all of them. */
+  private static final class PoolScheduler implements RunnerScheduler {
+    private final ExecutorService pool;
+    private final List<Future<?>> futures = new ArrayList<Future<?>>();
+
+    PoolScheduler(ExecutorService pool) {
+      this.pool = pool;
+    }
+
+    @Override
+    public void schedule(Runnable childStatement) {
+      futures.add(pool.submit(childStatement));
+    }
+
+    @Override
+    public void finished() {
+      StoppedByUserException stopped = null;
+      for (Future<?> future : futures) {
+        try {
+          future.get();
+        } catch (ExecutionException e) {
+          // a child that started after pleaseStop(); report the stop once everything has finished
+          if (e.getCause() instanceof StoppedByUserException) {
+            stopped = (StoppedByUserException) e.getCause();
+          } else if (e.getCause() instanceof RuntimeException) {
+            throw (RuntimeException) e.getCause();
+          } else {
+            throw new RuntimeException(e.getCause());
+          }
+        } catch (InterruptedException e) {
+          Thread.currentThread().interrupt();
+          throw new RuntimeException(e);
+        }
+      }
+      if (stopped != null) {
+        throw stopped;
+      }
+    }
+  }
+
+  /** Selects test methods by name. */
+  private static final class MethodFilter extends Filter {
+    private final Set<String> names;
+
+    MethodFilter(Set<String> names) {
+      this.names = names;
+    }
+
+    @Override
+    public boolean shouldRun(Description description) {
+      if (description.isTest()) {
+        return names.contains(description.getMethodName());
+      }
+      for (Description child : description.getChildren()) {
+        if (shouldRun(child)) {
+          return true;
+        }
+      }
+      return false;
+    }
+
+    @Override
+    public String describe() {
+      return "methods " + names;
+    }
+  }
+
+  private TestRunner() {}
+
+  public static void main(String[] args) throws ClassNotFoundException, IOException {
+    boolean failFast = args.length > 2 && args[2].equals("fail_fast");
+    int threads = args.length > 3 ? Integer.parseInt(args[3]) : 1;
+    String methods = args.length > 4 ? args[4] : "";
+    String report = run(args[0], failFast, threads, methods);
+    try (Writer writer = new OutputStreamWriter(
+        Files.newOutputStream(Paths.get(args[1])), StandardCharsets.UTF_8)) {
+      writer.write(report);
+    }
+    // EvoSuite's runtime may leave non-daemon threads behind
+    System.exit(0);
+  }
+
+  /** Runs every test of a class serially; returns the JSON report. */
+  public static String run(String testClassName) throws ClassNotFoundException {
+    return run(testClassName, false, 1, "");
+  }
+
+  /**
+   * Entry point used reflectively by TestServer; returns the JSON report. `methods` is a
+   * comma-separated list of the test methods to run, or empty for all of them.
+   */
+  public static String run(String testClassName, boolean failFast, int threads, String methods)
+      throws ClassNotFoundException {
+    // TestServer puts the request's classes in the context loader, a child of the one that loaded this class
+    ClassLoader loader = Thread.currentThread().getContextClassLoader();
+    Class<?> testClass = Class.forName(testClassName, true, loader != null ? loader : TestRunner.class.getClassLoader());
+    Request request = Request.aClass(testClass);
+    if (!methods.isEmpty()) {
+      request = request.filterWith(new MethodFilter(new HashSet<String>(Arrays.asList(methods.split(",")))));
+    }
+    Runner runner = request.getRunner();
+
+    ExecutorService pool = null;
+    if (threads > 1 && runner instanceof ParentRunner) {
+      pool = Executors.newFixedThreadPool(threads, new ThreadFactory() {
+        @Override
+        public Thread newThread(Runnable r) {
+          Thread thread = new Thread(r, "test-runner");
+          // inherits the context class loader TestServer set for this request
+          thread.setDaemon(true);
+          return thread;
+        }
+      });
+      ((ParentRunner<?>) runner).setScheduler(new PoolScheduler(pool));
+    }
+
+    // what JUnitCore.run does, but with a notifier the fail-fast listener can stop
+    RunNotifier notifier = new RunNotifier();
+    Result result = new Result();
+    notifier.addFirstListener(result.createListener());
+    JsonListener listener = new JsonListener(failFast ? notifier : null);
+    notifier.addListener(listener);
+    boolean stopped = false;
+    try {
+      notifier.fireTestRunStarted(runner.getDescription());
+      runner.run(notifier);
+    } catch (StoppedByUserException e) {
+      stopped = true;
+    } finally {
+      if (pool != null) {
+        pool.shutdownNow();
+      }
+    }
+    notifier.fireTestRunFinished(result);
+
+    return toJson(result, runner.getDescription().testCount(), stopped,
+        new ArrayList<TestResult>(listener.results.values()));
+  }
+
+  private static String toJson(Result result, int testsTotal, boolean stopped, List<TestResult> tests) {
+    StringBuilder sb = new StringBuilder();
+    sb.append("{\"tests_run\":").append(result.getRunCount())
+        .append(",\"failures\":").append(result.getFailureCount())
+        .append(",\"tests_total\":").append(testsTotal)
+        .append(",\"stopped\":").append(stopped)
+        .append(",\"tests\":[");
+    for (int i = 0; i < tests.size(); i++) {
+      TestResult test = tests.get(i);
+      if (i > 0) {
+        sb.append(',');
+      }
+      sb.append("{\"name\":").append(DaemonIO.json(test.name))
+          .append(",\"status\":").append(DaemonIO.json(test.status))
+          .append(",\"duration\":").append(test.duration)
+          .append(",\"exception\":").append(DaemonIO.json(test.exception))
+          .append(",\"message\":").append(DaemonIO.json(test.message))
+          .append('}');
+    }
+    return sb.append("]}").toString();
+  }
+}
@@ -0,0 +1,219 @@
+import java.io.BufferedInputStream;
+import java.io.BufferedOutputStream;
+import java.io.DataInputStream;
+import java.io.DataOutputStream;
+import java.io.File;
+import java.io.FileDescriptor;
+import java.io.FileOutputStream;
+import java.io.IOException;
+import java.io.StringWriter;
+import java.io.PrintWriter;
+import java.lang.reflect.InvocationTargetException;
+import java.lang.reflect.Method;
+import java.net.URL;
+import java.net.URLClassLoader;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.Files;
+import java.nio.file.Path;
+import java.util.ArrayList;
+import java.util.Arrays;
+import java.util.List;
+import java.util.Locale;
+import javax.tools.JavaCompiler;
+import javax.tools.StandardJavaFileManager;
+import javax.tools.ToolProvider;
+
+/**
+ * Long-lived EvoSuite/JUnit runner.
+ *
+ * Request:  [class_name, class bytes, test source, scaffolding source,
+ *            mode ("all" | "fail_fast"), threads, test methods to run (comma-separated, empty: all),
+ *            (precompiled test class file name, class bytes)...]
+ * Response: [status ("ok" | "compile_error"), JSON report from TestRunner or javac output]
+ *
+ * When precompiled test classes are sent the sources are not compiled again.
+ * javac stays warm in this JVM, and so do JUnit, the EvoSuite runtime and TestRunner: they are
+ * loaded once, by a shared loader. The class under test and the compiled tests are loaded
+ * through a throwaway child-first loader per request, so no candidate's classes or static
+ * state leak into the next; EvoSuite's own resets (scaffolding @Before/@After) cover the runtime.
+ *
+ * Every request uses the same work directory, which is also last on the shared loader's class
+ * path: EvoRunner re-reads the class under test from there through a fresh instrumenting loader
+ * of its own, which can only find classes through the loader that defined EvoRunner.
+ *
+ * Usage: TestServer <runtime jar>...
+ */
+public final class TestServer {
+
+  public static void main(String[] args) throws IOException {
+    DataInputStream in = new DataInputStream(new BufferedInputStream(System.in));
+    DataOutputStream out =
+        new DataOutputStream(new BufferedOutputStream(new FileOutputStream(FileDescriptor.out)));
+    // tests print freely; keep that off the protocol stream
+    System.setOut(System.err);
+
+    JavaCompiler compiler = ToolProvider.getSystemJavaCompiler();
+    if (compiler == null) {
+      System.err.println("TestServer: no system java compiler (running on a JRE?)");
+      System.exit(2);
+    }
+    StandardJavaFileManager fileManager =
+        compiler.getStandardFileManager(null, Locale.ROOT, StandardCharsets.UTF_8);
+    List<String> runtimeJars = Arrays.asList(args);
+    URL helpersUrl = TestServer.class.getProtectionDomain().getCodeSource().getLocation();
+    Path workDir = Files.createTempDirectory("test-server");
+    ClassLoader shared = sharedLoader(runtimeJars, helpersUrl, workDir);
+
+    List<byte[]> request;
+    while ((request = DaemonIO.readFrame(in)) != null) {
+      List<byte[]> response;
+      try {
+        response = handle(compiler, fileManager, runtimeJars, shared, workDir, request);
+      } catch (Throwable t) {
+        StringWriter trace = new StringWriter();
+        t.printStackTrace(new PrintWriter(trace));
+        response = new ArrayList<byte[]>();
+        response.add(DaemonIO.bytes("crash"));
+        response.add(DaemonIO.bytes(trace.toString()));
+      } finally {
+        emptyDirectory(workDir.toFile());
+      }
+      DaemonIO.writeFrame(out, response);
+    }
+    deleteRecursively(workDir.toFile());
+  }
+
+  /** JUnit, the EvoSuite runtime and TestRunner, loaded once; the JDK comes from the extension loader. */
+  private static ClassLoader sharedLoader(List<String> runtimeJars, URL helpersUrl, Path workDir)
+      throws IOException {
+    List<URL> urls = new ArrayList<URL>();
+    urls.add(helpersUrl);
+    for (String jar : runtimeJars) {
+      urls.add(new File(jar).toURI().toURL());
+    }
+    // last, so the JDK, JUnit and EvoSuite always win; only resources of the request's classes are found here
+    urls.add(workDir.toUri().toURL());
+    return new URLClassLoader(urls.toArray(new URL[0]), ClassLoader.getSystemClassLoader().getParent());
+  }
+
+  /**
+   * Defines the request's classes (found in the work directory) itself instead of asking its
+   * parent first, so the shared loader never caches a candidate or test class.
+   */
+  private static final class RequestLoader extends URLClassLoader {
+    RequestLoader(Path workDir, ClassLoader parent) throws IOException {
+      super(new URL[] {workDir.toUri().toURL()}, parent);
+    }
+
+    @Override
+    protected Class<?> loadClass(String name, boolean resolve) throws ClassNotFoundException {
+      synchronized (getClassLoadingLock(name)) {
+        Class<?> loaded = findLoadedClass(name);
+        if (loaded == null && findResource(name.replace('.', '/') + ".class") != null) {
+          loaded = findClass(name);
+        }
+        if (loaded == null) {
+          return super.loadClass(name, resolve);
+        }
+        if (resolve) {
+          resolveClass(loaded);
+        }
+        return loaded;
+      }
+    }
+  }
+
+  private static List<byte[]> handle(
+      JavaCompiler compiler,
+      StandardJavaFileManager fileManager,
+      List<String> runtimeJars,
+      ClassLoader shared,
+      Path workDir,
+      List<byte[]> request)
+      throws Exception {
+    String className = DaemonIO.str(request.get(0));
+    Files.write(workDir.resolve(className + ".class"), request.get(1));
+    Path testFile = workDir.resolve(className + "_ESTest.java");
+    Path scaffoldFile = workDir.resolve(className + "_ESTest_scaffolding.java");
+    Files.write(testFile, request.get(2));
+    Files.write(scaffoldFile, request.get(3));
+
+    boolean failFast = DaemonIO.str(request.get(4)).equals("fail_fast");
+    int threads = Integer.parseInt(DaemonIO.str(request.get(5)));
+    String methods = DaemonIO.str(request.get(6));
+
+    List<byte[]> response = new ArrayList<byte[]>();
+    if (request.size() > 7) {
+      for (int i = 7; i + 1 < request.size(); i += 2) {
+        Files.write(workDir.resolve(new File(DaemonIO.str(request.get(i))).getName()), request.get(i + 1));
+      }
+      return run(className, failFast, threads, methods, shared, workDir, response);
+    }
+
+    List<String> classpath = new ArrayList<String>();
+    classpath.add(workDir.toString());
+    classpath.addAll(runtimeJars);
+    List<String> options =
+        Arrays.asList("-nowarn", "-cp", String.join(File.pathSeparator, classpath), "-d", workDir.toString());
+    StringWriter javacOutput = new StringWriter();
+    boolean compiled = compiler
+        .getTask(javacOutput, fileManager, null, options, null,
+            fileManager.getJavaFileObjects(testFile.toFile(), scaffoldFile.toFile()))
+        .call();
+
+    if (!compiled) {
+      response.add(DaemonIO.bytes("compile_error"));
+      response.add(DaemonIO.bytes(javacOutput.toString()));
+      return response;
+    }
+    return run(className, failFast, threads, methods, shared, workDir, response);
+  }
+
+  private static List<byte[]> run(
+      String className,
+      boolean failFast,
+      int threads,
+      String methods,
+      ClassLoader shared,
+      Path workDir,
+      List<byte[]> response)
+      throws Exception {
+    Thread thread = Thread.currentThread();
+    ClassLoader previous = thread.getContextClassLoader();
+    // TestRunner loads the test class through the context loader
+    URLClassLoader loader = new RequestLoader(workDir, shared);
+    try {
+      thread.setContextClassLoader(loader);
+      Method run = shared.loadClass("TestRunner")
+          .getMethod("run", String.class, boolean.class, int.class, String.class);
+      String report = (String) run.invoke(null, className + "_ESTest", failFast, threads, methods);
+      response.add(DaemonIO.bytes("ok"));
+      response.add(DaemonIO.bytes(report));
+      return response;
+    } catch (InvocationTargetException e) {
+      throw (Exception) (e.getCause() instanceof Exception ? e.getCause() : e);
+    } finally {
+      thread.setContextClassLoader(previous);
+      loader.close();
+    }
+  }
+
+  private static void emptyDirectory(File dir) {
+    File[] children = dir.listFiles();
+    if (children != null) {
+      for (File child : children) {
+        deleteRecursively(child);
+      }
+    }
+  }
+
+  private static void deleteRecursively(File file) {
+    File[] children = file.listFiles();
+    if (children != null) {
+      for (File child : children) {
+        deleteRecursively(child);
+      }
+    }
+    file.delete();
+  }
+}
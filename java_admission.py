@@ -0,0 +1,190 @@
+"""
+Memory-aware admission control for running java_utils.py pipelines in parallel.
+
+A worker running one sample through the toolchain holds its helper daemons
+(compile, format and test servers) and, at its peak, an EvoSuite run with a
+MAX_JAVA_MEM heap. Running one worker per core oversubscribes RAM on most
+machines, so MemoryScheduler sizes its process pool by memory as well as by
+cores, and holds back new samples while the machine's available memory is
+below what one more sample needs.
+
+    scheduler = java_admission.MemoryScheduler(java_admission.sample_memory_mb(["evosuite_gen", "test"]))
+    results = scheduler.map(process_sample, samples)
+    # or, writing each result as soon as it is ready:
+    for index, result in scheduler.imap_unordered(process_sample, iter_samples()):
+        ...
+"""
+
+import concurrent.futures
+import os
+import sys
+import threading
+import time
+
+import java_metrics
+import java_utils
+
+# resident memory estimates in MB (heap plus JVM overhead) of the one-shot tools a sample may run
+TOOL_MEMORY_MB = {
+    "javac": java_utils.COMPILE_JAVA_MEM + 256,
+    "format": java_utils.FORMAT_JAVA_MEM + 256,
+    "decompile": java_utils.DECOMPILE_JAVA_MEM + 256,
+    "run": java_utils.RUN_JAVA_MEM + 256,
+    "test": java_utils.TEST_JAVA_MEM + 256,
+    # EvoSuite's -mem heap for the client JVM, plus the master JVM that drives it
+    "evosuite_gen": java_utils.MAX_JAVA_MEM + 1024,
+}
+# resident memory in MB of the helper daemons one worker process keeps running
+DAEMON_MEMORY_MB = TOOL_MEMORY_MB["javac"] + TOOL_MEMORY_MB["format"] + TOOL_MEMORY_MB["test"]
+# memory left for everything else on the machine
+HEADROOM_MB = 2048
+# seconds between memory checks while admission is held back
+POLL_INTERVAL = 1.0
+# seconds between status lines
+STATUS_INTERVAL = 30.0
+
+_END = object()
+
+
+def available_memory_mb():
+    '''
+    Returns MemAvailable from /proc/meminfo in MB, or None where it cannot be read.
+    '''
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def sample_memory_mb(tools):
+    '''
+    Memory one sample needs at its peak, when it runs the largest of `tools`
+    (keys of TOOL_MEMORY_MB; the tools of one sample run one after another)
+    next to its worker's daemons.
+    '''
+    return max(TOOL_MEMORY_MB[tool] for tool in tools) + DAEMON_MEMORY_MB
+
+
+class MemoryScheduler:
+    '''
+    Runs samples on a process pool sized by both `max_jobs` (default: cores)
+    and `memory_budget_mb` (default: available memory minus HEADROOM_MB) at
+    `sample_mb` each, and only admits a sample while the machine has at least
+    `sample_mb` available beyond HEADROOM_MB. One sample is always admitted
+    so a run can make progress. While it runs, the running and queued sample
+    counts and the concurrency limit are exported as java_metrics gauges and
+    printed every STATUS_INTERVAL seconds.
+    '''
+
+    def __init__(self, sample_mb, max_jobs=None, memory_budget_mb=None, verbose=True):
+        self.sample_mb = sample_mb
+        self.verbose = verbose
+        available = available_memory_mb()
+        if memory_budget_mb is None and available is not None:
+            memory_budget_mb = available - HEADROOM_MB
+        self.memory_budget_mb = memory_budget_mb
+        max_jobs = max_jobs or os.cpu_count() or 1
+        if memory_budget_mb is not None:
+            max_jobs = min(max_jobs, memory_budget_mb // sample_mb)
+        self.max_jobs = max(1, max_jobs)
+
+        self.lock = threading.Lock()
+        self.running = 0
+        self.queued = 0
+        self.completed = 0
+        self.held_back = 0
+
+    def stats(self):
+        '''
+        Returns the current concurrency limit, running, queued and completed
+        sample counts, and how often admission was held back for memory.
+        '''
+        with self.lock:
+            return {
+                "max_jobs": self.max_jobs,
+                "running": self.running,
+                "queued": self.queued,
+                "completed": self.completed,
+                "held_back": self.held_back,
+            }
+
+    def _publish(self):
+        stats = self.stats()
+        java_metrics.set_gauge("java_admission_max_jobs", stats["max_jobs"])
+        java_metrics.set_gauge("java_admission_running", stats["running"])
+        java_metrics.set_gauge("java_admission_queued", stats["queued"])
+        return stats
+
+    def _can_admit(self, admitted):
+        # `admitted` samples were just started and do not show in available memory yet
+        if self.running == 0:
+            return True
+        if self.running >= self.max_jobs:
+            return False
+        available = available_memory_mb()
+        if available is not None and available - HEADROOM_MB - admitted * self.sample_mb < self.sample_mb:
+            self.held_back += 1
+            java_metrics.inc("java_admission_held_back_total")
+            return False
+        return True
+
+    def map(self, fn, items):
+        '''
+        Returns [fn(item) for item in items], computed in worker processes.
+        '''
+        items = list(items)
+        results = [None] * len(items)
+        for index, result in self.imap_unordered(fn, items, total=len(items)):
+            results[index] = result
+        return results
+
+    def imap_unordered(self, fn, items, total=None):
+        '''
+        Yields (position in `items`, fn(item)) as samples finish. Items are
+        only taken from `items` when admitted, so it can be a lazy stream;
+        `total`, if known, is used for the queue depth.
+        '''
+        items = iter(items)
+        with self.lock:
+            self.queued = total or 0
+        next_item = next(items, _END)
+        next_index = 0
+        last_status = time.monotonic()
+        futures = {}
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self.max_jobs) as executor:
+            while next_item is not _END or futures:
+                with self.lock:
+                    admitted = 0
+                    while next_item is not _END and self._can_admit(admitted):
+                        futures[executor.submit(fn, next_item)] = next_index
+                        next_item = next(items, _END)
+                        next_index += 1
+                        admitted += 1
+                        self.running += 1
+                        self.queued = max(0, self.queued - 1)
+                stats = self._publish()
+
+                if self.verbose and time.monotonic() - last_status >= STATUS_INTERVAL:
+                    last_status = time.monotonic()
+                    print(
+                        f"[admission] running {stats['running']}/{stats['max_jobs']}, queued {stats['queued']}, "
+                        f"done {stats['completed']}, available {available_memory_mb()} MB",
+                        file=sys.stderr,
+                    )
+
+                done, _ = concurrent.futures.wait(
+                    futures, timeout=POLL_INTERVAL, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    index = futures.pop(future)
+                    with self.lock:
+                        self.running -= 1
+                        self.completed += 1
+                    yield index, future.result()
+
+        self._publish()
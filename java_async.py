@@ -0,0 +1,113 @@
+"""
+asyncio front end for java_utils.py.
+
+The coroutines here mirror the java_utils functions of the same name. Each
+call holds a slot of a process-wide semaphore while the blocking function
+runs on a worker thread, so one event loop can keep hundreds of classes in
+flight (e.g. while waiting on LLM calls) without running more Java jobs at
+once than the machine has CPUs and memory for.
+
+    verdict = await java_async.evosuite_compile_and_run_test(class_name, byte_code, test_str, scaffold_str)
+"""
+
+import asyncio
+import concurrent.futures
+import functools
+import os
+import threading
+import weakref
+
+import java_utils
+
+
+def default_java_slots():
+    '''
+    Number of Java jobs to run at once: the CPUs available to this task (at
+    most CPUS_PER_TASK), further capped by how many MAX_JAVA_MEM heaps fit in
+    physical memory.
+    '''
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    cpus = min(cpus, java_utils.CPUS_PER_TASK)
+
+    try:
+        mem_mb = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // 1024 ** 2
+    except (ValueError, OSError, AttributeError):
+        return cpus
+
+    return max(1, min(cpus, mem_mb // java_utils.MAX_JAVA_MEM))
+
+JAVA_SLOTS = default_java_slots()
+
+_executor = None
+_executor_lock = threading.Lock()
+# one semaphore per event loop (asyncio primitives are bound to a loop), all sized JAVA_SLOTS
+_semaphores = weakref.WeakKeyDictionary()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(max_workers=JAVA_SLOTS, thread_name_prefix="java")
+        return _executor
+
+
+def _get_semaphore():
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(JAVA_SLOTS)
+    return semaphore
+
+
+async def run_java(fn, *args, **kwargs):
+    '''
+    Runs a blocking java_utils function on a worker thread once a Java slot is free.
+    '''
+    async with _get_semaphore():
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_executor(), functools.partial(fn, *args, **kwargs))
+
+
+async def compile_str(class_name, java_str, timeout=None, precheck=False):
+    return await run_java(java_utils.compile_str, class_name, java_str, timeout=timeout, precheck=precheck)
+
+
+async def evosuite_compile_and_run_test(class_name, byte_code_str, test_str, scaffold_str, verbose=False, gold_byte_code=None, timeout=None, gold_jasm=None, fail_fast=False, test_threads=None, previous_verdict=None):
+    return await run_java(
+        java_utils.evosuite_compile_and_run_test,
+        class_name, byte_code_str, test_str, scaffold_str,
+        verbose=verbose, gold_byte_code=gold_byte_code, timeout=timeout, gold_jasm=gold_jasm,
+        fail_fast=fail_fast, test_threads=test_threads, previous_verdict=previous_verdict,
+    )
+
+
+async def disassemble_str(class_name, byte_code_str):
+    return await run_java(java_utils.disassemble_str, class_name, byte_code_str)
+
+
+async def decompile_timed(decompiler, class_name, byte_code_str):
+    return await run_java(java_utils.decompile_timed, decompiler, class_name, byte_code_str)
+
+
+async def procyon_decompiler(class_name, byte_code_str):
+    return await run_java(java_utils.procyon_decompiler, class_name, byte_code_str)
+
+
+async def CFR_decompiler(class_name, byte_code_str):
+    return await run_java(java_utils.CFR_decompiler, class_name, byte_code_str)
+
+
+async def JADX_decompiler(class_name, byte_code_str):
+    return await run_java(java_utils.JADX_decompiler, class_name, byte_code_str)
+
+
+async def fernflower_decompiler(class_name, byte_code_str):
+    return await run_java(java_utils.fernflower_decompiler, class_name, byte_code_str)
+
+
+async def krakatau_decompiler(class_name, byte_code_str):
+    return await run_java(java_utils.krakatau_decompiler, class_name, byte_code_str)
@@ -0,0 +1,133 @@
+"""
+Content-addressed on-disk caches for java_utils.py.
+
+Entries are pickled values stored under a sha256 key. Reads refresh an
+entry's mtime, and once a cache grows past its byte budget the least recently
+used entries are evicted. Writes go through a temp file and os.replace, so
+several worker processes can share one cache directory.
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+
+import java_metrics
+import java_workspace
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+CACHE_DIR = os.environ.get("JAVA_UTILS_CACHE_DIR", os.path.join(BASE_DIR, "build", "cache"))
+
+
+def make_key(*parts):
+    '''
+    Hashes str/bytes parts into a cache key. Parts are length-prefixed so that
+    ("ab", "c") and ("a", "bc") do not collide.
+    '''
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class DiskCache:
+    '''
+    A size-bounded LRU cache of pickled values in CACHE_DIR/<name>.
+    '''
+
+    def __init__(self, name, max_bytes):
+        self.name = name
+        self.dir = os.path.join(CACHE_DIR, name)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        # bytes written since the last eviction scan; None forces a scan on the first put
+        self._unscanned_bytes = None
+
+    def _path(self, key):
+        return os.path.join(self.dir, key[:2], key)
+
+    def get(self, key):
+        '''
+        Returns the cached value, or None on a miss.
+        '''
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+            os.utime(path)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            with self.lock:
+                self.misses += 1
+            java_metrics.inc("java_cache_requests_total", cache=self.name, result="miss")
+            return None
+
+        with self.lock:
+            self.hits += 1
+        java_metrics.inc("java_cache_requests_total", cache=self.name, result="hit")
+        return value
+
+    def put(self, key, value):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        java_metrics.add_bytes_written(len(data), java_workspace.medium(path))
+
+        with self.lock:
+            # only rescan the directory once another tenth of the budget has been written
+            if self._unscanned_bytes is not None:
+                self._unscanned_bytes += len(data)
+                if self._unscanned_bytes < self.max_bytes // 10:
+                    return
+            self._unscanned_bytes = 0
+        self.evict()
+
+    def evict(self):
+        '''
+        Deletes least recently used entries until the cache is below 90% of max_bytes.
+        '''
+        entries = []
+        total_bytes = 0
+        for root, _, filenames in os.walk(self.dir):
+            for filename in filenames:
+                path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total_bytes += stat.st_size
+
+        if total_bytes <= self.max_bytes:
+            return
+
+        entries.sort()
+        target_bytes = self.max_bytes * 9 // 10
+        for _, size, path in entries:
+            if total_bytes <= target_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total_bytes -= size
+
+    def clear(self):
+        for root, _, filenames in os.walk(self.dir):
+            for filename in filenames:
+                try:
+                    os.remove(os.path.join(root, filename))
+                except OSError:
+                    pass
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
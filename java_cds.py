@@ -0,0 +1,187 @@
+"""
+Class-data-sharing (CDS) archives and JVM flags for short-lived Java tools.
+
+A short JVM spends much of its life loading, verifying and linking the same few
+thousand classes. On JDK 11+ each tool's classpath gets an AppCDS archive,
+built on first use from the classes a training run of the tool loads, and every
+later launch maps that archive instead. OpenJDK 8 has no application class
+sharing, so JDK 8 launches only get SHORT_LIVED_FLAGS, which include the JDK's
+own default archive.
+
+    flags = java_cds.launch_flags(JAVA_11, ["-jar", TOOL_JAR])
+    subprocess.run([JAVA_11] + flags + ["-jar", TOOL_JAR, ...])
+"""
+
+import fcntl
+import functools
+import hashlib
+import os
+import re
+import subprocess
+import tempfile
+import zipfile
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+CDS_DIR = os.environ.get("JAVA_CDS_DIR", os.path.join(BASE_DIR, "build", "cds"))
+
+# build and use AppCDS archives on JDKs that support them
+USE_APPCDS = True
+# launch short-lived JVMs with SHORT_LIVED_FLAGS
+USE_SHORT_LIVED_FLAGS = True
+# C1 only (no C2 compile threads or deoptimization for code that runs once), one GC thread, map the JDK's CDS archive
+SHORT_LIVED_FLAGS = ["-XX:TieredStopAtLevel=1", "-XX:+UseSerialGC", "-Xshare:auto"]
+# a training run that takes longer than this is killed and the tool runs without an archive
+TRAINING_TIMEOUT = 120
+
+
+@functools.lru_cache(maxsize=None)
+def java_version(java):
+    '''
+    Returns the feature version of a `java` launcher (8, 11, ...), or 0 if it cannot be run.
+    '''
+    try:
+        result = subprocess.run([java, "-version"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    except OSError:
+        return 0
+
+    match = re.search(r'version "(?:1\.)?(\d+)', result.stdout.decode(errors="replace"))
+    return int(match.group(1)) if match else 0
+
+
+def short_lived_flags():
+    '''
+    SHORT_LIVED_FLAGS, or [] when they are turned off. For launches whose
+    classpath changes every time (temp dirs), which no archive can match.
+    '''
+    return list(SHORT_LIVED_FLAGS) if USE_SHORT_LIVED_FLAGS else []
+
+
+def javac_flags():
+    '''
+    SHORT_LIVED_FLAGS for the JVM behind a `javac` launcher.
+    '''
+    return ["-J" + flag for flag in short_lived_flags()]
+
+
+def jar_directory(class_dir):
+    '''
+    Returns a jar holding the classes in `class_dir`, built next to it once.
+    CDS archives only classes loaded from jars.
+    '''
+    jar_path = class_dir.rstrip("/") + ".jar"
+    if os.path.exists(jar_path):
+        return jar_path
+
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(jar_path), suffix=".jar")
+    with os.fdopen(fd, "wb") as f, zipfile.ZipFile(f, "w") as jar:
+        for root, _, filenames in os.walk(class_dir):
+            for filename in sorted(filenames):
+                path = os.path.join(root, filename)
+                jar.write(path, os.path.relpath(path, class_dir))
+    os.replace(temp_path, jar_path)
+
+    return jar_path
+
+
+def _classpath(launch):
+    # launch is ["-jar", jar] or ["-cp", classpath, main class]
+    return launch[1]
+
+
+def _archive_key(java, launch):
+    digest = hashlib.sha256()
+    digest.update(os.path.realpath(java).encode())
+    for part in launch:
+        digest.update(part.encode() + b"\0")
+    for path in _classpath(launch).split(":"):
+        try:
+            stat = os.stat(path)
+            digest.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+        except OSError:
+            digest.update(b"missing")
+    return digest.hexdigest()[:16]
+
+
+def _build_archive(java, launch, training_args, training_input, archive_path):
+    '''
+    Records the classes a training run loads, then dumps them into `archive_path`.
+    Returns whether the archive was built.
+    '''
+    class_list_path = archive_path[:-len(".jsa")] + ".classlist"
+    train_cmd = [java, "-Xshare:off", f"-XX:DumpLoadedClassList={class_list_path}"] + launch + training_args
+    try:
+        subprocess.run(
+            train_cmd,
+            input=training_input or b"",
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            timeout=TRAINING_TIMEOUT,
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+
+    if not os.path.exists(class_list_path) or os.path.getsize(class_list_path) == 0:
+        return False
+
+    temp_path = archive_path + ".tmp"
+    dump_cmd = [
+        java, "-Xshare:dump",
+        f"-XX:SharedClassListFile={class_list_path}",
+        f"-XX:SharedArchiveFile={temp_path}",
+        "-cp", _classpath(launch),
+    ]
+    try:
+        result = subprocess.run(dump_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=TRAINING_TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+
+    if result.returncode != 0 or not os.path.exists(temp_path):
+        return False
+
+    os.replace(temp_path, archive_path)
+    return True
+
+
+@functools.lru_cache(maxsize=None)
+def _archive_flags(java, launch, training_args, training_input):
+    if not USE_APPCDS or java_version(java) < 11:
+        return ()
+
+    os.makedirs(CDS_DIR, exist_ok=True)
+    base_path = os.path.join(CDS_DIR, _archive_key(java, list(launch)))
+    archive_path = base_path + ".jsa"
+    failed_path = base_path + ".failed"
+
+    # one process builds each archive; the others wait for it instead of training too
+    with open(base_path + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if not os.path.exists(archive_path) and not os.path.exists(failed_path):
+            if not _build_archive(java, list(launch), list(training_args), training_input, archive_path):
+                # remembered, so a tool that cannot be archived is not retrained by every process
+                open(failed_path, "w").close()
+
+    if not os.path.exists(archive_path):
+        return ()
+
+    # a classpath that no longer matches the archive only disables sharing; keep the warnings off stdout
+    return (f"-XX:SharedArchiveFile={archive_path}", "-Xshare:auto", "-Xlog:cds=off", "-Xlog:class+path=off")
+
+
+def archive_flags(java, launch, training_args=(), training_input=None):
+    '''
+    Returns the flags that map the AppCDS archive for `launch` (["-jar", jar]
+    or ["-cp", classpath, main class]; classpath entries must be jars). The
+    archive is built on first use from a run of `launch` + `training_args`
+    with `training_input` on stdin. Returns [] where archives are unsupported
+    or could not be built.
+    '''
+    return list(_archive_flags(java, tuple(launch), tuple(training_args), training_input))
+
+
+def launch_flags(java, launch, short_lived=True, training_args=(), training_input=None):
+    '''
+    JVM flags for one launch of `launch`: SHORT_LIVED_FLAGS (unless the JVM is
+    long-lived, e.g. a daemon) followed by the archive flags.
+    '''
+    flags = short_lived_flags() if short_lived else []
+    return flags + archive_flags(java, launch, training_args, training_input)
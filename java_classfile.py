@@ -0,0 +1,708 @@
+"""
+Class-file parsing and disassembly for java_utils.py.
+
+disassemble() turns class bytes into the same Krakatau assembly text that
+`krakatau/disassemble.py` writes (the format split_java.py and the prompts are
+built from), without starting a python process per class.
+"""
+
+import re
+import struct
+
+CLASS_FLAGS = [
+    (0x0001, "public"), (0x0002, "private"), (0x0004, "protected"), (0x0008, "static"),
+    (0x0010, "final"), (0x0020, "super"), (0x0200, "interface"), (0x0400, "abstract"),
+    (0x1000, "synthetic"), (0x2000, "annotation"), (0x4000, "enum"), (0x8000, "module"),
+]
+FIELD_FLAGS = [
+    (0x0001, "public"), (0x0002, "private"), (0x0004, "protected"), (0x0008, "static"),
+    (0x0010, "final"), (0x0040, "volatile"), (0x0080, "transient"), (0x1000, "synthetic"),
+    (0x4000, "enum"),
+]
+METHOD_FLAGS = [
+    (0x0001, "public"), (0x0002, "private"), (0x0004, "protected"), (0x0008, "static"),
+    (0x0010, "final"), (0x0020, "synchronized"), (0x0040, "bridge"), (0x0080, "varargs"),
+    (0x0100, "native"), (0x0400, "abstract"), (0x0800, "strict"), (0x1000, "synthetic"),
+]
+
+OPCODES = (
+    "nop aconst_null iconst_m1 iconst_0 iconst_1 iconst_2 iconst_3 iconst_4 iconst_5 "
+    "lconst_0 lconst_1 fconst_0 fconst_1 fconst_2 dconst_0 dconst_1 bipush sipush ldc ldc_w "
+    "ldc2_w iload lload fload dload aload iload_0 iload_1 iload_2 iload_3 lload_0 lload_1 "
+    "lload_2 lload_3 fload_0 fload_1 fload_2 fload_3 dload_0 dload_1 dload_2 dload_3 aload_0 "
+    "aload_1 aload_2 aload_3 iaload laload faload daload aaload baload caload saload istore "
+    "lstore fstore dstore astore istore_0 istore_1 istore_2 istore_3 lstore_0 lstore_1 "
+    "lstore_2 lstore_3 fstore_0 fstore_1 fstore_2 fstore_3 dstore_0 dstore_1 dstore_2 "
+    "dstore_3 astore_0 astore_1 astore_2 astore_3 iastore lastore fastore dastore aastore "
+    "bastore castore sastore pop pop2 dup dup_x1 dup_x2 dup2 dup2_x1 dup2_x2 swap iadd ladd "
+    "fadd dadd isub lsub fsub dsub imul lmul fmul dmul idiv ldiv fdiv ddiv irem lrem frem "
+    "drem ineg lneg fneg dneg ishl lshl ishr lshr iushr lushr iand land ior lor ixor lxor "
+    "iinc i2l i2f i2d l2i l2f l2d f2i f2l f2d d2i d2l d2f i2b i2c i2s lcmp fcmpl fcmpg dcmpl "
+    "dcmpg ifeq ifne iflt ifge ifgt ifle if_icmpeq if_icmpne if_icmplt if_icmpge if_icmpgt "
+    "if_icmple if_acmpeq if_acmpne goto jsr ret tableswitch lookupswitch ireturn lreturn "
+    "freturn dreturn areturn return getstatic putstatic getfield putfield invokevirtual "
+    "invokespecial invokestatic invokeinterface invokedynamic new newarray anewarray "
+    "arraylength athrow checkcast instanceof monitorenter monitorexit wide multianewarray "
+    "ifnull ifnonnull goto_w jsr_w"
+).split()
+
+NEWARRAY_TYPES = {4: "boolean", 5: "char", 6: "float", 7: "double", 8: "byte", 9: "short", 10: "int", 11: "long"}
+HANDLE_KINDS = {
+    1: "getField", 2: "getStatic", 3: "putField", 4: "putStatic", 5: "invokeVirtual",
+    6: "invokeStatic", 7: "invokeSpecial", 8: "newInvokeSpecial", 9: "invokeInterface",
+}
+VERIFICATION_TYPES = ["Top", "Integer", "Float", "Double", "Long", "Null", "UninitializedThis"]
+ELEMENT_TAGS = {
+    "B": "byte", "C": "char", "D": "double", "F": "float", "I": "int", "J": "long",
+    "S": "short", "Z": "boolean", "s": "string", "e": "enum", "c": "class",
+}
+
+# Krakatau prints a long Utf8 constant inline this many times, then refers to it symbolically
+UTF_INLINE_USES = 10
+UTF_INLINE_MIN_LENGTH = 50
+
+WORD_RE = re.compile(r"(?:[a-zA-Z_$(<]|\[[A-Z\[])[\w$;/\[()<>*+-]*\Z", re.ASCII)
+
+
+class ClassFormatError(Exception):
+    '''
+    Raised for bytes that are not a well-formed class file.
+    '''
+
+
+def decode_mutf8(data):
+    '''
+    Decodes the JVM's modified UTF-8 (used by CONSTANT_Utf8) into a str.
+    '''
+    data = data.replace(b"\xc0\x80", b"\x00")
+    try:
+        text = data.decode("utf-8", errors="surrogatepass")
+    except UnicodeDecodeError:
+        raise ClassFormatError("malformed Utf8 constant")
+    try:
+        # supplementary characters are stored as surrogate pairs
+        return text.encode("utf-16-be", errors="surrogatepass").decode("utf-16-be")
+    except UnicodeDecodeError:
+        return text
+
+
+class Reader:
+    def __init__(self, data, pos=0):
+        self.data = data
+        self.pos = pos
+
+    def _unpack(self, fmt, size):
+        if self.pos + size > len(self.data):
+            raise ClassFormatError("unexpected end of data")
+        value, = struct.unpack_from(fmt, self.data, self.pos)
+        self.pos += size
+        return value
+
+    def u1(self):
+        return self._unpack(">B", 1)
+
+    def s1(self):
+        return self._unpack(">b", 1)
+
+    def u2(self):
+        return self._unpack(">H", 2)
+
+    def s2(self):
+        return self._unpack(">h", 2)
+
+    def u4(self):
+        return self._unpack(">I", 4)
+
+    def s4(self):
+        return self._unpack(">i", 4)
+
+    def bytes(self, n):
+        if self.pos + n > len(self.data):
+            raise ClassFormatError("unexpected end of data")
+        value = self.data[self.pos:self.pos + n]
+        self.pos += n
+        return value
+
+
+class Member:
+    '''
+    A field or method: access flags, name and descriptor (constant pool
+    indices) and its raw attributes as (name, bytes) pairs.
+    '''
+
+    def __init__(self, access, name_index, desc_index, attributes):
+        self.access = access
+        self.name_index = name_index
+        self.desc_index = desc_index
+        self.attributes = attributes
+
+
+class ClassFile:
+    '''
+    A parsed class file. Constant pool entries are tuples (tag name, values...),
+    with None in unused slots; attributes are kept raw as (name, bytes) pairs.
+    '''
+
+    def __init__(self, data):
+        reader = Reader(data)
+        if len(data) < 10 or reader.u4() != 0xCAFEBABE:
+            raise ClassFormatError("bad magic number")
+        self.minor = reader.u2()
+        self.major = reader.u2()
+        self.pool = self._read_pool(reader)
+        self.access = reader.u2()
+        self.this_class = reader.u2()
+        self.super_class = reader.u2()
+        self.interfaces = [reader.u2() for _ in range(reader.u2())]
+        self.fields = [self._read_member(reader) for _ in range(reader.u2())]
+        self.methods = [self._read_member(reader) for _ in range(reader.u2())]
+        self.attributes = self._read_attributes(reader)
+
+    def _read_pool(self, reader):
+        pool = [None]
+        count = reader.u2()
+        while len(pool) < count:
+            tag = reader.u1()
+            if tag == 1:
+                pool.append(("Utf8", decode_mutf8(reader.bytes(reader.u2()))))
+            elif tag == 3:
+                pool.append(("Integer", reader.s4()))
+            elif tag == 4:
+                pool.append(("Float", reader.u4()))
+            elif tag == 5:
+                pool.append(("Long", struct.unpack(">q", reader.bytes(8))[0]))
+                pool.append(None)
+            elif tag == 6:
+                pool.append(("Double", struct.unpack(">Q", reader.bytes(8))[0]))
+                pool.append(None)
+            elif tag in (7, 8, 16, 19, 20):
+                names = {7: "Class", 8: "String", 16: "MethodType", 19: "Module", 20: "Package"}
+                pool.append((names[tag], reader.u2()))
+            elif tag in (9, 10, 11, 12, 17, 18):
+                names = {
+                    9: "Field", 10: "Method", 11: "InterfaceMethod",
+                    12: "NameAndType", 17: "Dynamic", 18: "InvokeDynamic",
+                }
+                pool.append((names[tag], reader.u2(), reader.u2()))
+            elif tag == 15:
+                pool.append(("MethodHandle", reader.u1(), reader.u2()))
+            else:
+                raise ClassFormatError(f"unknown constant pool tag {tag}")
+        return pool
+
+    def _read_member(self, reader):
+        access, name_index, desc_index = reader.u2(), reader.u2(), reader.u2()
+        return Member(access, name_index, desc_index, self._read_attributes(reader))
+
+    def _read_attributes(self, reader):
+        attributes = []
+        for _ in range(reader.u2()):
+            name = self.utf(reader.u2())
+            attributes.append((name, reader.bytes(reader.u4())))
+        return attributes
+
+    def entry(self, index, *tags):
+        if not 0 < index < len(self.pool) or self.pool[index] is None:
+            raise ClassFormatError(f"bad constant pool index {index}")
+        entry = self.pool[index]
+        if tags and entry[0] not in tags:
+            raise ClassFormatError(f"constant {index} is {entry[0]}, expected {'/'.join(tags)}")
+        return entry
+
+    def utf(self, index):
+        return self.entry(index, "Utf8")[1]
+
+    def class_name(self, index):
+        return self.utf(self.entry(index, "Class")[1])
+
+    @property
+    def name(self):
+        return self.class_name(self.this_class)
+
+    def member_name(self, member):
+        return self.utf(member.name_index)
+
+    def member_descriptor(self, member):
+        return self.utf(member.desc_index)
+
+    def bootstrap_methods(self):
+        '''
+        Returns the BootstrapMethods attribute as [(method handle index, [argument indices])].
+        '''
+        for name, data in self.attributes:
+            if name == "BootstrapMethods":
+                reader = Reader(data)
+                methods = []
+                for _ in range(reader.u2()):
+                    handle = reader.u2()
+                    methods.append((handle, [reader.u2() for _ in range(reader.u2())]))
+                return methods
+        return []
+
+
+def parse_class(byte_code):
+    return ClassFile(byte_code)
+
+
+def format_flags(access, table):
+    return [name for bit, name in table if access & bit]
+
+
+def format_string(text):
+    return repr(text)
+
+
+def format_float(bits):
+    value, = struct.unpack(">f", struct.pack(">I", bits))
+    return _format_floating(value) + "f"
+
+
+def format_double(bits):
+    value, = struct.unpack(">d", struct.pack(">Q", bits))
+    return _format_floating(value)
+
+
+def _format_floating(value):
+    if value != value:
+        return "+NaN"
+    if value in (float("inf"), float("-inf")):
+        return "+Infinity" if value > 0 else "-Infinity"
+    text = repr(value)
+    return text if text.startswith("-") else "+" + text
+
+
+class Disassembler:
+    '''
+    Renders a ClassFile as Krakatau assembly. Every token is followed by a
+    space, as in Krakatau's output.
+    '''
+
+    def __init__(self, cls):
+        self.cls = cls
+        self.lines = []
+        self.utf_uses = {}
+        # constant pool indices printed as [..] references, defined at the end by .const
+        self.symbolic = set()
+
+    def line(self, indent, *tokens):
+        self.lines.append(" " * indent + "".join(token + " " for token in tokens))
+
+    def blank(self):
+        self.lines.append("")
+
+    # constant pool references
+
+    def utf(self, index, word=True):
+        if index == 0:
+            return "[0]"
+        text = self.cls.utf(index)
+        uses = self.utf_uses.get(index, 0)
+        self.utf_uses[index] = uses + 1
+        if uses >= UTF_INLINE_USES and len(text) >= UTF_INLINE_MIN_LENGTH:
+            self.symbolic.add(index)
+            return f"[u{index}]"
+        return self.utf_text(text, word)
+
+    def utf_text(self, text, word=True):
+        if word and WORD_RE.match(text):
+            return text
+        return format_string(text)
+
+    def class_ref(self, index):
+        if index == 0:
+            return "[0]"
+        return self.utf(self.cls.entry(index, "Class")[1])
+
+    def name_and_type(self, index):
+        _, name, desc = self.cls.entry(index, "NameAndType")
+        return f"{self.utf(name)} {self.utf(desc)}"
+
+    def member_ref(self, index):
+        tag, cls_index, nat = self.cls.entry(index, "Field", "Method", "InterfaceMethod")
+        return f"{tag} {self.class_ref(cls_index)} {self.name_and_type(nat)}"
+
+    def method_handle(self, index):
+        _, kind, ref = self.cls.entry(index, "MethodHandle")
+        return f"{HANDLE_KINDS.get(kind, str(kind))} {self.member_ref(ref)}"
+
+    def constant(self, index):
+        '''
+        Renders a loadable constant as in ldc, ConstantValue and bootstrap arguments.
+        '''
+        entry = self.cls.entry(index)
+        tag = entry[0]
+        if tag == "Integer":
+            return str(entry[1])
+        if tag == "Float":
+            return format_float(entry[1])
+        if tag == "Long":
+            return f"{entry[1]}L"
+        if tag == "Double":
+            return format_double(entry[1])
+        if tag == "String":
+            return format_string(self.cls.utf(entry[1]))
+        if tag == "Class":
+            return f"Class {self.utf(entry[1])}"
+        if tag == "MethodType":
+            return f"MethodType {self.utf(entry[1])}"
+        if tag == "MethodHandle":
+            return f"MethodHandle {self.method_handle(index)}"
+        if tag in ("Dynamic", "InvokeDynamic"):
+            self.symbolic.add(index)
+            return f"[{'dy' if tag == 'Dynamic' else 'id'}{index}]"
+        raise ClassFormatError(f"constant {index} ({tag}) is not loadable")
+
+    def const_definition(self, index):
+        entry = self.cls.entry(index)
+        tag = entry[0]
+        if tag == "Utf8":
+            return f".const [u{index}] = Utf8 {self.utf_text(entry[1])}"
+
+        bootstrap_methods = self.cls.bootstrap_methods()
+        if entry[1] >= len(bootstrap_methods):
+            raise ClassFormatError(f"bad bootstrap method index {entry[1]}")
+        handle, arguments = bootstrap_methods[entry[1]]
+        tokens = [self.method_handle(handle)]
+        tokens += [self.constant(argument) for argument in arguments]
+        prefix = "dy" if tag == "Dynamic" else "id"
+        return f".const [{prefix}{index}] = {tag} {' '.join(tokens)} : {self.name_and_type(entry[2])}"
+
+    # class structure
+
+    def disassemble(self):
+        cls = self.cls
+        self.line(0, ".version", str(cls.major), str(cls.minor))
+        self.line(0, ".class", *format_flags(cls.access, CLASS_FLAGS), self.class_ref(cls.this_class))
+        self.line(0, ".super", self.class_ref(cls.super_class))
+        for interface in cls.interfaces:
+            self.line(0, ".implements", self.class_ref(interface))
+
+        for field in cls.fields:
+            self.field(field)
+        for method in cls.methods:
+            self.blank()
+            self.method(method)
+
+        for name, data in cls.attributes:
+            if name != "BootstrapMethods":
+                self.attribute(0, name, data)
+
+        defined = set()
+        while self.symbolic - defined:
+            index = min(self.symbolic - defined)
+            defined.add(index)
+            self.line(0, self.const_definition(index))
+
+        self.line(0, ".end class")
+        return "\n".join(self.lines) + "\n"
+
+    def field(self, field):
+        tokens = [".field"] + format_flags(field.access, FIELD_FLAGS)
+        tokens += [self.utf(field.name_index), self.utf(field.desc_index)]
+        attributes = []
+        for name, data in field.attributes:
+            if name == "ConstantValue" and len(data) == 2:
+                tokens += ["=", self.constant(Reader(data).u2())]
+            else:
+                attributes.append((name, data))
+
+        if not attributes:
+            self.line(0, *tokens)
+            return
+        self.line(0, *tokens, ".fieldattributes")
+        for name, data in attributes:
+            self.attribute(4, name, data)
+        self.line(0, ".end fieldattributes")
+
+    def method(self, method):
+        flags = format_flags(method.access, METHOD_FLAGS)
+        self.line(0, ".method", *flags, self.utf(method.name_index), ":", self.utf(method.desc_index))
+        for name, data in method.attributes:
+            if name == "Code":
+                self.code(data)
+            else:
+                self.attribute(4, name, data)
+        self.line(0, ".end method")
+
+    # attributes
+
+    def attribute(self, indent, name, data):
+        reader = Reader(data)
+        if name == "SourceFile":
+            self.line(indent, ".sourcefile", self.utf(reader.u2()))
+        elif name == "Signature":
+            self.line(indent, ".signature", self.utf(reader.u2()))
+        elif name == "Exceptions":
+            exceptions = [self.class_ref(reader.u2()) for _ in range(reader.u2())]
+            self.line(indent, ".exceptions", *exceptions)
+        elif name == "InnerClasses":
+            self.line(indent, ".innerclasses")
+            for _ in range(reader.u2()):
+                inner, outer, inner_name, access = reader.u2(), reader.u2(), reader.u2(), reader.u2()
+                self.line(
+                    indent + 4,
+                    self.class_ref(inner),
+                    self.class_ref(outer),
+                    self.utf(inner_name),
+                    *format_flags(access, CLASS_FLAGS),
+                )
+            self.line(indent, ".end innerclasses")
+        elif name == "EnclosingMethod":
+            cls_index, nat = reader.u2(), reader.u2()
+            self.line(indent, ".enclosing method", self.class_ref(cls_index), self.name_and_type(nat) if nat else "[0]")
+        elif name in ("Deprecated", "Synthetic") and not data:
+            self.line(indent, "." + name.lower())
+        elif name == "ConstantValue":
+            self.line(indent, ".constantvalue", self.constant(reader.u2()))
+        elif name == "AnnotationDefault":
+            self.element_value(indent, reader, ".annotationdefault")
+        elif name in ("RuntimeVisibleAnnotations", "RuntimeInvisibleAnnotations"):
+            visibility = "visible" if "Visible" in name else "invisible"
+            self.line(indent, ".runtime", visibility, "annotations")
+            for _ in range(reader.u2()):
+                self.annotation(indent + 4, reader)
+            self.line(indent, ".end runtime")
+        elif name in ("RuntimeVisibleParameterAnnotations", "RuntimeInvisibleParameterAnnotations"):
+            visibility = "visible" if "Visible" in name else "invisible"
+            self.line(indent, ".runtime", visibility, "paramannotations")
+            for _ in range(reader.u1()):
+                self.line(indent + 4, ".paramannotation")
+                for _ in range(reader.u2()):
+                    self.annotation(indent + 8, reader)
+                self.line(indent + 4, ".end paramannotation")
+            self.line(indent, ".end runtime")
+        elif name == "MethodParameters":
+            self.line(indent, ".methodparameters")
+            for _ in range(reader.u1()):
+                name_index, access = reader.u2(), reader.u2()
+                self.line(indent + 4, self.utf(name_index), *format_flags(access, FIELD_FLAGS))
+            self.line(indent, ".end methodparameters")
+        else:
+            self.line(indent, ".attribute", self.utf_text(name), repr(bytes(data)))
+
+    def annotation(self, indent, reader):
+        self.line(indent, ".annotation", self.utf(reader.u2()))
+        for _ in range(reader.u2()):
+            self.element_value(indent + 4, reader, self.utf(reader.u2()), "=")
+        self.line(indent, ".end annotation")
+
+    def element_value(self, indent, reader, *prefix):
+        '''
+        Prints an element value on a line starting with `prefix`. Arrays and
+        nested annotations continue on the following lines.
+        '''
+        tag = chr(reader.u1())
+        if tag in "BCDFIJSZ":
+            self.line(indent, *prefix, ELEMENT_TAGS[tag], self.constant(reader.u2()))
+        elif tag in "sc":
+            self.line(indent, *prefix, ELEMENT_TAGS[tag], self.utf(reader.u2()))
+        elif tag == "e":
+            self.line(indent, *prefix, "enum", self.utf(reader.u2()), self.utf(reader.u2()))
+        elif tag == "@":
+            self.line(indent, *prefix, "annotation", self.utf(reader.u2()))
+            for _ in range(reader.u2()):
+                self.element_value(indent + 4, reader, self.utf(reader.u2()), "=")
+            self.line(indent, ".end annotation")
+        elif tag == "[":
+            self.line(indent, *prefix, "array")
+            for _ in range(reader.u2()):
+                self.element_value(indent + 4, reader)
+            self.line(indent, ".end array")
+        else:
+            raise ClassFormatError(f"unknown element value tag {tag!r}")
+
+    # code
+
+    def code(self, data):
+        reader = Reader(data)
+        max_stack, max_locals = reader.u2(), reader.u2()
+        code = reader.bytes(reader.u4())
+        handlers = [(reader.u2(), reader.u2(), reader.u2(), reader.u2()) for _ in range(reader.u2())]
+        attributes = []
+        for _ in range(reader.u2()):
+            name = self.cls.utf(reader.u2())
+            attributes.append((name, reader.bytes(reader.u4())))
+
+        frames = {}
+        for name, attribute in attributes:
+            if name == "StackMapTable":
+                frames = self.stack_map(attribute)
+
+        catches = {}
+        for start, end, handler, catch_type in handlers:
+            catches.setdefault(start, []).append((catch_type, end, handler))
+
+        self.line(4, ".code", "stack", str(max_stack), "locals", str(max_locals))
+        for offset, tokens, extra_lines in self.instructions(code):
+            for catch_type, end, handler in catches.get(offset, []):
+                self.line(8, ".catch", self.class_ref(catch_type), "from", f"L{offset}", "to", f"L{end}", "using", f"L{handler}")
+            if offset in frames:
+                self.blank()
+                self.frame(*frames[offset])
+            self.lines.append(f"L{offset}:".ljust(8) + "".join(token + " " for token in tokens))
+            self.lines.extend(extra_lines)
+        self.lines.append(f"L{len(code)}:".ljust(8))
+
+        for name, attribute in attributes:
+            if name != "StackMapTable":
+                self.code_attribute(name, attribute)
+        self.line(4, ".end code")
+
+    def code_attribute(self, name, data):
+        reader = Reader(data)
+        if name == "LineNumberTable":
+            self.line(8, ".linenumbertable")
+            for _ in range(reader.u2()):
+                pc, line_number = reader.u2(), reader.u2()
+                self.line(12, f"L{pc}", str(line_number))
+            self.line(8, ".end linenumbertable")
+        elif name in ("LocalVariableTable", "LocalVariableTypeTable"):
+            directive = name.lower()
+            self.line(8, "." + directive)
+            for _ in range(reader.u2()):
+                start, length, name_index, desc_index, index = (reader.u2() for _ in range(5))
+                self.line(
+                    12, str(index), "is", self.utf(name_index), self.utf(desc_index),
+                    "from", f"L{start}", "to", f"L{start + length}",
+                )
+            self.line(8, ".end " + directive)
+        else:
+            self.attribute(8, name, data)
+
+    def instructions(self, code):
+        '''
+        Yields (offset, tokens, extra lines) for each instruction.
+        '''
+        reader = Reader(code)
+        while reader.pos < len(code):
+            offset = reader.pos
+            opcode = reader.u1()
+            if opcode >= len(OPCODES):
+                raise ClassFormatError(f"unknown opcode {opcode} at {offset}")
+            op = OPCODES[opcode]
+            tokens = [op]
+            extra_lines = []
+
+            if op == "bipush":
+                tokens.append(str(reader.s1()))
+            elif op == "sipush":
+                tokens.append(str(reader.s2()))
+            elif op == "ldc":
+                tokens.append(self.constant(reader.u1()))
+            elif op in ("ldc_w", "ldc2_w"):
+                tokens.append(self.constant(reader.u2()))
+            elif op in ("iload", "lload", "fload", "dload", "aload",
+                        "istore", "lstore", "fstore", "dstore", "astore", "ret"):
+                tokens.append(str(reader.u1()))
+            elif op == "iinc":
+                tokens += [str(reader.u1()), str(reader.s1())]
+            elif 153 <= opcode <= 168 or op in ("ifnull", "ifnonnull"):
+                tokens.append(f"L{offset + reader.s2()}")
+            elif op in ("goto_w", "jsr_w"):
+                tokens.append(f"L{offset + reader.s4()}")
+            elif op in ("getstatic", "putstatic", "getfield", "putfield",
+                        "invokevirtual", "invokespecial", "invokestatic"):
+                tokens.append(self.member_ref(reader.u2()))
+            elif op == "invokeinterface":
+                tokens += [self.member_ref(reader.u2()), str(reader.u1())]
+                reader.u1()
+            elif op == "invokedynamic":
+                tokens.append(self.constant(reader.u2()))
+                reader.u2()
+            elif op in ("new", "anewarray", "checkcast", "instanceof"):
+                tokens.append(self.class_ref(reader.u2()))
+            elif op == "newarray":
+                atype = reader.u1()
+                tokens.append(NEWARRAY_TYPES.get(atype, str(atype)))
+            elif op == "multianewarray":
+                tokens += [self.class_ref(reader.u2()), str(reader.u1())]
+            elif op in ("tableswitch", "lookupswitch"):
+                reader.pos += (4 - reader.pos % 4) % 4
+                default = offset + reader.s4()
+                if op == "tableswitch":
+                    low, high = reader.s4(), reader.s4()
+                    tokens.append(str(low))
+                    for _ in range(high - low + 1):
+                        extra_lines.append(" " * 12 + f"L{offset + reader.s4()} ")
+                else:
+                    for _ in range(reader.u4()):
+                        key = reader.s4()
+                        extra_lines.append(" " * 12 + f"{key} : L{offset + reader.s4()} ")
+                extra_lines += [" " * 12 + f"default : L{default} ", ""]
+            elif op == "wide":
+                wide_op = OPCODES[reader.u1()]
+                tokens += [wide_op, str(reader.u2())]
+                if wide_op == "iinc":
+                    tokens.append(str(reader.s2()))
+
+            yield offset, tokens, extra_lines
+
+    def stack_map(self, data):
+        '''
+        Returns {offset: (kind, locals, stack)} for the frames of a StackMapTable
+        attribute, with verification types kept as (tag, value) pairs.
+        '''
+        reader = Reader(data)
+        frames = {}
+        offset = -1
+        for _ in range(reader.u2()):
+            frame_type = reader.u1()
+            local_types, stack_types = [], []
+            if frame_type < 64:
+                kind, delta = "same", frame_type
+            elif frame_type < 128:
+                kind, delta = "stack_1", frame_type - 64
+                stack_types = [self.verification_type(reader)]
+            elif frame_type == 247:
+                kind, delta = "stack_1_extended", reader.u2()
+                stack_types = [self.verification_type(reader)]
+            elif 248 <= frame_type <= 250:
+                kind, delta = f"chop {251 - frame_type}", reader.u2()
+            elif frame_type == 251:
+                kind, delta = "same_extended", reader.u2()
+            elif 252 <= frame_type <= 254:
+                kind, delta = "append", reader.u2()
+                local_types = [self.verification_type(reader) for _ in range(frame_type - 251)]
+            elif frame_type == 255:
+                kind, delta = "full", reader.u2()
+                local_types = [self.verification_type(reader) for _ in range(reader.u2())]
+                stack_types = [self.verification_type(reader) for _ in range(reader.u2())]
+            else:
+                raise ClassFormatError(f"reserved stack frame type {frame_type}")
+            offset += delta + 1
+            frames[offset] = (kind, local_types, stack_types)
+        return frames
+
+    def verification_type(self, reader):
+        tag = reader.u1()
+        if tag < len(VERIFICATION_TYPES):
+            return tag, None
+        if tag in (7, 8):
+            return tag, reader.u2()
+        raise ClassFormatError(f"unknown verification type {tag}")
+
+    def format_verification_type(self, tag, value):
+        if tag == 7:
+            return f"Object {self.class_ref(value)}"
+        if tag == 8:
+            return f"Uninitialized L{value}"
+        return VERIFICATION_TYPES[tag]
+
+    def frame(self, kind, local_types, stack_types):
+        local_types = [self.format_verification_type(*t) for t in local_types]
+        stack_types = [self.format_verification_type(*t) for t in stack_types]
+        if kind == "full":
+            self.line(8, ".stack full")
+            self.line(12, "locals", *local_types)
+            self.line(12, "stack", *stack_types)
+            self.line(8, ".end stack")
+        else:
+            self.line(8, ".stack", kind, *local_types, *stack_types)
+
+
+def disassemble(byte_code):
+    '''
+    Returns the Krakatau assembly (.j) text for a class file given as bytes.
+    Raises ClassFormatError on malformed input.
+    '''
+    return Disassembler(ClassFile(byte_code)).disassemble()
@@ -0,0 +1,280 @@
+"""
+Long-lived helper JVMs used by java_utils.py.
+
+Starting a JVM (and warming up javac or JUnit inside it) costs far more than
+compiling or testing a single small class. The helpers in java/ are compiled
+once into build/java/ and kept running; python talks to them over stdin/stdout
+using the framing implemented in java/DaemonIO.java.
+"""
+
+import atexit
+import hashlib
+import os
+import queue
+import shutil
+import signal
+import struct
+import subprocess
+import tempfile
+import threading
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+JAVA_SRC_DIR = os.path.join(BASE_DIR, "java")
+JAVA_BUILD_DIR = os.path.join(BASE_DIR, "build", "java")
+
+
+class DaemonUnavailable(Exception):
+    '''
+    Raised when a helper JVM cannot be built, started or talked to.
+    Callers are expected to fall back to the one-shot subprocess path.
+    '''
+
+
+class DaemonTimeout(Exception):
+    '''
+    Raised when a request does not complete within its timeout. The helper JVM
+    is killed (it restarts on the next request), so whatever hung it cannot
+    block later requests. Retrying elsewhere would most likely hang again, so
+    callers should report a timeout rather than fall back.
+    '''
+
+
+def build_helpers(javac, sources, classpath=()):
+    '''
+    Compiles helper sources (file names relative to java/) and returns the
+    directory holding the class files. The output directory is keyed by a hash
+    of the sources and classpath, so workers racing to build it never observe a
+    partially written directory.
+    '''
+    digest = hashlib.sha256()
+    digest.update(javac.encode())
+    for path in classpath:
+        digest.update(path.encode())
+    for source in sources:
+        with open(os.path.join(JAVA_SRC_DIR, source), "rb") as f:
+            digest.update(source.encode())
+            digest.update(f.read())
+
+    out_dir = os.path.join(JAVA_BUILD_DIR, digest.hexdigest()[:16])
+    if os.path.isdir(out_dir):
+        return out_dir
+
+    os.makedirs(JAVA_BUILD_DIR, exist_ok=True)
+    temp_dir = tempfile.mkdtemp(dir=JAVA_BUILD_DIR)
+    cmd = [javac, "-nowarn", "-d", temp_dir, "-cp", ":".join(classpath)]
+    cmd += [os.path.join(JAVA_SRC_DIR, source) for source in sources]
+    try:
+        result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    except OSError as e:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise DaemonUnavailable(f"cannot run {javac}: {e}")
+
+    if result.returncode != 0:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise DaemonUnavailable(result.stderr.decode(errors="replace"))
+
+    try:
+        os.rename(temp_dir, out_dir)
+    except OSError:
+        # another worker finished first
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    return out_dir
+
+
+def kill_process_group(proc):
+    '''
+    SIGKILLs the process group led by `proc` (started with start_new_session=True).
+    '''
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+
+class JavaDaemon:
+    '''
+    A helper JVM speaking the DaemonIO protocol on stdin/stdout.
+
+    Requests are serialized with a lock, so one daemon serves one request at a
+    time. The JVM is (re)started lazily, and recycled after `max_requests`
+    requests to bound whatever state leaks across requests.
+    '''
+
+    def __init__(self, java, main_class, classpath, jvm_args=(), args=(), max_requests=1000):
+        self.java = java
+        self.main_class = main_class
+        self.classpath = list(classpath)
+        self.jvm_args = list(jvm_args)
+        self.args = list(args)
+        self.max_requests = max_requests
+        self.proc = None
+        self.num_requests = 0
+        self.lock = threading.Lock()
+
+    def _start(self):
+        cmd = [self.java] + self.jvm_args + ["-cp", ":".join(self.classpath), self.main_class] + self.args
+        try:
+            self.proc = subprocess.Popen(
+                cmd,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                # own process group, so a kill also reaches anything the JVM started
+                start_new_session=True,
+            )
+        except OSError as e:
+            self.proc = None
+            raise DaemonUnavailable(f"cannot start {self.main_class}: {e}")
+        self.num_requests = 0
+
+    def _read_exact(self, n):
+        data = self.proc.stdout.read(n)
+        if data is None or len(data) != n:
+            raise DaemonUnavailable(f"{self.main_class} exited mid-response")
+        return data
+
+    def _write_frame(self, fields):
+        chunks = [struct.pack(">i", len(fields))]
+        for field in fields:
+            if isinstance(field, str):
+                field = field.encode("utf-8")
+            chunks.append(struct.pack(">i", len(field)))
+            chunks.append(field)
+        self.proc.stdin.write(b"".join(chunks))
+        self.proc.stdin.flush()
+
+    def _read_frame(self):
+        num_fields, = struct.unpack(">i", self._read_exact(4))
+        fields = []
+        for _ in range(num_fields):
+            length, = struct.unpack(">i", self._read_exact(4))
+            fields.append(self._read_exact(length))
+        return fields
+
+    def request(self, fields, timeout=None):
+        '''
+        Sends one frame (a list of str/bytes fields) and returns the response
+        frame as a list of bytes. Raises DaemonTimeout if the response takes
+        longer than `timeout` seconds.
+        '''
+        with self.lock:
+            if self.proc is None or self.proc.poll() is not None:
+                self._start()
+            elif self.num_requests >= self.max_requests:
+                self._stop()
+                self._start()
+
+            # killing the JVM unblocks the read below, which then fails
+            expired = threading.Event()
+            timer = None
+            if timeout is not None:
+                proc = self.proc
+
+                def expire():
+                    expired.set()
+                    kill_process_group(proc)
+
+                timer = threading.Timer(timeout, expire)
+                timer.daemon = True
+                timer.start()
+
+            try:
+                self._write_frame(fields)
+                response = self._read_frame()
+            except (OSError, DaemonUnavailable) as e:
+                self._stop()
+                if expired.is_set():
+                    raise DaemonTimeout(f"{self.main_class} did not respond within {timeout}s")
+                raise DaemonUnavailable(str(e))
+            finally:
+                if timer is not None:
+                    timer.cancel()
+
+            self.num_requests += 1
+            return response
+
+    def _stop(self):
+        if self.proc is None:
+            return
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            kill_process_group(self.proc)
+            self.proc.wait()
+        self.proc = None
+
+    def close(self):
+        with self.lock:
+            self._stop()
+
+
+class DaemonPool:
+    '''
+    `num_workers` interchangeable daemons built by `factory()`. Each request
+    goes to an idle daemon, blocking while all are busy. Daemons start lazily and
+    the most recently used one is handed out first, so a pool used from a single
+    thread only ever starts one JVM.
+    '''
+
+    def __init__(self, factory, num_workers):
+        self.num_workers = num_workers
+        self.idle = queue.LifoQueue()
+        for _ in range(num_workers):
+            self.idle.put(factory())
+
+    def request(self, fields, timeout=None):
+        daemon = self.idle.get()
+        try:
+            return daemon.request(fields, timeout)
+        finally:
+            self.idle.put(daemon)
+
+    def close(self):
+        for _ in range(self.num_workers):
+            self.idle.get().close()
+
+
+_daemons = {}
+_daemons_pid = None
+_daemons_lock = threading.Lock()
+
+
+def get_daemon(name, factory):
+    '''
+    Returns the per-process daemon registered under `name`, creating it with
+    `factory()` on first use. Daemons are never shared across a fork: a child
+    process starts its own instead of writing into its parent's pipes. A factory
+    that raised DaemonUnavailable is not retried in the same process.
+    '''
+    global _daemons, _daemons_pid
+    with _daemons_lock:
+        if _daemons_pid != os.getpid():
+            _daemons = {}
+            _daemons_pid = os.getpid()
+
+        if name not in _daemons:
+            try:
+                _daemons[name] = factory()
+            except DaemonUnavailable as e:
+                _daemons[name] = e
+
+        daemon = _daemons[name]
+        if isinstance(daemon, DaemonUnavailable):
+            raise daemon
+        return daemon
+
+
+@atexit.register
+def close_daemons():
+    with _daemons_lock:
+        if _daemons_pid != os.getpid():
+            return
+        for daemon in _daemons.values():
+            if not isinstance(daemon, DaemonUnavailable):
+                daemon.close()
+        _daemons.clear()
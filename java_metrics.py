@@ -0,0 +1,324 @@
+"""
+Lightweight timing and counters for the java_utils.py toolchain.
+
+Every toolchain entry point is wrapped with @timed(stage), which records a
+latency histogram, a call count and failures by type for that stage. Caches
+count hits and misses, and temp files written by java_utils.py count towards
+bytes written, attributed to the stage that wrote them and split by whether
+they went to disk or to a tmpfs.
+
+Metrics live in the process that recorded them. An entry script calls
+dump_at_exit(path) once; worker processes started after that (joblib, process
+pools) write their own snapshots when they exit, and the entry script merges
+them into <path> (JSON) and <path minus .json>.prom (Prometheus text format).
+
+    python build_dataset.py ... --metrics-out build/metrics.json
+"""
+
+import atexit
+import contextvars
+import functools
+import json
+import multiprocessing.util
+import os
+import threading
+import time
+
+# histogram bucket upper bounds in seconds, from a cached lookup to an EvoSuite run
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900)
+# set by dump_at_exit for worker processes to write their snapshots into
+WORKER_DIR_ENV = "JAVA_METRICS_WORKER_DIR"
+# pid of the process that called dump_at_exit, which merges the worker snapshots
+OWNER_PID_ENV = "JAVA_METRICS_OWNER_PID"
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_histograms = {}
+_current_stage = contextvars.ContextVar("java_metrics_stage", default=None)
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, amount=1, **labels):
+    '''
+    Adds `amount` to the counter `name` with the given labels.
+    '''
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def set_gauge(name, value, **labels):
+    '''
+    Sets the gauge `name` with the given labels to `value`.
+    '''
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name, value, **labels):
+    '''
+    Records one observation of `value` in the histogram `name`.
+    '''
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {"buckets": [0] * len(LATENCY_BUCKETS), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                histogram["buckets"][i] += 1
+        histogram["sum"] += value
+        histogram["count"] += 1
+
+
+def counter_value(name, **labels):
+    '''
+    Returns the current value of a counter in this process (0 if never incremented).
+    '''
+    with _lock:
+        return _counters.get(_key(name, labels), 0)
+
+
+def current_stage():
+    '''
+    The innermost @timed stage running in this thread (or task), or None.
+    '''
+    return _current_stage.get()
+
+
+def add_bytes_written(num_bytes, medium="disk"):
+    '''
+    Counts bytes written by the current stage, to "disk" or to "memory" (tmpfs).
+    '''
+    inc("java_bytes_written_total", num_bytes, stage=current_stage() or "other", medium=medium)
+
+
+def _failure_type(result):
+    # None, a None first element and {"success": False} are how java_utils reports a tool that produced nothing
+    if result is None:
+        return "no_output"
+    # (java_str, seconds) from decompile_timed, (test, scaffold, statistics) from evosuite_gen_test_stats
+    if isinstance(result, tuple) and result and result[0] is None:
+        return "no_output"
+    if isinstance(result, dict):
+        outcome = result.get("outcome")
+        if outcome is not None and outcome != "ok":
+            return outcome
+        if result.get("success") is False:
+            return "failed"
+    return None
+
+
+def timed(stage):
+    '''
+    Decorator recording latency, calls and failures of a toolchain entry point.
+    A call fails if it raises (type: the exception class), returns None, or
+    returns a dict whose "outcome" is not "ok" or whose "success" is False.
+    '''
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            token = _current_stage.set(stage)
+            start = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                inc("java_failures_total", stage=stage, type=type(e).__name__)
+                raise
+            else:
+                failure = _failure_type(result)
+                if failure is not None:
+                    inc("java_failures_total", stage=stage, type=failure)
+                return result
+            finally:
+                observe("java_stage_seconds", time.perf_counter() - start, stage=stage)
+                inc("java_calls_total", stage=stage)
+                _current_stage.reset(token)
+
+        return wrapper
+
+    return decorator
+
+
+def _render(counters, gauges, histograms):
+    return {
+        "counters": [
+            {"name": name, "labels": dict(labels), "value": value}
+            for (name, labels), value in sorted(counters.items())
+        ],
+        "gauges": [
+            {"name": name, "labels": dict(labels), "value": value}
+            for (name, labels), value in sorted(gauges.items())
+        ],
+        "histograms": [
+            {
+                "name": name,
+                "labels": dict(labels),
+                "buckets": list(zip(LATENCY_BUCKETS, histogram["buckets"])),
+                "sum": histogram["sum"],
+                "count": histogram["count"],
+            }
+            for (name, labels), histogram in sorted(histograms.items())
+        ],
+    }
+
+
+def snapshot():
+    '''
+    Returns all metrics of this process as a JSON-serializable dict.
+    '''
+    with _lock:
+        return _render(_counters, _gauges, _histograms)
+
+
+def merge(snapshots):
+    '''
+    Sums snapshots (e.g. from several worker processes) into one. Gauges are
+    summed too, so a gauge should only be set by one process.
+    '''
+    counters = {}
+    gauges = {}
+    histograms = {}
+    for snap in snapshots:
+        for counter in snap["counters"]:
+            key = _key(counter["name"], counter["labels"])
+            counters[key] = counters.get(key, 0) + counter["value"]
+        for gauge in snap.get("gauges", []):
+            key = _key(gauge["name"], gauge["labels"])
+            gauges[key] = gauges.get(key, 0) + gauge["value"]
+        for hist in snap["histograms"]:
+            key = _key(hist["name"], hist["labels"])
+            merged = histograms.setdefault(key, {"buckets": [0] * len(LATENCY_BUCKETS), "sum": 0.0, "count": 0})
+            for i, (_, count) in enumerate(hist["buckets"]):
+                merged["buckets"][i] += count
+            merged["sum"] += hist["sum"]
+            merged["count"] += hist["count"]
+
+    return _render(counters, gauges, histograms)
+
+
+def _format_labels(labels, **extra):
+    labels = dict(labels, **extra)
+    if not labels:
+        return ""
+    parts = []
+    for name, value in sorted(labels.items()):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{name}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def to_prometheus(snap):
+    '''
+    Renders a snapshot in the Prometheus text exposition format.
+    '''
+    lines = []
+    typed = set()
+    for counter in snap["counters"]:
+        if counter["name"] not in typed:
+            typed.add(counter["name"])
+            lines.append(f"# TYPE {counter['name']} counter")
+        lines.append(f"{counter['name']}{_format_labels(counter['labels'])} {counter['value']}")
+
+    for gauge in snap.get("gauges", []):
+        if gauge["name"] not in typed:
+            typed.add(gauge["name"])
+            lines.append(f"# TYPE {gauge['name']} gauge")
+        lines.append(f"{gauge['name']}{_format_labels(gauge['labels'])} {gauge['value']}")
+
+    for hist in snap["histograms"]:
+        name = hist["name"]
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} histogram")
+        # buckets count observations <= their bound, i.e. are already cumulative
+        for bound, count in hist["buckets"]:
+            lines.append(f"{name}_bucket{_format_labels(hist['labels'], le=bound)} {count}")
+        lines.append(f"{name}_bucket{_format_labels(hist['labels'], le='+Inf')} {hist['count']}")
+        lines.append(f"{name}_sum{_format_labels(hist['labels'])} {hist['sum']}")
+        lines.append(f"{name}_count{_format_labels(hist['labels'])} {hist['count']}")
+
+    return "\n".join(lines) + "\n"
+
+
+def _write_json(path, data):
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(temp_path, path)
+
+
+def dump(path):
+    '''
+    Writes this process's metrics, merged with any worker snapshots, to `path`
+    (JSON) and the matching .prom file.
+    '''
+    snapshots = [snapshot()]
+    worker_dir = os.environ.get(WORKER_DIR_ENV)
+    if worker_dir and os.path.isdir(worker_dir):
+        for filename in sorted(os.listdir(worker_dir)):
+            if filename.endswith(".json"):
+                with open(os.path.join(worker_dir, filename), "r") as f:
+                    snapshots.append(json.load(f))
+
+    merged = merge(snapshots)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    _write_json(path, merged)
+
+    prom_path = (path[:-len(".json")] if path.endswith(".json") else path) + ".prom"
+    with open(prom_path, "w") as f:
+        f.write(to_prometheus(merged))
+
+
+def dump_at_exit(path):
+    '''
+    Dumps the metrics of this process and of every worker process it starts
+    from now on to `path` when this process exits.
+    '''
+    worker_dir = os.path.abspath(path) + ".workers"
+    os.makedirs(worker_dir, exist_ok=True)
+    for filename in os.listdir(worker_dir):
+        os.remove(os.path.join(worker_dir, filename))
+    os.environ[WORKER_DIR_ENV] = worker_dir
+    os.environ[OWNER_PID_ENV] = str(os.getpid())
+
+    atexit.register(_dump_if_owner, path)
+
+
+def _dump_if_owner(path):
+    # forked workers inherit this atexit hook; only the entry script merges
+    if os.environ.get(OWNER_PID_ENV) == str(os.getpid()):
+        dump(path)
+
+
+def _write_worker_snapshot():
+    worker_dir = os.environ.get(WORKER_DIR_ENV)
+    if worker_dir and os.path.isdir(worker_dir):
+        _write_json(os.path.join(worker_dir, f"{os.getpid()}.json"), snapshot())
+
+
+def _register_worker():
+    # multiprocessing runs Finalize callbacks when a worker process exits, which atexit does not cover
+    if os.environ.get(WORKER_DIR_ENV) and os.environ.get(OWNER_PID_ENV) != str(os.getpid()):
+        multiprocessing.util.Finalize(None, _write_worker_snapshot, exitpriority=10)
+        atexit.register(_write_worker_snapshot)
+
+
+def _reset_after_fork():
+    # a forked worker starts from zero; its parent reports what happened before the fork
+    global _lock
+    _lock = threading.Lock()
+    _counters.clear()
+    _gauges.clear()
+    _histograms.clear()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+# multiprocessing clears Finalize callbacks in a new worker before running these hooks
+multiprocessing.util.register_after_fork(_register_worker, lambda register: register())
+# a spawned worker imports this module fresh, with the entry script's environment
+_register_worker()
@@ -0,0 +1,320 @@
+"""
+Structural normalization of compiled classes, for telling whether a candidate
+compiles to the same class as the gold source.
+
+Classes are compared as Krakatau assembly (.j, as produced by
+java_classfile.py or Krakatau itself) after dropping what does not affect
+behaviour: line-number tables, local variable names and types, parameter
+names and the source file name. Constant-pool references ([u12] etc.) are
+inlined, so the pool's ordering does not matter, and fields and methods are
+sorted, so declaration order does not either.
+
+The member signatures of two classes can also be diffed, to tell without
+running anything whether tests written against the gold class can link
+against a candidate.
+
+    if java_normalize.structurally_equal(candidate_byte_code, gold_jasm=sample["jasm_code"]):
+        ...
+"""
+
+import functools
+import re
+
+import java_classfile
+
+# blocks carrying only debug information or names
+DEBUG_BLOCKS = ["linenumbertable", "localvariabletable", "localvariabletypetable", "methodparameters"]
+# single-line directives carrying only debug information
+DEBUG_DIRECTIVES = [".sourcefile", ".sourcedebugextension"]
+
+# a symbolic constant-pool reference such as [u12] or [c3]
+SYMBOLIC_REF_RE = re.compile(r"\[[a-z]+\d+\]")
+# member flags a test compiled against the gold class depends on when linking; same-package
+# EvoSuite tests link against public, protected and package-private members alike
+LINKAGE_FLAGS = ["private", "static"]
+# (name, descriptor) of overridable java.lang.Object methods, which calls still resolve to when a class drops its override
+OBJECT_METHODS = [
+    ("toString", "()Ljava/lang/String;"),
+    ("equals", "(Ljava/lang/Object;)Z"),
+    ("hashCode", "()I"),
+    ("clone", "()Ljava/lang/Object;"),
+    ("finalize", "()V"),
+]
+
+
+def _inline_constants(lines):
+    '''
+    Removes top-level `.const [ref] = value` definitions and substitutes each
+    value where the reference is used.
+    '''
+    values = {}
+    rest = []
+    for line in lines:
+        if line.startswith(".const [") and " = " in line:
+            ref, value = line[len(".const "):].split(" = ", 1)
+            value = value.rstrip()
+            # Utf8 constants stand for their text, everything else for the whole definition
+            values[ref] = value[len("Utf8 "):] if value.startswith("Utf8 ") else value
+        else:
+            rest.append(line)
+
+    def substitute(match, depth=0):
+        value = values.get(match.group(0))
+        if value is None or depth > 8:
+            return match.group(0)
+        return SYMBOLIC_REF_RE.sub(lambda m: substitute(m, depth + 1), value)
+
+    if not values:
+        return rest
+    return [SYMBOLIC_REF_RE.sub(substitute, line) for line in rest]
+
+
+def normalize_jasm(jasm):
+    '''
+    Returns the canonical form of a class in Krakatau assembly.
+    '''
+    lines = [line.rstrip() for line in jasm.split("\n")]
+    lines = _inline_constants([line for line in lines if line])
+
+    kept = []
+    skip_until = None
+    for line in lines:
+        stripped = line.strip()
+        if skip_until is not None:
+            if stripped == skip_until:
+                skip_until = None
+            continue
+        directive = stripped.split(" ", 1)[0]
+        if directive[1:] in DEBUG_BLOCKS:
+            skip_until = ".end " + directive[1:]
+            continue
+        if directive in DEBUG_DIRECTIVES:
+            continue
+        kept.append(line)
+
+    # group top-level members: a .field/.method line with everything up to its end
+    header, members, footer = [], [], []
+    i = 0
+    while i < len(kept):
+        line = kept[i]
+        if line.startswith(".field") or line.startswith(".method"):
+            block = [line]
+            end = ".end method" if line.startswith(".method") else ".end fieldattributes"
+            if line.startswith(".method") or line.endswith(".fieldattributes"):
+                while i + 1 < len(kept) and block[-1] != end:
+                    i += 1
+                    block.append(kept[i])
+            members.append("\n".join(block))
+        elif members:
+            footer.append(line)
+        else:
+            header.append(line)
+        i += 1
+
+    return "\n".join(header + sorted(members) + footer) + "\n"
+
+
+@functools.lru_cache(maxsize=256)
+def normalize_class(byte_code):
+    '''
+    Returns the canonical form of a class file given as bytes, or None if it
+    cannot be parsed.
+    '''
+    try:
+        return normalize_jasm(java_classfile.disassemble(byte_code))
+    except java_classfile.ClassFormatError:
+        return None
+
+
+@functools.lru_cache(maxsize=256)
+def _normalize_gold_jasm(jasm):
+    return normalize_jasm(jasm)
+
+
+def structurally_equal(byte_code, gold_byte_code=None, gold_jasm=None):
+    '''
+    Whether a candidate class file is the gold class (given as class bytes or
+    as Krakatau assembly) up to debug information, constant-pool order and
+    member order.
+    '''
+    if gold_byte_code is not None and byte_code == gold_byte_code:
+        return True
+
+    candidate = normalize_class(byte_code)
+    if candidate is None:
+        return False
+
+    if gold_byte_code is not None:
+        return candidate == normalize_class(gold_byte_code)
+    if gold_jasm is not None:
+        return candidate == _normalize_gold_jasm(gold_jasm)
+    return False
+
+
+def member_signatures(jasm):
+    '''
+    Returns the fields and methods declared in a class in Krakatau assembly as
+    {(kind, name, descriptor): flags}, kind being "field" or "method".
+    '''
+    lines = _inline_constants([line.strip() for line in jasm.split("\n") if line.strip()])
+    signatures = {}
+    for line in lines:
+        if line.startswith(".method "):
+            # .method <flags> <name> : <descriptor>
+            head, descriptor = line[len(".method "):].rsplit(" : ", 1)
+            *flags, name = head.split()
+            signatures[("method", name, descriptor.split()[0])] = tuple(flags)
+        elif line.startswith(".field "):
+            # .field <flags> <name> <descriptor> [= <value>] [.fieldattributes]
+            tokens = line[len(".field "):].split(" = ", 1)[0].split()
+            if tokens[-1] == ".fieldattributes":
+                tokens.pop()
+            *flags, name, descriptor = tokens
+            signatures[("field", name, descriptor)] = tuple(flags)
+    return signatures
+
+
+def _visible(flags):
+    # private and compiler-generated members cannot be referenced by a test
+    return "private" not in flags and "synthetic" not in flags
+
+
+def _linkage_flags(flags):
+    return [flag for flag in LINKAGE_FLAGS if flag in flags]
+
+
+def _resolvable(key, flags, candidate):
+    # whether a reference to the gold member could still link: through a visible member of the
+    # candidate with its name, kind and staticness (another overload), or through java.lang.Object
+    kind, name, descriptor = key
+    if kind == "method" and "static" not in flags and (name, descriptor) in OBJECT_METHODS:
+        return True
+    return any(
+        other[:2] == (kind, name) and _visible(other_flags) and ("static" in other_flags) == ("static" in flags)
+        for other, other_flags in candidate.items()
+    )
+
+
+def signature_diff(jasm, gold_jasm):
+    '''
+    Compares the members of a class with those of the gold class, both in
+    Krakatau assembly. Returns {"missing", "extra", "mismatched"}: gold members
+    the class lacks, members only the class has, and members whose descriptor
+    or private/static flags differ, each as {"kind", "name", "descriptor",
+    "flags"} (mismatches as {"kind", "name", "gold", "candidate"}). Missing and
+    mismatched members also have "resolvable" set if a reference to them
+    could still link, to another overload or to a java.lang.Object method.
+    Private gold members and synthetic members are ignored.
+    '''
+    candidate = {key: flags for key, flags in member_signatures(jasm).items() if "synthetic" not in flags}
+    gold = {key: flags for key, flags in member_signatures(gold_jasm).items() if _visible(flags)}
+
+    def member(key, flags):
+        kind, name, descriptor = key
+        return {"kind": kind, "name": name, "descriptor": descriptor, "flags": list(flags)}
+
+    missing = [key for key in gold if key not in candidate]
+    extra = [key for key in candidate if key not in gold and _visible(candidate[key])]
+
+    mismatched = []
+    # a gold member whose name the class only has with another descriptor was changed, not dropped
+    for key in list(missing):
+        kind, name, _ = key
+        others = [other for other in extra if other[:2] == (kind, name)]
+        if others:
+            missing.remove(key)
+            extra.remove(others[0])
+            mismatched.append((key, others[0]))
+    for key in gold:
+        if key in candidate and _linkage_flags(gold[key]) != _linkage_flags(candidate[key]):
+            mismatched.append((key, key))
+
+    return {
+        "missing": [
+            dict(member(key, gold[key]), resolvable=_resolvable(key, gold[key], candidate)) for key in sorted(missing)
+        ],
+        "extra": [member(key, candidate[key]) for key in sorted(extra)],
+        "mismatched": sorted(
+            (
+                {
+                    "kind": gold_key[0],
+                    "name": gold_key[1],
+                    "gold": member(gold_key, gold[gold_key]),
+                    "candidate": member(candidate_key, candidate[candidate_key]),
+                    "resolvable": _resolvable(gold_key, gold[gold_key], candidate),
+                }
+                for gold_key, candidate_key in mismatched
+            ),
+            key=lambda m: (m["kind"], m["name"]),
+        ),
+    }
+
+
+def _receivers(class_name, test_str):
+    # expressions a test reaches the class's members through: the class itself and variables declared with its type
+    names = {class_name}
+    names.update(re.findall(r"\b" + re.escape(class_name) + r"(?:<[^;=()]*>)?(?:\[\])*\s+(\w+)\s*[=;,)]", test_str))
+    return names
+
+
+def _referenced(member, class_name, test_str):
+    name = member["name"]
+    if name == "<init>":
+        return re.search(r"\bnew\s+" + re.escape(class_name) + r"\s*[(<]", test_str) is not None
+    if name == "<clinit>":
+        return False
+    receivers = "|".join(re.escape(receiver) for receiver in sorted(_receivers(class_name, test_str)))
+    # a method is called or referenced (::name), a field is read or written but not called
+    suffix = r"\s*\(" if member["kind"] == "method" else r"\b(?!\s*\()"
+    access = r"(?:\b(?:" + receivers + r")\s*\.\s*" + re.escape(name) + suffix + r")"
+    if member["kind"] == "method":
+        access += r"|(?:\b(?:" + receivers + r")\s*::\s*" + re.escape(name) + r"\b)"
+    return re.search(access, test_str) is not None
+
+
+def breaks_linkage(diff, class_name, test_str):
+    '''
+    Whether the tests in `test_str` reference, through the class or a
+    variable of its type, a member that `diff` (from signature_diff) reports
+    missing or mismatched and that no other member of the candidate or
+    java.lang.Object can stand in for, so they cannot link against the
+    candidate. Anything less certain is left to running the tests.
+    '''
+    members = diff["missing"] + diff["mismatched"]
+    return any(
+        not member["resolvable"] and _referenced(member, class_name, test_str) for member in members
+    )
+
+
+def format_signature_diff(diff):
+    '''
+    Renders a signature diff as short text, e.g. as feedback for a model.
+    '''
+    def signature(member):
+        separator = " : " if member["kind"] == "method" else " "
+        return " ".join(member["flags"] + [member["name"]]) + separator + member["descriptor"]
+
+    lines = []
+    for member in diff["missing"]:
+        lines.append(f"missing {member['kind']}: {signature(member)}")
+    for member in diff["mismatched"]:
+        lines.append(f"wrong {member['kind']}: {signature(member['candidate'])} (expected {signature(member['gold'])})")
+    for member in diff["extra"]:
+        lines.append(f"extra {member['kind']}: {signature(member)}")
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def class_signature_diff(byte_code, gold_byte_code=None, gold_jasm=None):
+    '''
+    signature_diff for a class file against the gold class (given as class
+    bytes or as Krakatau assembly), or None if either cannot be read.
+    '''
+    try:
+        jasm = java_classfile.disassemble(byte_code)
+        if gold_jasm is None:
+            if gold_byte_code is None:
+                return None
+            gold_jasm = java_classfile.disassemble(gold_byte_code)
+    except java_classfile.ClassFormatError:
+        return None
+    return signature_diff(jasm, gold_jasm)
@@ -0,0 +1,242 @@
+"""
+Staged dataflow execution for java_utils.py pipelines.
+
+Running every step of a sample in one worker makes the cheap steps (parsing,
+javac, formatting) wait behind the slow ones (EvoSuite). A Pipeline instead
+gives each stage its own process pool and a bounded queue in front of it. A
+stage whose next queue is full stops taking new work (backpressure) until
+the next stage catches up, so no queue grows without bound and a slow stage
+sets the pace for the whole pipeline.
+
+    pipeline = java_pipeline.Pipeline([
+        java_pipeline.Stage("prepare", prepare_sample, workers=16),
+        java_pipeline.Stage("evosuite", generate_tests, workers=4, memory_mb=5120),
+        java_pipeline.Stage("verify", verify_sample, workers=4),
+    ])
+    for index, status, sample in pipeline.run(enumerate(samples)):
+        ...
+
+A stage function takes one item and returns (status, item): "ok" passes the
+item to the next stage (or out of the pipeline after the last one), any other
+status ends the item there, as does an exception (status "error"). Stage
+functions must be picklable (top-level).
+"""
+
+import collections
+import concurrent.futures
+import sys
+import time
+
+import java_admission
+import java_metrics
+
+# seconds between status lines
+STATUS_INTERVAL = 30.0
+# seconds to wait for a stage to finish an item before rechecking memory and feeding the first queue
+POLL_INTERVAL = 1.0
+
+
+class Stage:
+    '''
+    One step of a pipeline: `fn` run on `workers` processes, fed from a queue
+    of at most `queue_size` items (default: twice the workers). With
+    `memory_mb`, an item only starts while the machine has that much
+    available memory beyond java_admission.HEADROOM_MB (one item always may).
+    '''
+
+    def __init__(self, name, fn, workers, queue_size=None, memory_mb=None):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.queue_size = queue_size or 2 * self.workers
+        self.memory_mb = memory_mb
+
+        self.queue = collections.deque()
+        self.running = {}
+        # finished items waiting for room in the next stage's queue
+        self.blocked = collections.deque()
+        self.blocked_since = None
+
+        self.items_in = 0
+        self.items_out = 0
+        self.busy_seconds = 0.0
+        self.blocked_seconds = 0.0
+        self.memory_waits = 0
+        self.memory_waiting = False
+
+    def _memory_allows(self, admitted):
+        # `admitted` items were just started and do not show in available memory yet
+        if self.memory_mb is None or not self.running:
+            self.memory_waiting = False
+            return True
+        available = java_admission.available_memory_mb()
+        if available is None or available - java_admission.HEADROOM_MB - admitted * self.memory_mb >= self.memory_mb:
+            self.memory_waiting = False
+            return True
+        # count each time the stage starts waiting, not every poll while it waits
+        if not self.memory_waiting:
+            self.memory_waiting = True
+            self.memory_waits += 1
+            java_metrics.inc("java_pipeline_memory_waits_total", stage=self.name)
+        return False
+
+    def stats(self, elapsed):
+        '''
+        Returns the stage's queue depth, running and blocked items, totals, and
+        throughput (items finished per second over `elapsed` seconds).
+        '''
+        blocked_seconds = self.blocked_seconds
+        if self.blocked_since is not None:
+            blocked_seconds += time.monotonic() - self.blocked_since
+        return {
+            "workers": self.workers,
+            "queued": len(self.queue),
+            "running": len(self.running),
+            "blocked": len(self.blocked),
+            "items_in": self.items_in,
+            "items_out": self.items_out,
+            "busy_seconds": self.busy_seconds,
+            "blocked_seconds": blocked_seconds,
+            "memory_waits": self.memory_waits,
+            "throughput": self.items_out / elapsed if elapsed > 0 else 0.0,
+            # share of the stage's worker time spent on items
+            "utilization": self.busy_seconds / (elapsed * self.workers) if elapsed > 0 else 0.0,
+        }
+
+
+def _run_stage(fn, stage, key, item):
+    # runs in a stage's worker process
+    start = time.perf_counter()
+    try:
+        status, item = fn(item)
+    except Exception as e:
+        # an item that breaks a tool is dropped, not the whole run
+        java_metrics.inc("java_pipeline_errors_total", stage=stage, type=type(e).__name__)
+        status, item = "error", None
+    return key, status, item, time.perf_counter() - start
+
+
+class Pipeline:
+    '''
+    Runs items through `stages` in order, each stage on its own process pool.
+    '''
+
+    def __init__(self, stages, verbose=True):
+        self.stages = stages
+        self.verbose = verbose
+        self.start_time = None
+
+    def stats(self):
+        '''
+        Returns {stage name: Stage.stats()} for the current run.
+        '''
+        elapsed = time.monotonic() - self.start_time if self.start_time is not None else 0.0
+        return {stage.name: stage.stats(elapsed) for stage in self.stages}
+
+    def _publish(self):
+        stats = self.stats()
+        for name, stage_stats in stats.items():
+            java_metrics.set_gauge("java_pipeline_queued", stage_stats["queued"], stage=name)
+            java_metrics.set_gauge("java_pipeline_running", stage_stats["running"], stage=name)
+            java_metrics.set_gauge("java_pipeline_blocked", stage_stats["blocked"], stage=name)
+            java_metrics.set_gauge("java_pipeline_throughput", stage_stats["throughput"], stage=name)
+            java_metrics.set_gauge("java_pipeline_utilization", stage_stats["utilization"], stage=name)
+        return stats
+
+    def _print_status(self, stats):
+        parts = []
+        for name, stage_stats in stats.items():
+            parts.append(
+                f"{name}: {stage_stats['queued']} queued, {stage_stats['running']}/{stage_stats['workers']} running, "
+                f"{stage_stats['blocked']} blocked ({stage_stats['blocked_seconds']:.0f}s), "
+                f"{stage_stats['items_out']} done ({stage_stats['throughput']:.2f}/s, {stage_stats['utilization']:.0%} busy)"
+            )
+        print("[pipeline] " + "; ".join(parts), file=sys.stderr)
+
+    def _unblock(self, i):
+        # moves finished items of stage i into stage i + 1's queue while it has room
+        stage = self.stages[i]
+        next_stage = self.stages[i + 1]
+        while stage.blocked and len(next_stage.queue) < next_stage.queue_size:
+            next_stage.queue.append(stage.blocked.popleft())
+            next_stage.items_in += 1
+        if not stage.blocked and stage.blocked_since is not None:
+            blocked = time.monotonic() - stage.blocked_since
+            stage.blocked_seconds += blocked
+            java_metrics.inc("java_pipeline_blocked_seconds_total", blocked, stage=stage.name)
+            stage.blocked_since = None
+
+    def run(self, items):
+        '''
+        Takes (key, item) pairs and yields (key, status, item) for every item
+        as it leaves the pipeline: with status "ok" after the last stage, or
+        with the status a stage stopped it with (and None). `items` is consumed
+        lazily, as room frees up in the first stage's queue.
+        '''
+        items = iter(items)
+        exhausted = False
+        self.start_time = time.monotonic()
+        last_status = self.start_time
+        executors = [concurrent.futures.ProcessPoolExecutor(max_workers=stage.workers) for stage in self.stages]
+        futures = {}
+
+        try:
+            while True:
+                first = self.stages[0]
+                while not exhausted and len(first.queue) < first.queue_size:
+                    entry = next(items, None)
+                    if entry is None:
+                        exhausted = True
+                    else:
+                        first.queue.append(entry)
+                        first.items_in += 1
+
+                # later stages first, so finished work drains before new work enters
+                for i in reversed(range(len(self.stages))):
+                    stage = self.stages[i]
+                    if i + 1 < len(self.stages):
+                        self._unblock(i)
+                    # a stage with output it cannot hand on takes no new work
+                    admitted = 0
+                    while stage.queue and not stage.blocked and len(stage.running) < stage.workers and stage._memory_allows(admitted):
+                        admitted += 1
+                        key, item = stage.queue.popleft()
+                        future = executors[i].submit(_run_stage, stage.fn, stage.name, key, item)
+                        stage.running[future] = key
+                        futures[future] = i
+
+                if exhausted and not futures and not any(stage.queue or stage.blocked for stage in self.stages):
+                    break
+
+                stats = self._publish()
+                if self.verbose and time.monotonic() - last_status >= STATUS_INTERVAL:
+                    last_status = time.monotonic()
+                    self._print_status(stats)
+
+                done, _ = concurrent.futures.wait(
+                    futures, timeout=POLL_INTERVAL, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    i = futures.pop(future)
+                    stage = self.stages[i]
+                    del stage.running[future]
+                    key, status, item, seconds = future.result()
+                    stage.items_out += 1
+                    stage.busy_seconds += seconds
+                    java_metrics.inc("java_pipeline_items_total", stage=stage.name, status=status)
+                    java_metrics.observe("java_pipeline_item_seconds", seconds, stage=stage.name)
+
+                    if status == "ok" and i + 1 < len(self.stages):
+                        if not stage.blocked:
+                            stage.blocked_since = time.monotonic()
+                        stage.blocked.append((key, item))
+                        self._unblock(i)
+                    else:
+                        yield key, status, item
+        finally:
+            for executor in executors:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+        stats = self._publish()
+        if self.verbose:
+            self._print_status(stats)
@@ -1,14 +1,31 @@
 import os
 import re
-import tempfile
+import csv
 import math
+import time
+import json
+import functools
+import signal
+import resource
+import subprocess
+import zipfile
+
+import java_cache
+import java_cds
+import java_classfile
+import java_daemon
+import java_metrics
+import java_normalize
+import java_syntax
+import java_workspace
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 JAVA_8 = "/usr/lib/jvm/java-1.8.0-openjdk-amd64/bin/java"
 JAVAC_8 = "/usr/lib/jvm/java-1.8.0-openjdk-amd64/bin/javac"
 JAVA_11 = "/usr/lib/jvm/java-11-openjdk-amd64/bin/java"
 JAVAC_11 = "/usr/lib/jvm/java-11-openjdk-amd64/bin/javac"
-GOOGLE_JAVA_FORMAT = f"{JAVA_11} -jar jars/google-java-format-1.15.0-all-deps.jar"
+GOOGLE_JAVA_FORMAT_JAR = os.path.join(BASE_DIR, "jars/google-java-format-1.15.0-all-deps.jar")
+JAVA_8_RT_JAR = "/usr/lib/jvm/java-1.8.0-openjdk-amd64/jre/lib/rt.jar"
 EVOSUITE_JAR_FILES = [
     os.path.join(BASE_DIR, "jars/evosuite-standalone-runtime-1.0.6.jar"),
     os.path.join(BASE_DIR, "jars/junit-4.12.jar"),
@@ -20,11 +37,156 @@ CFR_JAR = os.path.join(BASE_DIR, "jars/cfr-0.152.jar")
 JADX_PATH = os.path.join(BASE_DIR, "jars/jadx/build/jadx/bin/jadx")
 FERNFLOWER_JAR = os.path.join(BASE_DIR, "jars/fernflower.jar")
 KRAKATAU_PATH = os.path.join(BASE_DIR, "krakatau/decompile.py")
+KRAKATAU_DISASSEMBLE_PATH = os.path.join(BASE_DIR, "krakatau/disassemble.py")
+KRAKATAU_ASSEMBLE_PATH = os.path.join(BASE_DIR, "krakatau/assemble.py")
 
 # taken from: https://github.com/facebookresearch/CodeGen/blob/c62e719f7c8a16b4e7653188eff24282a11f4ca5/codegen_sources/test_generation/create_tests.py#L41
 MUTATION_SCORE_CUTOFF = 0.9
 MAX_JAVA_MEM = 4096
 CPUS_PER_TASK = 80
+# EvoSuite's search budget per class in seconds, when not derived from the class (USE_ADAPTIVE_SEARCH_BUDGET)
+EVOSUITE_SEARCH_BUDGET = 20
+# size the search budget by the class's methods, instructions and branches instead of EVOSUITE_SEARCH_BUDGET
+USE_ADAPTIVE_SEARCH_BUDGET = True
+# adaptive budget: a base plus seconds per method, per branch and per 100 instructions, clamped to [min, max]
+SEARCH_BUDGET_BASE = 2
+SEARCH_BUDGET_PER_METHOD = 0.5
+SEARCH_BUDGET_PER_BRANCH = 1.0
+SEARCH_BUDGET_PER_100_INSTRUCTIONS = 0.5
+MIN_SEARCH_BUDGET = 2
+MAX_SEARCH_BUDGET = 60
+# drop generated tests whose mutation score (from EvoSuite's statistics) is below MUTATION_SCORE_CUTOFF
+USE_MUTATION_SCORE_CUTOFF = True
+# classes generated for in one EvoSuite session by evosuite_gen_tests; a crash or timeout loses at most one batch
+EVOSUITE_BATCH_SIZE = 32
+# seconds an EvoSuite session may run in all; batches are cut so their classes' time limits fit
+EVOSUITE_BATCH_TIMEOUT = 3600
+# seconds per class on top of its search budget, for minimization and assertion generation
+EVOSUITE_CLASS_OVERHEAD = 180
+
+# compile through a long-lived javac (java/CompileServer.java) instead of forking one per call
+USE_COMPILE_SERVER = True
+# run evosuite tests in pooled long-lived JVMs (java/TestServer.java); runners start only when used concurrently
+USE_TEST_SERVER = True
+NUM_TEST_RUNNERS = os.cpu_count() or 1
+# threads running the test methods of one test class; 1 runs them serially like JUnitCore. EvoSuite
+# scaffolding resets static runtime state around every test, so parallel verdicts are only for screening
+TEST_THREADS = 1
+# reuse compile results for identical (class name, source, javac, flags)
+USE_COMPILE_CACHE = True
+JAVAC_FLAGS = ["-cp", "."]
+COMPILE_CACHE = java_cache.DiskCache("compile", max_bytes=2 * 1024 ** 3)
+# reuse test verdicts for identical (class bytes, test, scaffold) under the same JDK and EvoSuite runtime
+USE_VERDICT_CACHE = True
+VERDICT_CACHE = java_cache.DiskCache("verdict", max_bytes=1024 ** 3)
+# compile each sample's evosuite test once against the gold class, then only swap in candidate classes
+USE_PRECOMPILED_TESTS = True
+TEST_ARTIFACT_CACHE = java_cache.DiskCache("evosuite_tests", max_bytes=1024 ** 3)
+# format through a long-lived google-java-format (java/FormatServer.java), up to FORMAT_BATCH_SIZE sources per request
+USE_FORMAT_SERVER = True
+FORMAT_BATCH_SIZE = 256
+# reuse formatted sources for identical (google-java-format jar, source)
+USE_FORMAT_CACHE = True
+FORMAT_CACHE = java_cache.DiskCache("format", max_bytes=1024 ** 3)
+# decompile through a long-lived JVM (java/DecompilerHost.java) driving the decompilers' library APIs
+USE_DECOMPILER_HOST = True
+HOST_DECOMPILERS = ["procyon", "cfr", "fernflower"]
+DECOMPILER_HOST_JARS = [PYOCYON_JAR, CFR_JAR, FERNFLOWER_JAR]
+# disassemble in-process (java_classfile.py) instead of running krakatau/disassemble.py per class
+USE_PY_DISASSEMBLER = True
+# reject candidate sources (compile_str(..., precheck=True)) with tree-sitter syntax errors (java_syntax.py) before running javac
+USE_SYNTAX_PRECHECK = True
+# pass candidates that compile to the gold class (java_normalize.py) without running the tests
+USE_STRUCTURAL_MATCH = True
+# fail candidates whose members the tests reference are missing or changed, without running the tests
+USE_SIGNATURE_CHECK = True
+# google-java-format's AppCDS archive is trained on formatting this source
+FORMAT_TRAINING_SOURCE = b"import java.util.List;\nclass A { int f(List<String> xs) { return xs.size(); } }\n"
+# wall-clock limits in seconds; a call that runs over is killed and reports the "timeout" outcome
+COMPILE_TIMEOUT = 60
+TEST_TIMEOUT = 120
+RUN_TIMEOUT = 30
+EVOSUITE_GEN_TIMEOUT = 900
+DECOMPILE_TIMEOUT = 60
+FORMAT_TIMEOUT = 120
+# heap caps in MB for JVMs running candidate code; running out reports the "oom" outcome
+TEST_JAVA_MEM = 1024
+RUN_JAVA_MEM = 1024
+# heap caps in MB for the toolchain's own JVMs, forked or long-lived
+COMPILE_JAVA_MEM = 512
+FORMAT_JAVA_MEM = 512
+DECOMPILE_JAVA_MEM = 1024
+# address-space cap in MB for Krakatau's Python processes, which no -Xmx reaches
+KRAKATAU_MEM = 2048
+# a candidate that is not binary compatible with tests compiled against the gold class fails with one of these
+LINKAGE_ERRORS = [
+    "java.lang.NoSuchMethodError",
+    "java.lang.NoSuchFieldError",
+    "java.lang.AbstractMethodError",
+    "java.lang.IllegalAccessError",
+    "java.lang.InstantiationError",
+    "java.lang.IncompatibleClassChangeError",
+    "java.lang.NoClassDefFoundError",
+    "java.lang.VerifyError",
+    "java.lang.ClassFormatError",
+]
+
+def run_cmd(cmd, cwd=None, stderr=subprocess.STDOUT, timeout=None, max_mem_mb=None, env=None):
+    '''
+    Runs `cmd` (an argument list, no shell) in `cwd` and returns (exit code,
+    output). stderr is merged into the output unless redirected. A command
+    that cannot be started returns 127, as the shell would.
+
+    After `timeout` seconds the command and everything it started are killed
+    and the exit code is None. `max_mem_mb` caps the command's address space;
+    JVMs reserve far more address space than they use, so cap their heap with
+    -Xmx instead. `env` adds variables to the command's environment.
+    '''
+    if env is not None:
+        env = dict(os.environ, **env)
+    try:
+        proc = subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.PIPE, stderr=stderr, start_new_session=True, env=env)
+    except OSError as e:
+        return 127, str(e)
+
+    if max_mem_mb is not None:
+        limit = max_mem_mb * 1024 ** 2
+        try:
+            resource.prlimit(proc.pid, resource.RLIMIT_AS, (limit, limit))
+        except (OSError, ValueError):
+            pass
+
+    try:
+        stdout, _ = proc.communicate(timeout=timeout)
+        exit_code = proc.returncode
+    except subprocess.TimeoutExpired:
+        java_daemon.kill_process_group(proc)
+        stdout, _ = proc.communicate()
+        exit_code = None
+
+    return exit_code, stdout.decode("utf-8", errors="replace")
+
+def cmd_outcome(exit_code, output):
+    '''
+    Classifies a run_cmd result as "ok", "timeout", "oom" or "crash".
+    '''
+    if exit_code is None:
+        return "timeout"
+    if "java.lang.OutOfMemoryError" in output or exit_code == -signal.SIGKILL:
+        return "oom"
+    if exit_code != 0:
+        return "crash"
+    return "ok"
+
+def write_file(path, data):
+    '''
+    Writes a str or bytes to `path`, counting the bytes towards the current stage.
+    '''
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(data)
+    java_metrics.add_bytes_written(len(data), java_workspace.medium(path))
 
 def preprocess_str(java_str):
     '''
@@ -37,26 +199,114 @@ def preprocess_str(java_str):
     return java_str
 
 
+def _get_format_server():
+    def start():
+        helpers_dir = java_daemon.build_helpers(
+            JAVAC_11, ["DaemonIO.java", "FormatServer.java"], classpath=[GOOGLE_JAVA_FORMAT_JAR]
+        )
+        classpath = [java_cds.jar_directory(helpers_dir), GOOGLE_JAVA_FORMAT_JAR]
+        jvm_args = java_cds.launch_flags(JAVA_11, ["-cp", ":".join(classpath), "FormatServer"], short_lived=False)
+        return java_daemon.JavaDaemon(JAVA_11, "FormatServer", classpath, jvm_args=[f"-Xmx{FORMAT_JAVA_MEM}m"] + jvm_args)
+
+    return java_daemon.get_daemon("format_server", start)
+
+def google_java_format_cmd():
+    '''
+    The google-java-format command line, with its AppCDS archive where supported.
+    '''
+    launch = ["-jar", GOOGLE_JAVA_FORMAT_JAR]
+    flags = java_cds.launch_flags(JAVA_11, launch, training_args=["-"], training_input=FORMAT_TRAINING_SOURCE)
+    return [JAVA_11, f"-Xmx{FORMAT_JAVA_MEM}m"] + flags + launch
+
 def format_str(class_name, java_str):
     '''
     Formats a java string using google-java-format
     '''
-    with tempfile.TemporaryDirectory() as temp_dir:
-        java_file_path = os.path.join(temp_dir, class_name + ".java")
-        with open(java_file_path, "w") as f:
-            f.write(java_str)
-        
-        output_path = os.path.join(temp_dir, "class_name.java.out")
-        exit_code = os.system(f"{GOOGLE_JAVA_FORMAT} {java_file_path} > {output_path} 2> /dev/null")
-
-        if exit_code != 0:
-            return None
-
-        # read contents of class file to a string
-        with open(output_path, "r") as f:
-            formatted_str = f.read()
+    return format_strs([(class_name, java_str)])[0]
 
-        return formatted_str
+@java_metrics.timed("format")
+def format_strs(items):
+    '''
+    Formats (class_name, java_str) pairs using google-java-format and returns
+    the formatted strings in the same order, with None for each source that
+    does not format. All sources go to one JVM, and successful results are
+    cached on disk by content.
+    '''
+    results = [None] * len(items)
+    keys = [java_cache.make_key(GOOGLE_JAVA_FORMAT_JAR, java_str) for _, java_str in items]
+    pending = []
+    for i, key in enumerate(keys):
+        if USE_FORMAT_CACHE:
+            results[i] = FORMAT_CACHE.get(key)
+        if results[i] is None:
+            pending.append(i)
+
+    if not pending:
+        return results
+
+    formatted = _format_strs_uncached([items[i] for i in pending])
+    for i, formatted_str in zip(pending, formatted):
+        results[i] = formatted_str
+        if USE_FORMAT_CACHE and formatted_str is not None:
+            FORMAT_CACHE.put(keys[i], formatted_str)
+
+    return results
+
+def _format_strs_uncached(items):
+    '''
+    Formats with the format server when available, otherwise with one
+    google-java-format process over all files.
+    '''
+    if USE_FORMAT_SERVER:
+        try:
+            results = []
+            for start in range(0, len(items), FORMAT_BATCH_SIZE):
+                batch = [java_str for _, java_str in items[start:start + FORMAT_BATCH_SIZE]]
+                try:
+                    response = _get_format_server().request(batch, timeout=FORMAT_TIMEOUT)
+                except java_daemon.DaemonTimeout:
+                    results.extend([None] * len(batch))
+                    continue
+                for status, output in zip(response[0::2], response[1::2]):
+                    results.append(output.decode("utf-8") if status == b"ok" else None)
+            return results
+        except java_daemon.DaemonUnavailable:
+            pass
+
+    with java_workspace.workspace() as temp_dir:
+        java_file_paths = []
+        for i, (class_name, java_str) in enumerate(items):
+            # one directory per item, so sources with the same class name do not collide
+            os.mkdir(os.path.join(temp_dir, str(i)))
+            java_file_path = os.path.join(temp_dir, str(i), class_name + ".java")
+            write_file(java_file_path, java_str)
+            java_file_paths.append(java_file_path)
+
+        try:
+            result = subprocess.run(
+                google_java_format_cmd() + ["--replace"] + java_file_paths,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                timeout=FORMAT_TIMEOUT,
+            )
+        except (OSError, subprocess.TimeoutExpired):
+            return [None] * len(items)
+
+        # files that fail to format are left untouched and reported as "<path>:<line>:<col>: error: ..."
+        errors = result.stderr.decode(errors="replace")
+        failed = {path for path in java_file_paths if path + ":" in errors}
+        if result.returncode != 0 and not failed:
+            return [None] * len(items)
+
+        results = []
+        for java_file_path in java_file_paths:
+            if java_file_path in failed:
+                results.append(None)
+                continue
+            with open(java_file_path, "r") as f:
+                results.append(f.read())
+
+        return results
 
 
 def get_class_name(java_str):
@@ -91,26 +341,137 @@ def has_unresolved_imports(java_str):
     
     return False
 
-def compile_str(class_name, java_str):
+def _get_compile_server():
+    def start():
+        helpers_dir = java_daemon.build_helpers(JAVAC_8, ["DaemonIO.java", "CompileServer.java"])
+        return java_daemon.JavaDaemon(JAVA_8, "CompileServer", [helpers_dir], jvm_args=["-XX:+UseSerialGC", f"-Xmx{COMPILE_JAVA_MEM}m"])
+
+    return java_daemon.get_daemon("compile_server", start)
+
+def compile_str_server(class_name, java_str, timeout=None):
+    '''
+    Compiles a java file (string) in the compile server. Same return contract as
+    compile_str, plus structured "diagnostics" (kind, line, column, message) and
+    the javac "output" (warnings) on success.
+    Raises java_daemon.DaemonUnavailable if the server cannot be used.
+    '''
+    try:
+        response = _get_compile_server().request([class_name, java_str], timeout=timeout or COMPILE_TIMEOUT)
+    except java_daemon.DaemonTimeout:
+        return {"success": False, "outcome": "timeout", "error": f"error: javac timed out on {class_name}.java\n"}
+
+    status, output, diagnostics, *class_files = response
+    output = output.decode("utf-8")
+    diagnostics = json.loads(diagnostics)
+
+    if status != b"ok":
+        outcome = "oom" if "java.lang.OutOfMemoryError" in output else "compile_error"
+        return {"success": False, "outcome": outcome, "error": output, "diagnostics": diagnostics}
+
+    # javac without -d writes <class_name>.class next to the source, whatever the package
+    class_files = dict(zip(class_files[0::2], class_files[1::2]))
+    for binary_name, class_file in class_files.items():
+        if binary_name.decode("utf-8").split(".")[-1] == class_name:
+            return {"success": True, "outcome": "ok", "class_file": class_file, "output": output, "diagnostics": diagnostics}
+
+    return {
+        "success": False,
+        "outcome": "compile_error",
+        "error": f"error: no class {class_name} in {class_name}.java\n",
+        "diagnostics": diagnostics,
+    }
+
+def syntax_precheck(class_name, java_str):
+    '''
+    Returns a compile_error result if tree-sitter finds syntax errors in
+    `java_str`, otherwise None (also when the precheck is unavailable).
+    '''
+    start = time.time()
+    diagnostics = java_syntax.syntax_errors(java_str)
+    if not diagnostics:
+        java_metrics.inc("java_syntax_precheck_total", result="passed" if diagnostics is not None else "unavailable")
+        return None
+
+    java_metrics.inc("java_syntax_precheck_total", result="rejected")
+    return {
+        "success": False,
+        "outcome": "compile_error",
+        "error": java_syntax.format_diagnostics(class_name, java_str, diagnostics),
+        "diagnostics": diagnostics,
+        "elapsed": time.time() - start,
+    }
+
+@functools.lru_cache(maxsize=None)
+def javac_version():
+    '''
+    Returns the `javac -version` string (part of every compile cache key).
+    '''
+    try:
+        result = subprocess.run([JAVAC_8, "-version"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    except OSError:
+        return "unknown"
+    return result.stdout.decode(errors="replace").strip()
+
+@java_metrics.timed("compile")
+def compile_str(class_name, java_str, timeout=None, precheck=False):
     '''
     Compiles a java file (string) and returns the class name.
+    The result's "outcome" is one of "ok", "compile_error", "timeout", "oom" or
+    "crash", and "elapsed" is the wall-clock time in seconds.
+    Results are cached on disk by content, so identical sources only compile once;
+    timeouts, OOMs and crashes are not cached, as they say nothing about the source.
+    With `precheck`, for model outputs and other candidates, sources with
+    syntax errors are rejected without javac, with javac-style "error" text
+    and "diagnostics". Gold sources are always left to javac, so syntax the
+    tree-sitter grammar does not know cannot drop a valid sample.
+    '''
+    if precheck and USE_SYNTAX_PRECHECK:
+        result = syntax_precheck(class_name, java_str)
+        if result is not None:
+            return result
+
+    if not USE_COMPILE_CACHE:
+        return _compile_str_uncached(class_name, java_str, timeout)
+
+    key = java_cache.make_key(class_name, java_str, javac_version(), *JAVAC_FLAGS)
+    result = COMPILE_CACHE.get(key)
+    if result is None:
+        result = _compile_str_uncached(class_name, java_str, timeout)
+        if result["outcome"] in ("ok", "compile_error"):
+            COMPILE_CACHE.put(key, result)
+
+    return result
+
+def _compile_str_uncached(class_name, java_str, timeout=None):
     '''
-    with tempfile.TemporaryDirectory() as temp_dir:
+    Compiles with the compile server when available, otherwise forks javac.
+    '''
+    start = time.time()
+    if USE_COMPILE_SERVER:
+        try:
+            result = compile_str_server(class_name, java_str, timeout)
+            result["elapsed"] = time.time() - start
+            return result
+        except java_daemon.DaemonUnavailable:
+            pass
+
+    with java_workspace.workspace() as temp_dir:
         java_file_path = os.path.join(temp_dir, class_name + ".java")
-        with open(java_file_path, "w") as f:
-            f.write(java_str)
-        
-        # write output of compilation to a file in the temp directory
-        output_file_path = os.path.join(temp_dir, "output.txt")
+        write_file(java_file_path, java_str)
         
-        exit_code = os.system(f"{JAVAC_8} -cp . {java_file_path} > {output_file_path} 2>&1")
+        exit_code, output_str = run_cmd(
+            [JAVAC_8, f"-J-Xmx{COMPILE_JAVA_MEM}m"] + java_cds.javac_flags() + JAVAC_FLAGS + [java_file_path],
+            cwd=temp_dir,
+            timeout=timeout or COMPILE_TIMEOUT,
+        )
+        elapsed = time.time() - start
 
         if exit_code != 0:
-            # read contents of output file
-            with open(output_file_path, "r") as f:
-                output_str = f.read()
-
-            return {"success": False, "error": output_str}
+            # javac exits with 1 on compilation errors; anything else is the compiler failing
+            outcome = cmd_outcome(exit_code, output_str)
+            if outcome == "crash" and exit_code == 1:
+                outcome = "compile_error"
+            return {"success": False, "outcome": outcome, "error": output_str, "elapsed": elapsed}
 
         class_file_path = os.path.join(temp_dir, class_name + ".class")
 
@@ -118,47 +479,46 @@ def compile_str(class_name, java_str):
         with open(class_file_path, "rb") as f:
             class_str = f.read()
 
-        return {"success": True, "class_file": class_str}
+        return {"success": True, "outcome": "ok", "class_file": class_str, "output": output_str, "elapsed": elapsed}
 
 def get_java_compile_error(class_name, java_str):
     '''
-    Compiles a java file (string) and returns the class name.
+    Compiles a java file (string) and returns the javac output.
     '''
+    result = compile_str(class_name, java_str, precheck=True)
+    if not result["success"]:
+        return result["error"]
 
-    with tempfile.TemporaryDirectory() as temp_dir:
-        java_file_path = os.path.join(temp_dir, class_name + ".java")
-        with open(java_file_path, "w") as f:
-            f.write(java_str)
-        
-        output_path = os.path.join(temp_dir, "class_name.java.out")
-        exit_code = os.system(f"{JAVAC_8} -cp . {java_file_path} > {output_path} 2>&1")
-
-        java_output = ""
-        with open(output_path, "r") as f:
-            java_output = f.read()
-
-        return java_output
+    return result.get("output", "")
 
-def compile_jar(class_name):
-    cmd = f"jar cvf {class_name}.jar {class_name}.class > /dev/null 2>&1"
-    os.system(cmd)
+def compile_jar(class_name, cwd):
+    '''
+    Packs <cwd>/<class_name>.class into <cwd>/<class_name>.jar.
+    '''
+    run_cmd(["jar", f"-J-Xmx{COMPILE_JAVA_MEM}m", "cvf", f"{class_name}.jar", f"{class_name}.class"], cwd=cwd)
 
+@java_metrics.timed("disassemble")
 def disassemble_str(class_name, byte_code_str):
     '''
     Generates java asm given a byte_code_str.
     '''
-    with tempfile.TemporaryDirectory() as temp_dir:
+    if USE_PY_DISASSEMBLER:
+        try:
+            return java_classfile.disassemble(byte_code_str)
+        except java_classfile.ClassFormatError:
+            return None
+
+    with java_workspace.workspace() as temp_dir:
         class_file_path = os.path.join(temp_dir, class_name + ".class")
-        with open(class_file_path, "wb") as f:
-            f.write(byte_code_str)
+        write_file(class_file_path, byte_code_str)
 
-        cmd = f"python krakatau/disassemble.py -out {temp_dir} {class_file_path} > /dev/null 2>&1"
-        exit_code = os.system(cmd)
+        exit_code, _ = run_cmd(
+            ["python", KRAKATAU_DISASSEMBLE_PATH, "-out", temp_dir, class_file_path], cwd=BASE_DIR, max_mem_mb=KRAKATAU_MEM
+        )
 
         if exit_code != 0:
             return None
 
-
         # extract all files from the temp dir (recursively)
         files = []
         for root, dirs, filenames in os.walk(temp_dir):
@@ -173,20 +533,20 @@ def disassemble_str(class_name, byte_code_str):
 
                 return asm_str
 
+@java_metrics.timed("assemble")
 def assemble_str(class_name, asm_str, verbose=False):
     '''
     Generates byte code given an asm_str.
     '''
-    with tempfile.TemporaryDirectory() as temp_dir:
+    with java_workspace.workspace() as temp_dir:
         class_file_path = os.path.join(temp_dir, class_name + ".class")
-        with open(class_file_path, "w") as f:
-            f.write(asm_str)
+        write_file(class_file_path, asm_str)
 
+        exit_code, output = run_cmd(
+            ["python", KRAKATAU_ASSEMBLE_PATH, "-out", temp_dir, class_file_path], cwd=BASE_DIR, max_mem_mb=KRAKATAU_MEM
+        )
         if verbose:
-            cmd = f"python krakatau/assemble.py -out {temp_dir} {class_file_path}"
-        else:
-            cmd = f"python krakatau/assemble.py -out {temp_dir} {class_file_path} > /dev/null 2>&1"
-        exit_code = os.system(cmd)
+            print(output, end="")
 
         if exit_code != 0:
             return None
@@ -205,276 +565,872 @@ def assemble_str(class_name, asm_str, verbose=False):
 
                 return byte_code_str
 
+@java_metrics.timed("run")
+def run_class(class_name, byte_code_str, timeout=None):
+    '''
+    Runs a java class (string) with a RUN_JAVA_MEM heap and returns its
+    "outcome" ("ok", "timeout", "oom" or "crash"), stdout "output",
+    "exit_code" and wall-clock "elapsed" seconds.
+    '''
+    with java_workspace.workspace() as temp_dir:
+        class_file_path = os.path.join(temp_dir, class_name + ".class")
+        write_file(class_file_path, byte_code_str)
+
+        start = time.time()
+        cmd = [JAVA_8, f"-Xmx{RUN_JAVA_MEM}m", "-XX:+ExitOnOutOfMemoryError", "-cp", temp_dir, class_name]
+        exit_code, output = run_cmd(cmd, cwd=temp_dir, stderr=None, timeout=timeout or RUN_TIMEOUT)
+        elapsed = time.time() - start
+
+        # -XX:+ExitOnOutOfMemoryError exits with 3, and stderr is not captured to tell
+        outcome = "oom" if exit_code == 3 else cmd_outcome(exit_code, output)
+        return {"outcome": outcome, "output": output, "exit_code": exit_code, "elapsed": elapsed}
+
 def run_str(class_name, byte_code_str):
     '''
     Runs a java class (string) and returns the output.
     '''
-    with tempfile.TemporaryDirectory() as temp_dir:
-        class_file_path = os.path.join(temp_dir, class_name + ".class")
-        with open(class_file_path, "wb") as f:
-            f.write(byte_code_str)
+    return run_class(class_name, byte_code_str)["output"]
+  
+def _evosuite_gen_options(search_budget):
+    '''
+    EvoSuite generation options shared by single-class and batch runs.
+    '''
+    # adapted from: https://github.com/facebookresearch/CodeGen/blob/c62e719f7c8a16b4e7653188eff24282a11f4ca5/codegen_sources/test_generation/create_tests.py#L139
+    return [
+        "-criterion", "LINE:BRANCH:WEAKMUTATION:OUTPUT:METHOD:CBRANCH:STRONGMUTATION",
+        "-Dshow_progress=false",
+        "-Dassertion_strategy=MUTATION",
+        "-Dminimize=true",
+        f"-Dsearch_budget={search_budget}",
+        "-Ddouble_precision=0.0001",
+        "-Dmax_mutants_per_test", "200",
+        "-Danalysis_criteria=LINE,BRANCH,EXCEPTION,WEAKMUTATION,OUTPUT,METHOD,METHODNOEXCEPTION,CBRANCH,STRONGMUTATION",
+        "-Doutput_variables=TARGET_CLASS,Random_Seed,criterion,Size,Length,BranchCoverage,Lines,Coverage,Covered_Lines,LineCoverage,MethodCoverage,Size,Length,Total_Goals,Covered_Goals,MutationScore,OutputCoverage",
+        "-Dmax_int", str(int(math.sqrt(2 ** 31 - 1))),
+        f"-mem={MAX_JAVA_MEM}",
+        "-Dextra_timeout=180",
+    ]
+
+# Krakatau mnemonics of conditional branches and switches
+BRANCH_RE = re.compile(r"^L\d+:\s+(if\w*|tableswitch|lookupswitch)\b")
+INSTRUCTION_RE = re.compile(r"^L\d+:\s+\w")
+
+def class_complexity(jasm):
+    '''
+    Counts the methods, bytecode instructions and conditional branches of a
+    class in Krakatau assembly.
+    '''
+    complexity = {"methods": 0, "instructions": 0, "branches": 0}
+    for line in jasm.split("\n"):
+        if line.startswith(".method "):
+            complexity["methods"] += 1
+        elif INSTRUCTION_RE.match(line):
+            complexity["instructions"] += 1
+            if BRANCH_RE.match(line):
+                complexity["branches"] += 1
+    return complexity
+
+def evosuite_search_budget(byte_code_str):
+    '''
+    Returns the EvoSuite search budget in seconds for a class: a cost model
+    over its method, instruction and branch counts, so trivial classes do not
+    get the same budget as branch-heavy ones. Falls back to
+    EVOSUITE_SEARCH_BUDGET when turned off or the class cannot be parsed.
+    '''
+    if not USE_ADAPTIVE_SEARCH_BUDGET:
+        return EVOSUITE_SEARCH_BUDGET
+    try:
+        complexity = class_complexity(java_classfile.disassemble(byte_code_str))
+    except java_classfile.ClassFormatError:
+        return EVOSUITE_SEARCH_BUDGET
+
+    budget = (
+        SEARCH_BUDGET_BASE
+        + SEARCH_BUDGET_PER_METHOD * complexity["methods"]
+        + SEARCH_BUDGET_PER_BRANCH * complexity["branches"]
+        + SEARCH_BUDGET_PER_100_INSTRUCTIONS * complexity["instructions"] / 100
+    )
+    return int(min(MAX_SEARCH_BUDGET, max(MIN_SEARCH_BUDGET, math.ceil(budget))))
+
+def _read_evosuite_statistics(temp_dir):
+    '''
+    Parses evosuite-report/statistics.csv (the -Doutput_variables columns)
+    into {class name: {column: float or str}}, keeping each class's last row.
+    '''
+    statistics = {}
+    try:
+        with open(os.path.join(temp_dir, "evosuite-report", "statistics.csv"), "r", newline="") as f:
+            for row in csv.DictReader(f):
+                values = {}
+                for column, value in row.items():
+                    try:
+                        values[column] = float(value)
+                    except (TypeError, ValueError):
+                        values[column] = value
+                statistics[row.get("TARGET_CLASS")] = values
+    except OSError:
+        pass
+    return statistics
+
+def _passes_mutation_cutoff(statistics):
+    # classes without a reported mutation score are kept
+    if not USE_MUTATION_SCORE_CUTOFF or statistics is None:
+        return True
+    score = statistics.get("MutationScore")
+    if not isinstance(score, float) or score >= MUTATION_SCORE_CUTOFF:
+        return True
+    java_metrics.inc("java_evosuite_rejected_total", reason="mutation_score")
+    return False
 
-        output_path = os.path.join(temp_dir, "output.txt")
+def _read_evosuite_test(tests_dir, class_name):
+    '''
+    Returns the (test, scaffold) sources EvoSuite wrote for a class, or (None, None).
+    '''
+    test_file_path = os.path.join(tests_dir, f"{class_name}_ESTest.java")
+    scaffold_file_path = os.path.join(tests_dir, f"{class_name}_ESTest_scaffolding.java")
+    if not os.path.exists(test_file_path) or not os.path.exists(scaffold_file_path):
+        return None, None
 
-        os.system(f"{JAVA_8} -cp {temp_dir} {class_name} > {output_path}")
+    with open(test_file_path, "r") as f:
+        test_str = f.read()
 
-        # read contents of class file to a string
-        with open(output_path, "r") as f:
-            output = f.read()
+    with open(scaffold_file_path, "r") as f:
+        scaffold_str = f.read()
 
-        # clean up files
-        os.remove(class_file_path)
-        os.remove(output_path)
+    return test_str, scaffold_str
 
-        return output
-  
-def evosuite_gen_test(class_name, byte_code_str, search_budget=1):
+def evosuite_gen_test(class_name, byte_code_str, search_budget=None):
     '''
     Generates an evosuite test for a java class (string).
     '''
-    with tempfile.TemporaryDirectory() as temp_dir:
-        # get current working directory
-        home_dir = os.getcwd()
-
-        # change to temp directory
-        os.chdir(temp_dir)
-
-        class_file_path = f"{class_name}.class"
-        with open(class_file_path, "wb") as f:
-            f.write(byte_code_str)
-
-
-        # adapted from: https://github.com/facebookresearch/CodeGen/blob/c62e719f7c8a16b4e7653188eff24282a11f4ca5/codegen_sources/test_generation/create_tests.py#L139
-        cmd = (
-            f"{JAVA_8} -jar {EVOSUITE_JAR} -class {class_name} -projectCP . "
-            f'-criterion "LINE:BRANCH:WEAKMUTATION:OUTPUT:METHOD:CBRANCH:STRONGMUTATION" '
-            f"-Dshow_progress=false "
-            f"-Dassertion_strategy=MUTATION "
-            f"-Dminimize=true "
-            f"-Dsearch_budget=20 "
-            f"-Ddouble_precision=0.0001 "
-            f"-Dmax_mutants_per_test 200 "
-            f'-Danalysis_criteria="LINE,BRANCH,EXCEPTION,WEAKMUTATION,OUTPUT,METHOD,METHODNOEXCEPTION,CBRANCH,STRONGMUTATION" '
-            f"-Doutput_variables=TARGET_CLASS,Random_Seed,criterion,Size,Length,BranchCoverage,Lines,Coverage,Covered_Lines,LineCoverage,MethodCoverage,Size,Length,Total_Goals,Covered_Goals,MutationScore,OutputCoverage "
-            f"-Dmax_int {int(math.sqrt(2 ** 31 - 1))} "
-            f"-mem={MAX_JAVA_MEM} "
-            f"-Dextra_timeout=180 "
-            "> /dev/null 2>&1"
-        )
+    test_str, scaffold_str, _ = evosuite_gen_test_stats(class_name, byte_code_str, search_budget)
+    return test_str, scaffold_str
+
+@java_metrics.timed("evosuite_gen")
+def evosuite_gen_test_stats(class_name, byte_code_str, search_budget=None):
+    '''
+    Generates an evosuite test for a java class and returns (test, scaffold,
+    statistics), statistics being EvoSuite's output variables for the class
+    (coverage, MutationScore, ...) or None. `search_budget` defaults to
+    evosuite_search_budget(byte_code_str). Tests whose mutation score is below
+    MUTATION_SCORE_CUTOFF are dropped (test and scaffold are None).
+    '''
+    if search_budget is None:
+        search_budget = evosuite_search_budget(byte_code_str)
 
-        exit_code = os.system(cmd)
+    with java_workspace.workspace() as temp_dir:
+        class_file_path = os.path.join(temp_dir, f"{class_name}.class")
+        write_file(class_file_path, byte_code_str)
+
+        cmd = [JAVA_8, "-jar", EVOSUITE_JAR, "-class", class_name, "-projectCP", "."] + _evosuite_gen_options(search_budget)
+
+        exit_code, _ = run_cmd(cmd, cwd=temp_dir, timeout=EVOSUITE_GEN_TIMEOUT)
         if exit_code != 0:
-            os.chdir(home_dir)
-            return None, None
+            return None, None, None
+
+        statistics = _read_evosuite_statistics(temp_dir).get(class_name)
+        if not _passes_mutation_cutoff(statistics):
+            return None, None, statistics
 
         # read generated test files to a string
-        test_file_path = os.path.join("evosuite-tests", f"{class_name}_ESTest.java")
-        scaffold_file_path = os.path.join("evosuite-tests", f"{class_name}_ESTest_scaffolding.java")
+        test_str, scaffold_str = _read_evosuite_test(os.path.join(temp_dir, "evosuite-tests"), class_name)
+        return test_str, scaffold_str, statistics
 
-        # if test "evosuite-tests" directory does not exist, and return
-        if not os.path.exists("evosuite-tests"):
-            os.chdir(home_dir)
-            return None, None
+@java_metrics.timed("evosuite_gen_batch")
+def evosuite_gen_tests(classes, search_budget=None):
+    '''
+    Generates evosuite tests for many compiled classes, given as {sample id:
+    (class name, bytes)}, up to EVOSUITE_BATCH_SIZE classes per EvoSuite
+    session, with `search_budget` seconds of search per class. Without one,
+    classes are batched with others of similar evosuite_search_budget and
+    each session uses its largest. Classes sharing a name go to different
+    sessions, and a session only gets as many classes as fit in
+    EVOSUITE_BATCH_TIMEOUT. Returns {sample id: (test, scaffold)}, (None,
+    None) for the classes EvoSuite produced no test for or that miss
+    MUTATION_SCORE_CUTOFF.
+    '''
+    if search_budget is None:
+        budgets = {key: evosuite_search_budget(byte_code_str) for key, (_, byte_code_str) in classes.items()}
+    else:
+        budgets = {key: search_budget for key in classes}
+
+    batches = []
+    for key in sorted(classes, key=lambda key: budgets[key]):
+        class_name = classes[key][0]
+        for batch in batches:
+            batch_budget = max(budgets[key], max(budgets[other] for other in batch))
+            fits = (len(batch) + 1) * _evosuite_class_timeout(batch_budget) <= EVOSUITE_BATCH_TIMEOUT
+            # one session cannot hold two classes of the same name
+            if len(batch) < EVOSUITE_BATCH_SIZE and fits and all(classes[other][0] != class_name for other in batch):
+                batch.append(key)
+                break
+        else:
+            batches.append([key])
 
-        with open(test_file_path, "r") as f:
-            test_str = f.read()
+    results = {}
+    for batch in batches:
+        batch_budget = max(budgets[key] for key in batch)
+        tests = _evosuite_gen_batch({classes[key][0]: classes[key][1] for key in batch}, batch_budget)
+        results.update((key, tests[classes[key][0]]) for key in batch)
+    return results
 
-        with open(scaffold_file_path, "r") as f:
-            scaffold_str = f.read()
+def _evosuite_class_timeout(search_budget):
+    # the search plus minimization and assertion generation, within EVOSUITE_GEN_TIMEOUT
+    return min(EVOSUITE_GEN_TIMEOUT, search_budget + EVOSUITE_CLASS_OVERHEAD)
 
-        # change back to home directory
-        os.chdir(home_dir)
+def _evosuite_gen_batch(classes, search_budget):
+    '''
+    Runs one EvoSuite session over a directory holding all of `classes`
+    ({class name: bytes}, -target), which starts EvoSuite's master JVM and
+    scans the classpath once.
+    '''
+    with java_workspace.workspace() as temp_dir:
+        classes_dir = os.path.join(temp_dir, "classes")
+        os.mkdir(classes_dir)
+        for class_name, byte_code_str in classes.items():
+            write_file(os.path.join(classes_dir, f"{class_name}.class"), byte_code_str)
+
+        cmd = [JAVA_8, "-jar", EVOSUITE_JAR, "-target", classes_dir, "-projectCP", classes_dir] + _evosuite_gen_options(search_budget)
+
+        # classes are generated one after another, so the session gets each class's time limit
+        timeout = min(EVOSUITE_BATCH_TIMEOUT, _evosuite_class_timeout(search_budget) * len(classes))
+        exit_code, _ = run_cmd(cmd, cwd=temp_dir, timeout=timeout)
+
+        # a session that timed out or crashed still leaves the tests of the classes it finished
+        tests_dir = os.path.join(temp_dir, "evosuite-tests")
+        statistics = _read_evosuite_statistics(temp_dir)
+        results = {}
+        for class_name in classes:
+            if _passes_mutation_cutoff(statistics.get(class_name)):
+                results[class_name] = _read_evosuite_test(tests_dir, class_name)
+            else:
+                results[class_name] = (None, None)
+        generated = sum(test_str is not None for test_str, _ in results.values())
+        java_metrics.inc("java_evosuite_batch_classes_total", generated, result="generated")
+        java_metrics.inc("java_evosuite_batch_classes_total", len(classes) - generated, result="missing")
+        if exit_code != 0:
+            java_metrics.inc("java_evosuite_batch_failures_total", outcome=cmd_outcome(exit_code, ""))
+        return results
+
+def _get_test_runner_pool():
+    def start():
+        helpers_dir = java_daemon.build_helpers(
+            JAVAC_8,
+            ["DaemonIO.java", "TestRunner.java", "TestServer.java"],
+            classpath=EVOSUITE_JAR_FILES,
+        )
+        return java_daemon.DaemonPool(
+            lambda: java_daemon.JavaDaemon(
+                JAVA_8,
+                "TestServer",
+                [helpers_dir],
+                # TestServer writes each request's sources and classes under java.io.tmpdir
+                jvm_args=["-XX:+UseSerialGC", f"-Xmx{TEST_JAVA_MEM}m"] + java_workspace.java_tmpdir_flags(),
+                args=EVOSUITE_JAR_FILES,
+                max_requests=200,
+            ),
+            NUM_TEST_RUNNERS,
+        )
+
+    return java_daemon.get_daemon("test_runner_pool", start)
+
+def _verdict_from_report(class_name, report):
+    '''
+    Turns a java/TestRunner.java JSON report into the evosuite_compile_and_run_test verdict.
+    A fail-fast run that stopped early only knows a lower bound on the pass
+    rate: the tests that passed before the first failure, out of all tests.
+    '''
+    if report.get("stopped"):
+        pass_rate = (report["tests_run"] - report["failures"]) / report["tests_total"]
+    elif report["tests_run"] == 0:
+        pass_rate = 1.0
+    else:
+        pass_rate = 1 - (report["failures"] / report["tests_run"])
+
+    failures = "FAILED TESTS:"
+    failed_tests = [test for test in report["tests"] if test["status"] == "failed"]
+    for i, test in enumerate(failed_tests):
+        failures += f"{i + 1}) {test['name']}({class_name}_ESTest)\n"
+
+    oom = any(test["exception"] == "java.lang.OutOfMemoryError" for test in failed_tests)
+    verdict = {"pass_rate": pass_rate, "outcome": "oom" if oom else "ok", "error": failures, "tests": report["tests"]}
+    if report.get("stopped"):
+        verdict["stopped_early"] = True
+    return verdict
+
+def _test_mode_fields(fail_fast, threads, test_names=None):
+    # the mode, threads and methods fields of a TestServer request, also TestRunner's trailing arguments
+    return ["fail_fast" if fail_fast else "all", str(threads), ",".join(test_names or [])]
+
+def _failed_test_names(verdict):
+    if verdict is None or verdict.get("outcome") != "ok":
+        return []
+    return [test["name"] for test in verdict.get("tests", []) if test["status"] == "failed"]
+
+def _selective_verdict(verdict, previous_verdict):
+    '''
+    Merges a rerun of some test methods into the previous verdict's per-test
+    results. The pass rate assumes the tests that were not rerun still pass.
+    '''
+    if verdict["outcome"] != "ok" or "tests" not in verdict:
+        return dict(verdict, selective=True)
+
+    rerun = {test["name"]: test for test in verdict["tests"]}
+    tests = [rerun.pop(test["name"], test) for test in previous_verdict["tests"]] + list(rerun.values())
+    failed = sum(test["status"] == "failed" for test in tests)
+    return dict(verdict, pass_rate=1 - failed / len(tests), tests=tests, selective=True)
+
+def _timeout_verdict(class_name):
+    return {"pass_rate": 0.0, "outcome": "timeout", "error": f"FAILED TESTS:{class_name}_ESTest timed out\n", "tests": []}
+
+def evosuite_run_test_server(class_name, byte_code_str, test_str, scaffold_str, timeout=None, fail_fast=False, test_threads=None, test_names=None):
+    '''
+    Compiles and runs an evosuite test in a pooled test server. Same verdict as
+    evosuite_compile_and_run_test, plus per-test results under "tests".
+    Raises java_daemon.DaemonUnavailable if no test server can be used.
+    '''
+    fields = [class_name, byte_code_str, test_str, scaffold_str] + _test_mode_fields(fail_fast, test_threads or TEST_THREADS, test_names)
+    try:
+        status, output = _get_test_runner_pool().request(fields, timeout=timeout or TEST_TIMEOUT)
+    except java_daemon.DaemonTimeout:
+        return _timeout_verdict(class_name)
+    output = output.decode("utf-8")
+
+    if status == b"compile_error":
+        return {"pass_rate": 0.0, "outcome": "compile_error", "error": "FAILED TESTS:" + output, "tests": []}
+    if status != b"ok":
+        raise java_daemon.DaemonUnavailable(output)
+
+    return _verdict_from_report(class_name, json.loads(output))
+
+@functools.lru_cache(maxsize=None)
+def toolchain_fingerprint():
+    '''
+    Identifies the JDK and EvoSuite runtime jars by path, size and mtime. It is
+    part of every verdict cache key, so upgrading either invalidates old verdicts.
+    '''
+    parts = []
+    for path in [JAVA_8, JAVAC_8] + EVOSUITE_JAR_FILES:
+        path = os.path.realpath(path)
+        try:
+            stat = os.stat(path)
+            parts.append(f"{path}:{stat.st_size}:{stat.st_mtime_ns}")
+        except OSError:
+            parts.append(f"{path}:missing")
+
+    return java_cache.make_key(*parts)
+
+def verdict_cache_stats():
+    '''
+    Returns hit/miss counters of the verdict cache in this process.
+    '''
+    return VERDICT_CACHE.stats()
 
-        return test_str, scaffold_str
+def invalidate_verdict_cache():
+    '''
+    Drops every cached verdict, e.g. after swapping the JDK or EvoSuite jars in place
+    within a running process.
+    '''
+    toolchain_fingerprint.cache_clear()
+    VERDICT_CACHE.clear()
 
-def evosuite_compile_and_run_test(class_name, byte_code_str, test_str, scaffold_str, verbose=False):
+@java_metrics.timed("test_precompile")
+def precompile_evosuite_test(class_name, gold_byte_code, test_str, scaffold_str):
+    '''
+    Compiles an evosuite test and scaffold against the gold class and returns the
+    test class files as {file name: bytes}, or None if they do not compile.
+    Artifacts are cached on disk, so each sample's tests are compiled once.
+    '''
+    key = java_cache.make_key(toolchain_fingerprint(), class_name, gold_byte_code, test_str, scaffold_str)
+    test_classes = TEST_ARTIFACT_CACHE.get(key)
+    if test_classes is not None:
+        return test_classes or None
+
+    with java_workspace.workspace() as temp_dir:
+        write_file(os.path.join(temp_dir, f"{class_name}.class"), gold_byte_code)
+
+        test_file_path = os.path.join(temp_dir, f"{class_name}_ESTest.java")
+        scaffold_file_path = os.path.join(temp_dir, f"{class_name}_ESTest_scaffolding.java")
+        write_file(test_file_path, test_str)
+
+        write_file(scaffold_file_path, scaffold_str)
+
+        # only test classes end up in out/, the gold class stays on the classpath
+        out_dir = os.path.join(temp_dir, "out")
+        os.mkdir(out_dir)
+        classpath = ":".join([temp_dir] + EVOSUITE_JAR_FILES)
+        cmd = [JAVAC_8, f"-J-Xmx{COMPILE_JAVA_MEM}m"] + java_cds.javac_flags() + ["-nowarn", "-cp", classpath, "-d", out_dir, test_file_path, scaffold_file_path]
+        exit_code, _ = run_cmd(cmd, cwd=temp_dir)
+
+        # an empty dict records a compile failure in the cache
+        test_classes = {}
+        if exit_code == 0:
+            for filename in os.listdir(out_dir):
+                with open(os.path.join(out_dir, filename), "rb") as f:
+                    test_classes[filename] = f.read()
+
+    TEST_ARTIFACT_CACHE.put(key, test_classes)
+    return test_classes or None
+
+def _verdict_from_junit_output(total_output, exit_code=0):
+    '''
+    Computes the verdict from the lines JUnitCore prints and its exit code
+    (None if it was killed for running over its timeout).
+    '''
+    # failure are lines that start with number) such as 1), 2)
+    failures = "FAILED TESTS:"
+    for line in total_output:
+        if line[:1].isdigit():
+            failures += line
+
+    outcome = cmd_outcome(exit_code, "".join(total_output))
+    if outcome == "crash":
+        # JUnitCore exits with 1 when tests fail, which is still a normal run
+        outcome = "ok"
+
+    # JUnitCore ends with "OK (n tests)" or "Tests run: n,  Failures: m" and a blank line
+    summary = total_output[-2] if len(total_output) >= 2 else ""
+    if "OK" in summary:
+        pass_rate = 1.0
+    elif summary.startswith("Tests run:"):
+        runs, fails = summary.split(",")
+        runs = float(runs.split(": ")[1])
+        fails = float(fails.split(": ")[1])
+        pass_rate = 1 - (fails / runs)
+    else:
+        # no summary: the JVM died (or was killed) before JUnit finished
+        pass_rate = 0.0
+        if outcome == "ok":
+            outcome = "crash"
+
+    return {"pass_rate": pass_rate, "outcome": outcome, "error": failures}
+
+def _run_junit(class_name, temp_dir, timeout=None, fail_fast=False, threads=1, test_names=None):
+    '''
+    Runs <class_name>_ESTest from `temp_dir` in a fresh JVM. The JSON runner
+    (java/TestRunner.java) reports every test method; if it cannot be built the
+    JUnitCore summary is parsed instead, which always runs every test serially
+    and reports no per-test results.
+    Returns the verdict and the raw output.
+    '''
+    classpath = [temp_dir] + EVOSUITE_JAR_FILES
+    try:
+        helpers_dir = java_daemon.build_helpers(
+            JAVAC_8, ["DaemonIO.java", "TestRunner.java"], classpath=EVOSUITE_JAR_FILES
+        )
+    except java_daemon.DaemonUnavailable:
+        cmd = [JAVA_8, f"-Xmx{TEST_JAVA_MEM}m"] + java_cds.short_lived_flags()
+        cmd += ["-cp", ":".join(classpath), "org.junit.runner.JUnitCore", f"{class_name}_ESTest"]
+        exit_code, output = run_cmd(cmd, cwd=temp_dir, timeout=timeout or TEST_TIMEOUT)
+        return _verdict_from_junit_output(output.splitlines(keepends=True), exit_code), output
+
+    report_path = os.path.join(temp_dir, "report.json")
+    cmd = [JAVA_8, f"-Xmx{TEST_JAVA_MEM}m"] + java_cds.short_lived_flags() + ["-cp", ":".join(classpath + [helpers_dir])]
+    cmd += ["TestRunner", f"{class_name}_ESTest", report_path] + _test_mode_fields(fail_fast, threads, test_names)
+    exit_code, output = run_cmd(cmd, cwd=temp_dir, timeout=timeout or TEST_TIMEOUT)
+
+    try:
+        with open(report_path, "r") as f:
+            report = json.load(f)
+    except (OSError, ValueError):
+        # no report: the JVM died (or was killed) before the tests finished
+        outcome = cmd_outcome(exit_code, output)
+        return {"pass_rate": 0.0, "outcome": "crash" if outcome == "ok" else outcome, "error": "FAILED TESTS:", "tests": []}, output
+
+    return _verdict_from_report(class_name, report), output
+
+def _run_precompiled_test(class_name, byte_code_str, test_str, scaffold_str, test_classes, timeout=None, fail_fast=False, threads=1, test_names=None):
+    '''
+    Runs precompiled evosuite test classes against a candidate class. Returns the
+    verdict and whether any failure was a linkage error (the candidate broke
+    binary compatibility with the compiled tests).
+    '''
+    if USE_TEST_SERVER:
+        fields = [class_name, byte_code_str, test_str, scaffold_str] + _test_mode_fields(fail_fast, threads, test_names)
+        for filename, test_class in test_classes.items():
+            fields += [filename, test_class]
+
+        try:
+            status, output = _get_test_runner_pool().request(fields, timeout=timeout or TEST_TIMEOUT)
+            if status == b"ok":
+                verdict = _verdict_from_report(class_name, json.loads(output))
+                linkage_failure = any(test["exception"] in LINKAGE_ERRORS for test in verdict["tests"])
+                return verdict, linkage_failure
+        except java_daemon.DaemonTimeout:
+            return _timeout_verdict(class_name), False
+        except java_daemon.DaemonUnavailable:
+            pass
+
+    with java_workspace.workspace() as temp_dir:
+        write_file(os.path.join(temp_dir, f"{class_name}.class"), byte_code_str)
+
+        for filename, test_class in test_classes.items():
+            write_file(os.path.join(temp_dir, filename), test_class)
+
+        verdict, output = _run_junit(class_name, temp_dir, timeout, fail_fast, threads, test_names)
+
+    if "tests" in verdict:
+        linkage_failure = any(test["exception"] in LINKAGE_ERRORS for test in verdict["tests"])
+    else:
+        linkage_failure = any(error in output for error in LINKAGE_ERRORS)
+    return verdict, linkage_failure
+
+@java_metrics.timed("test")
+def evosuite_compile_and_run_test(class_name, byte_code_str, test_str, scaffold_str, verbose=False, gold_byte_code=None, timeout=None, gold_jasm=None, fail_fast=False, test_threads=None, previous_verdict=None):
     '''
     Compiles and runs an evosuite test for a java class (string).
+    The verdict's "outcome" is one of "ok", "compile_error", "timeout", "oom" or
+    "crash", and "elapsed" is the wall-clock time in seconds; only "ok" verdicts
+    have a meaningful pass_rate, the others score 0.0. "tests" lists every test
+    method with its status, duration, exception class and message.
+    Verdicts are cached on disk by (class bytes, test, scaffold, gold class and
+    the checks using it), so retesting an identical candidate returns
+    immediately; timeouts, OOMs and crashes are not cached.
+    With `gold_byte_code` the tests are compiled once against the gold class and
+    reused across candidates. With `gold_byte_code` or `gold_jasm` (the gold
+    class as Krakatau assembly), a candidate that is structurally the gold
+    class passes without running the tests, which the gold class is assumed
+    to pass; its verdict has "structural_match" set. A candidate lacking a
+    member the tests reference, with no overload or java.lang.Object method
+    to stand in for it (or declaring it private or with other staticness),
+    fails as a "compile_error" without running them; its verdict has the
+    member diff under "signature_diff" (see signature_check).
+    With `fail_fast` the run stops at the first failing test; its verdict has
+    "stopped_early" set and a pass_rate that is only a lower bound, so use it
+    where only "did everything pass" matters. `test_threads` (default
+    TEST_THREADS) runs the test methods on that many threads in one JVM; as
+    EvoSuite's scaffolding resets the shared runtime (sandbox, system
+    properties, thread stopper) around every test, such runs can interfere
+    with each other, so their verdicts have "parallel" set and are not exact
+    scores.
+    With `previous_verdict` (the verdict of an earlier attempt at the same
+    class), the tests that failed then run first, and the full suite runs only
+    once they all pass. While some still fail, the verdict has "selective" set,
+    "tests" merges the rerun into the previous results and pass_rate assumes
+    the tests that were not rerun still pass.
     '''
-    with tempfile.TemporaryDirectory() as temp_dir:
-        # get current working directory
-        home_dir = os.getcwd()
+    threads = test_threads or TEST_THREADS
+    failed_tests = _failed_test_names(previous_verdict)
+    if failed_tests:
+        verdict = _evosuite_compile_and_run_test_cached(
+            class_name, byte_code_str, test_str, scaffold_str, verbose, gold_byte_code, timeout, gold_jasm, fail_fast, threads, failed_tests
+        )
+        still_failing = verdict["outcome"] != "ok" or verdict["pass_rate"] < 1.0
+        java_metrics.inc("java_selective_test_runs_total", result="still_failing" if still_failing else "confirmed")
+        if still_failing:
+            return _selective_verdict(verdict, previous_verdict)
+
+    return _evosuite_compile_and_run_test_cached(
+        class_name, byte_code_str, test_str, scaffold_str, verbose, gold_byte_code, timeout, gold_jasm, fail_fast, threads
+    )
+
+def _evosuite_compile_and_run_test_cached(class_name, byte_code_str, test_str, scaffold_str, verbose=False, gold_byte_code=None, timeout=None, gold_jasm=None, fail_fast=False, threads=1, test_names=None):
+    if not USE_VERDICT_CACHE:
+        return _evosuite_compile_and_run_test_uncached(
+            class_name, byte_code_str, test_str, scaffold_str, verbose, gold_byte_code, timeout, gold_jasm, fail_fast, threads, test_names
+        )
 
-        # change to temp directory
-        os.chdir(temp_dir)
+    key_parts = [toolchain_fingerprint(), class_name, byte_code_str, test_str, scaffold_str]
+    key_parts += _gold_mode_fields(gold_byte_code, gold_jasm)
+    if fail_fast or threads != 1 or test_names:
+        key_parts += _test_mode_fields(fail_fast, threads, test_names)
+    key = java_cache.make_key(*key_parts)
+    result = VERDICT_CACHE.get(key)
+    if result is None:
+        result = _evosuite_compile_and_run_test_uncached(
+            class_name, byte_code_str, test_str, scaffold_str, verbose, gold_byte_code, timeout, gold_jasm, fail_fast, threads, test_names
+        )
+        # timeouts, OOMs and crashes say nothing about the candidate
+        if result["outcome"] in ("ok", "compile_error"):
+            VERDICT_CACHE.put(key, result)
+
+    return result
+
+def _gold_mode_fields(gold_byte_code=None, gold_jasm=None):
+    # a verdict also depends on the gold class and on which checks used it: a structural
+    # match or signature mismatch short-circuits, and precompiled tests may link differently
+    modes = []
+    if gold_byte_code is not None or gold_jasm is not None:
+        modes += ["structural"] if USE_STRUCTURAL_MATCH else []
+        modes += ["signature"] if USE_SIGNATURE_CHECK else []
+    if gold_byte_code is not None and USE_PRECOMPILED_TESTS:
+        modes.append("precompiled")
+    if not modes:
+        return ["no_gold"]
+    gold = gold_byte_code if gold_byte_code is not None else gold_jasm
+    return [java_cache.make_key(gold), ",".join(modes)]
+
+def _evosuite_compile_and_run_test_uncached(class_name, byte_code_str, test_str, scaffold_str, verbose=False, gold_byte_code=None, timeout=None, gold_jasm=None, fail_fast=False, threads=1, test_names=None):
+    '''
+    Runs the test and records the wall-clock time in the verdict.
+    '''
+    start = time.time()
+    if USE_STRUCTURAL_MATCH and java_normalize.structurally_equal(byte_code_str, gold_byte_code, gold_jasm):
+        java_metrics.inc("java_test_runs_saved_total", reason="structural_match")
+        verdict = {"pass_rate": 1.0, "outcome": "ok", "error": "FAILED TESTS:", "tests": [], "structural_match": True}
+    else:
+        verdict = _signature_verdict(class_name, byte_code_str, test_str, gold_byte_code, gold_jasm)
+        if verdict is None:
+            verdict = _evosuite_run_test(class_name, byte_code_str, test_str, scaffold_str, gold_byte_code, timeout, fail_fast, threads, test_names)
+            if threads > 1:
+                verdict["parallel"] = True
+    verdict["elapsed"] = time.time() - start
+    return verdict
+
+def signature_check(byte_code_str, gold_byte_code=None, gold_jasm=None):
+    '''
+    Diffs the fields and methods of a compiled candidate against the gold class
+    (class bytes or Krakatau assembly). Returns {"missing", "extra",
+    "mismatched", "feedback"}, "feedback" being the diff as text (empty if the
+    signatures agree), or None if either class cannot be read.
+    '''
+    diff = java_normalize.class_signature_diff(byte_code_str, gold_byte_code, gold_jasm)
+    if diff is not None:
+        diff["feedback"] = java_normalize.format_signature_diff(diff)
+    return diff
+
+def _signature_verdict(class_name, byte_code_str, test_str, gold_byte_code=None, gold_jasm=None):
+    '''
+    Returns a failing verdict if the tests cannot link against the candidate, else None.
+    '''
+    if not USE_SIGNATURE_CHECK or (gold_byte_code is None and gold_jasm is None):
+        return None
+
+    diff = signature_check(byte_code_str, gold_byte_code, gold_jasm)
+    if diff is None or not java_normalize.breaks_linkage(diff, class_name, test_str):
+        return None
+
+    java_metrics.inc("java_test_runs_saved_total", reason="signature_mismatch")
+    return {
+        "pass_rate": 0.0,
+        "outcome": "compile_error",
+        "error": "FAILED TESTS:" + diff["feedback"],
+        "tests": [],
+        "signature_diff": diff,
+    }
 
+def saved_test_runs():
+    '''
+    Returns how many test runs this process skipped, by reason: the candidate
+    structurally matched the gold class, or could not link against the tests.
+    '''
+    return {
+        reason: java_metrics.counter_value("java_test_runs_saved_total", reason=reason)
+        for reason in ("structural_match", "signature_mismatch")
+    }
+
+def _evosuite_run_test(class_name, byte_code_str, test_str, scaffold_str, gold_byte_code=None, timeout=None, fail_fast=False, threads=1, test_names=None):
+    '''
+    Runs precompiled tests when the gold class is known. Otherwise (or when the
+    candidate is not binary compatible with them) compiles the tests against the
+    candidate, in a pooled test server when available, else by forking javac and JUnitCore.
+    '''
+    if USE_PRECOMPILED_TESTS and gold_byte_code is not None:
+        test_classes = precompile_evosuite_test(class_name, gold_byte_code, test_str, scaffold_str)
+        if test_classes is not None:
+            verdict, linkage_failure = _run_precompiled_test(
+                class_name, byte_code_str, test_str, scaffold_str, test_classes, timeout, fail_fast, threads, test_names
+            )
+            if not linkage_failure:
+                return verdict
+
+    if USE_TEST_SERVER:
+        try:
+            return evosuite_run_test_server(class_name, byte_code_str, test_str, scaffold_str, timeout, fail_fast, threads, test_names)
+        except java_daemon.DaemonUnavailable:
+            pass
+
+    with java_workspace.workspace() as temp_dir:
         # write bytecode, test, and scaffold files
-        class_file_path = f"{class_name}.class"
-        test_file_path = f"{class_name}_ESTest.java"
-        scaffold_file_path = f"{class_name}_ESTest_scaffolding.java"
-        with open(class_file_path, "wb") as f:
-            f.write(byte_code_str)
+        class_file_path = os.path.join(temp_dir, f"{class_name}.class")
+        test_file_path = os.path.join(temp_dir, f"{class_name}_ESTest.java")
+        scaffold_file_path = os.path.join(temp_dir, f"{class_name}_ESTest_scaffolding.java")
+        write_file(class_file_path, byte_code_str)
 
-        with open(test_file_path, "w") as f:
-            f.write(test_str)
+        write_file(test_file_path, test_str)
 
-        with open(scaffold_file_path, "w") as f:
-            f.write(scaffold_str)
+        write_file(scaffold_file_path, scaffold_str)
 
         # compile test and scaffold files
-        CLASSPATH = "CLASSPATH=.:" +  ":".join(EVOSUITE_JAR_FILES)
-        cmd = f"{CLASSPATH} {JAVAC_8} *.java > /dev/null 2>&1"
-        os.system(cmd)
+        classpath = ":".join([temp_dir] + EVOSUITE_JAR_FILES)
+        cmd = [JAVAC_8, f"-J-Xmx{COMPILE_JAVA_MEM}m"] + java_cds.javac_flags() + ["-nowarn", "-cp", classpath, test_file_path, scaffold_file_path]
+        exit_code, output = run_cmd(cmd, cwd=temp_dir, timeout=COMPILE_TIMEOUT)
+        if exit_code != 0:
+            outcome = "compile_error" if exit_code == 1 else cmd_outcome(exit_code, output)
+            return {"pass_rate": 0.0, "outcome": outcome, "error": "FAILED TESTS:" + output, "tests": []}
 
         # run the test
-        cmd = f"{CLASSPATH} {JAVA_8} org.junit.runner.JUnitCore {class_name}_ESTest > output.txt 2>&1"
-        os.system(cmd)
-
-        # open test output and get last line
-        with open(os.path.join(temp_dir, "output.txt"), "r") as f:
-            total_output = f.readlines()
-            output = total_output[-2]
-            # failure are lines that start with number) such as 1), 2)
-            failures = "FAILED TESTS:"
-            for line in total_output:
-                if line[0].isdigit():
-                    failures += line
-
-        # compute pass_rate
-        if "OK" in output:
-            pass_rate = 1.0
-        else:
-            runs, fails = output.split(",")
-            runs = float(runs.split(": ")[1])
-            fails = float(fails.split(": ")[1])
-            pass_rate = 1 - (fails / runs)
-        
-        # change back to home directory
-        os.chdir(home_dir)
+        verdict, _ = _run_junit(class_name, temp_dir, timeout, fail_fast, threads, test_names)
+        return verdict
+
+def _get_decompiler_host():
+    def start():
+        helpers_dir = java_daemon.build_helpers(
+            JAVAC_11, ["DaemonIO.java", "DecompilerHost.java"], classpath=DECOMPILER_HOST_JARS
+        )
+        classpath = [java_cds.jar_directory(helpers_dir)] + DECOMPILER_HOST_JARS
+        jvm_args = java_cds.launch_flags(JAVA_11, ["-cp", ":".join(classpath), "DecompilerHost"], short_lived=False)
+        jvm_args = [f"-Xmx{DECOMPILE_JAVA_MEM}m"] + jvm_args
+        return java_daemon.JavaDaemon(JAVA_11, "DecompilerHost", classpath, jvm_args=jvm_args, max_requests=500)
 
-        return {"pass_rate": pass_rate, "error": failures}
+    return java_daemon.get_daemon("decompiler_host", start)
+
+def decompile_host(decompiler, class_name, byte_code_str):
+    '''
+    Decompiles in the decompiler host ("procyon", "cfr" or "fernflower") and
+    returns (java_str or None, seconds spent in the decompiler).
+    Raises java_daemon.DaemonUnavailable if the host cannot be used.
+    '''
+    request = [decompiler, class_name, byte_code_str]
+    status, output, elapsed_ns = _get_decompiler_host().request(request, timeout=DECOMPILE_TIMEOUT)
+    java_str = output.decode("utf-8") if status == b"ok" else None
+    return java_str, int(elapsed_ns) / 1e9
+
+def decompile_timed(decompiler, class_name, byte_code_str):
+    '''
+    Decompiles with one of DECOMPILERS and returns (java_str or None, seconds).
+    Decompilers in the host are timed inside it, so the time excludes JVM
+    startup; the others are timed around their command.
+    '''
+    timed = java_metrics.timed(f"decompile_{decompiler}")(_decompile_timed)
+    return timed(decompiler, class_name, byte_code_str)
+
+def _decompile_timed(decompiler, class_name, byte_code_str):
+    if USE_DECOMPILER_HOST and decompiler in HOST_DECOMPILERS:
+        start_t = time.time()
+        try:
+            return decompile_host(decompiler, class_name, byte_code_str)
+        except java_daemon.DaemonTimeout:
+            return None, time.time() - start_t
+        except java_daemon.DaemonUnavailable:
+            pass
+
+    start_t = time.time()
+    java_str = DECOMPILERS[decompiler](class_name, byte_code_str)
+    return java_str, time.time() - start_t
 
 def procyon_decompiler(class_name, byte_code_str):
     '''
     Generates decompiled file by procyon.
     '''
+    return decompile_timed("procyon", class_name, byte_code_str)[0]
 
-    with tempfile.TemporaryDirectory() as temp_dir:
-        home_dir = os.getcwd()
-        # change to temp directory
-        os.chdir(temp_dir)
-
+def _procyon_decompiler_cli(class_name, byte_code_str):
+    '''
+    Generates decompiled file by running the procyon command line in a fresh JVM.
+    '''
+    with java_workspace.workspace() as temp_dir:
         class_file_path = os.path.join(temp_dir, class_name + ".class")
-        with open(class_file_path, "wb") as f:
-            f.write(byte_code_str)
+        write_file(class_file_path, byte_code_str)
 
-        cmd = f"{JAVA_8} -jar {PYOCYON_JAR} {class_name} > output.txt 2>&1"
-        exit_code = os.system(cmd)
+        launch = ["-jar", PYOCYON_JAR]
+        cmd = [JAVA_8, f"-Xmx{DECOMPILE_JAVA_MEM}m"] + java_cds.launch_flags(JAVA_8, launch) + launch + [class_name]
+        exit_code, java_str = run_cmd(cmd, cwd=temp_dir, timeout=DECOMPILE_TIMEOUT)
 
         if exit_code != 0:
-            os.chdir(home_dir)
             return None
 
-        with open(os.path.join(temp_dir, "output.txt"), "r") as f:
-            java_str = f.read()
-            os.chdir(home_dir)
-            return java_str
+        return java_str
 
 def CFR_decompiler(class_name, byte_code_str):
     '''
     Generates decompiled file by CFR.
     '''
+    return decompile_timed("cfr", class_name, byte_code_str)[0]
 
-    with tempfile.TemporaryDirectory() as temp_dir:
-        home_dir = os.getcwd()
-        # change to temp directory
-        os.chdir(temp_dir)
-
+def _CFR_decompiler_cli(class_name, byte_code_str):
+    '''
+    Generates decompiled file by running the CFR command line in a fresh JVM.
+    '''
+    with java_workspace.workspace() as temp_dir:
         class_file_path = os.path.join(temp_dir, class_name + ".class")
-        with open(class_file_path, "wb") as f:
-            f.write(byte_code_str)
+        write_file(class_file_path, byte_code_str)
 
-        cmd = f"{JAVA_8} -jar {CFR_JAR} {class_name} > output.txt 2>&1"
-        exit_code = os.system(cmd)
+        launch = ["-jar", CFR_JAR]
+        cmd = [JAVA_8, f"-Xmx{DECOMPILE_JAVA_MEM}m"] + java_cds.launch_flags(JAVA_8, launch) + launch + [class_name]
+        exit_code, java_str = run_cmd(cmd, cwd=temp_dir, timeout=DECOMPILE_TIMEOUT)
 
         if exit_code != 0:
-            os.chdir(home_dir)
             return None
 
-        with open(os.path.join(temp_dir, "output.txt"), "r") as f:
-            java_str = f.read()
-            os.chdir(home_dir)
-            return java_str
+        return java_str
 
 def JADX_decompiler(class_name, byte_code_str):
     '''
-    Generates decompiled file by CFR.
+    Generates decompiled file by JADX.
     '''
-
-    with tempfile.TemporaryDirectory() as temp_dir:
-        home_dir = os.getcwd()
-        # change to temp directory
-        os.chdir(temp_dir)
-
+    with java_workspace.workspace() as temp_dir:
         class_file_path = os.path.join(temp_dir, class_name + ".class")
-        with open(class_file_path, "wb") as f:
-            f.write(byte_code_str)
-
-        cmd = f"{JADX_PATH} -d out {class_name}.class > /dev/null 2>&1"
-        exit_code = os.system(cmd)
+        write_file(class_file_path, byte_code_str)
+
+        out_dir = os.path.join(temp_dir, "out")
+        # the jadx launcher script passes JAVA_OPTS to its JVM
+        exit_code, _ = run_cmd(
+            [JADX_PATH, "-d", out_dir, class_file_path],
+            cwd=temp_dir,
+            timeout=DECOMPILE_TIMEOUT,
+            env={"JAVA_OPTS": f"-Xmx{DECOMPILE_JAVA_MEM}m"},
+        )
 
         if exit_code != 0:
-            os.chdir(home_dir)
             return None
 
-        with open(os.path.join(temp_dir, f"out/sources/defpackage/{class_name}.java"), "r") as f:
-            java_str = f.read()
-            os.chdir(home_dir)
-            return java_str
+        with open(os.path.join(out_dir, f"sources/defpackage/{class_name}.java"), "r") as f:
+            return f.read()
 
 def fernflower_decompiler(class_name, byte_code_str):
     '''
     Generates decompiled file by fernflower.
     '''
+    return decompile_timed("fernflower", class_name, byte_code_str)[0]
 
-    with tempfile.TemporaryDirectory() as temp_dir:
-        home_dir = os.getcwd()
-        # change to temp directory
-        os.chdir(temp_dir)
-
+def _fernflower_decompiler_cli(class_name, byte_code_str):
+    '''
+    Generates decompiled file by running the fernflower command line in a fresh JVM.
+    '''
+    with java_workspace.workspace() as temp_dir:
         class_file_path = os.path.join(temp_dir, class_name + ".class")
-        with open(class_file_path, "wb") as f:
-            f.write(byte_code_str)
-        compile_jar(class_name)
-        os.mkdir('out')
-        cmd = f"{JAVA_11} -jar {FERNFLOWER_JAR} {class_name}.jar out/ > /dev/null 2>&1"
-        exit_code = os.system(cmd)
+        write_file(class_file_path, byte_code_str)
+        compile_jar(class_name, temp_dir)
+        out_dir = os.path.join(temp_dir, "out")
+        os.mkdir(out_dir)
+        launch = ["-jar", FERNFLOWER_JAR]
+        cmd = [JAVA_11, f"-Xmx{DECOMPILE_JAVA_MEM}m"] + java_cds.launch_flags(JAVA_11, launch) + launch + [f"{class_name}.jar", out_dir]
+        exit_code, _ = run_cmd(cmd, cwd=temp_dir, timeout=DECOMPILE_TIMEOUT)
 
         if exit_code != 0:
-            os.chdir(home_dir)
             return None
-        os.chdir("out/")
-        os.system(f"unzip {class_name}.jar > /dev/null 2>&1")
-        with open(os.path.join(temp_dir, f"out/{class_name}.java"), "r") as f:
-            java_str = f.read()
-            os.chdir(home_dir)
-            return java_str
+
+        # fernflower writes the sources into a jar of the same name
+        with zipfile.ZipFile(os.path.join(out_dir, f"{class_name}.jar")) as jar:
+            return jar.read(f"{class_name}.java").decode("utf-8")
 
 def krakatau_decompiler(class_name, byte_code_str):
     '''
     Generates decompiled file by krakatau.
     '''
-
-    with tempfile.TemporaryDirectory() as temp_dir:
-        home_dir = os.getcwd()
-        # change to temp directory
-        os.chdir(temp_dir)
-
+    with java_workspace.workspace() as temp_dir:
         class_file_path = os.path.join(temp_dir, class_name + ".class")
-        with open(class_file_path, "wb") as f:
-            f.write(byte_code_str)
-        compile_jar(class_name)
-        os.mkdir('out')
-        cmd = f"python2 {KRAKATAU_PATH} -out out -nauto -path /usr/lib/jvm/java-1.8.0-openjdk-amd64/jre/lib/rt.jar {class_name}.jar > /dev/null 2>&1"
-        exit_code = os.system(cmd)
+        write_file(class_file_path, byte_code_str)
+        compile_jar(class_name, temp_dir)
+        out_dir = os.path.join(temp_dir, "out")
+        os.mkdir(out_dir)
+        cmd = ["python2", KRAKATAU_PATH, "-out", out_dir, "-nauto", "-path", JAVA_8_RT_JAR, f"{class_name}.jar"]
+        exit_code, _ = run_cmd(cmd, cwd=temp_dir, timeout=DECOMPILE_TIMEOUT, max_mem_mb=KRAKATAU_MEM)
 
         if exit_code != 0:
-            os.chdir(home_dir)
             return None
-        with open(os.path.join(temp_dir, f"out/{class_name}.java"), "r") as f:
-            java_str = f.read()
-            os.chdir(home_dir)
-            return java_str
+        with open(os.path.join(out_dir, f"{class_name}.java"), "r") as f:
+            return f.read()
+
+# one-shot command line decompilers, used for the tools the decompiler host does not run
+DECOMPILERS = {
+    "procyon": _procyon_decompiler_cli,
+    "cfr": _CFR_decompiler_cli,
+    "jadx": JADX_decompiler,
+    "fernflower": _fernflower_decompiler_cli,
+    "krakatau": krakatau_decompiler,
+}
 
 
 if __name__=="__main__":
@@ -511,7 +1467,7 @@ if __name__=="__main__":
 
     # compile bytecode
     gold_byte_code = compile_str(class_name, gold_str)
-    pred_byte_code = compile_str(class_name, pred_str)
+    pred_byte_code = compile_str(class_name, pred_str, precheck=True)
 
     asm = disassemble_str(class_name, gold_byte_code)
     asm_byte_code = assemble_str(class_name, asm)
@@ -544,8 +1500,7 @@ if __name__=="__main__":
     #print(output)
     
     # format code
-    gold_str = format_str(class_name, gold_str)
-    pred_str = format_str(class_name, pred_str)
+    gold_str, pred_str = format_strs([(class_name, gold_str), (class_name, pred_str)])
 
     # generate tests using evosuite and gold bytecode
     test_str, scaffold_str = evosuite_gen_test(class_name, gold_byte_code)
@@ -0,0 +1,206 @@
+"""
+Reusable scratch directories for java_utils.py.
+
+Every toolchain call needs a directory to write a class, source or test into
+and to run a tool in. Instead of creating and deleting a TemporaryDirectory
+per call, each process keeps a small pool of directories, created once under
+/dev/shm when it is a tmpfs with room to spare (else the system temp dir),
+and empties a directory when it is handed back.
+
+    with java_workspace.workspace() as temp_dir:
+        ...
+"""
+
+import atexit
+import contextlib
+import functools
+import multiprocessing.util
+import os
+import shutil
+import tempfile
+import threading
+
+# where the pool lives; memory-backed when possible
+SHM_DIR = "/dev/shm"
+# override the workspace root, e.g. with a local disk when /dev/shm is small
+ROOT_ENV = "JAVA_WORKSPACE_DIR"
+# /dev/shm is only used if it has at least this much free space
+MIN_SHM_FREE_BYTES = 1024 ** 3
+# directories kept per process; busier processes create extra ones that are deleted after use
+WORKSPACES_PER_WORKER = int(os.environ.get("JAVA_WORKSPACES_PER_WORKER", "4"))
+# file systems whose writes never reach a disk
+MEMORY_FILESYSTEMS = ("tmpfs", "ramfs")
+# name prefix of a process's pool directory, followed by its pid
+POOL_PREFIX = "java-workspaces-"
+
+
+@functools.lru_cache(maxsize=None)
+def _mounts():
+    # (mount point, file system type), longest mount point first
+    try:
+        with open("/proc/mounts", "r") as f:
+            mounts = [line.split()[1:3] for line in f if len(line.split()) >= 3]
+    except OSError:
+        return []
+    return sorted(((point, fs_type) for point, fs_type in mounts), key=lambda m: len(m[0]), reverse=True)
+
+
+@functools.lru_cache(maxsize=1024)
+def _directory_medium(directory):
+    for point, fs_type in _mounts():
+        if directory == point or directory.startswith(point.rstrip("/") + "/"):
+            return "memory" if fs_type in MEMORY_FILESYSTEMS else "disk"
+    return "disk"
+
+
+def medium(path):
+    '''
+    Returns "memory" if `path` is on a tmpfs, else "disk".
+    '''
+    return _directory_medium(os.path.dirname(os.path.realpath(path)))
+
+
+def _root():
+    root = os.environ.get(ROOT_ENV)
+    if root:
+        return root
+    try:
+        stat = os.statvfs(SHM_DIR)
+        if stat.f_bavail * stat.f_frsize >= MIN_SHM_FREE_BYTES and os.access(SHM_DIR, os.W_OK):
+            return SHM_DIR
+    except OSError:
+        pass
+    return tempfile.gettempdir()
+
+
+def _remove_stale_pools(root):
+    # pools of processes that were killed (e.g. terminated pool workers) would otherwise stay in memory
+    try:
+        names = os.listdir(root)
+    except OSError:
+        return
+    for name in names:
+        pid = name[len(POOL_PREFIX):].split("-", 1)[0]
+        if not name.startswith(POOL_PREFIX) or not pid.isdigit():
+            continue
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+        except OSError:
+            pass
+
+
+def _empty(path):
+    # cheaper than rmtree + mkdir: the directory itself is kept
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path, ignore_errors=True)
+            else:
+                try:
+                    os.unlink(entry.path)
+                except FileNotFoundError:
+                    pass
+
+
+class WorkspacePool:
+    '''
+    A per-process pool of `size` scratch directories under `root`.
+    '''
+
+    def __init__(self, size=WORKSPACES_PER_WORKER, root=None):
+        self.size = size
+        self.root = root or _root()
+        self.lock = threading.Lock()
+        self.dir = None
+        self.free = []
+
+    def _create(self):
+        return tempfile.mkdtemp(dir=self.dir)
+
+    def acquire(self):
+        '''
+        Returns an empty directory, pre-created when the pool has one free.
+        '''
+        with self.lock:
+            if self.dir is None:
+                _remove_stale_pools(self.root)
+                self.dir = tempfile.mkdtemp(dir=self.root, prefix=f"{POOL_PREFIX}{os.getpid()}-")
+                self.free = [self._create() for _ in range(self.size)]
+                atexit.register(self._remove, os.getpid())
+                # multiprocessing workers leave through os._exit, which skips atexit
+                multiprocessing.util.Finalize(self, self._remove, args=(os.getpid(),), exitpriority=0)
+            if self.free:
+                return self.free.pop()
+        return self._create()
+
+    def release(self, path):
+        '''
+        Empties a directory from acquire() and returns it to the pool.
+        '''
+        with self.lock:
+            keep = len(self.free) < self.size
+        if not keep:
+            shutil.rmtree(path, ignore_errors=True)
+            return
+        try:
+            _empty(path)
+        except OSError:
+            shutil.rmtree(path, ignore_errors=True)
+            return
+        with self.lock:
+            self.free.append(path)
+
+    def _remove(self, owner_pid):
+        # forked children inherit this hook, but the directories belong to the process that made them
+        if os.getpid() == owner_pid:
+            shutil.rmtree(self.dir, ignore_errors=True)
+
+    @contextlib.contextmanager
+    def workspace(self):
+        path = self.acquire()
+        try:
+            yield path
+        finally:
+            self.release(path)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    '''
+    Returns this process's pool, creating it on first use.
+    '''
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkspacePool()
+        return _pool
+
+
+def workspace():
+    '''
+    A context manager yielding an empty scratch directory, a drop-in for
+    tempfile.TemporaryDirectory().
+    '''
+    return get_pool().workspace()
+
+
+def java_tmpdir_flags():
+    '''
+    JVM flags that put a helper JVM's own temp files (java.io.tmpdir) in the workspace root.
+    '''
+    return [f"-Djava.io.tmpdir={get_pool().root}"]
+
+
+def _reset_after_fork():
+    # a forked worker must not hand out its parent's directories
+    global _pool, _pool_lock
+    _pool = None
+    _pool_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
@@ -6,6 +6,7 @@ from transformers import AutoTokenizer, AutoModelForCausalLM, StoppingCriteriaLi
 from transformers.generation_stopping_criteria import StoppingCriteria
 
 import prompts
+import java_metrics
 import java_utils
 
 class StopWordsCriteria(StoppingCriteria):
@@ -42,16 +43,17 @@ def trim_stop_words(outputs, stop_words):
 
 
 def jasm_to_java_test(sample, pred_java_source):
-    pred_byte_code = java_utils.compile_str(sample["class_name"], pred_java_source)
+    compile_result = java_utils.compile_str(sample["class_name"], pred_java_source, precheck=True)
 
-    if pred_byte_code is None:
+    if not compile_result["success"]:
         return 0.0
 
     pred_pass_rate = java_utils.evosuite_compile_and_run_test(
         sample["class_name"],
-        pred_byte_code,
+        compile_result["class_file"],
         sample["java_test"],
         sample["java_scaffold"],
+        gold_jasm=sample["jasm_code"],
     )
 
     return pred_pass_rate
@@ -65,8 +67,12 @@ if __name__=='__main__':
                         help="target output")
     parser.add_argument("--data-dir", type=str, required=True, help="Data directory")
     parser.add_argument("--output-path", type=str, required=True, help="Output path")
+    parser.add_argument("--metrics-out", type=str, default=None, help="Write java_utils timing metrics (JSON and .prom) here at exit")
     args = parser.parse_args()
 
+    if args.metrics_out is not None:
+        java_metrics.dump_at_exit(args.metrics_out)
+
     stop_words = []
     if args.target == "java_to_jasm":
         stop_words.append("</JASM>")